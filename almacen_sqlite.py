@@ -0,0 +1,568 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from weakref import WeakValueDictionary
+from .persona import Cliente
+from .articulo import ArticuloBase, ArticuloFisico, ArticuloDigital
+from .factura import Factura, LineaFactura
+from .excepciones import PrecioInvalidoError, FacturaNoEncontradaError
+from .indice_prefijos import fin_de_prefijo
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS clientes (
+    dni TEXT PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    apellidos TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS articulos (
+    codigo TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    denominacion TEXT NOT NULL,
+    precio REAL NOT NULL CHECK (precio >= 0),
+    peso REAL,
+    licencia TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_articulos_tipo ON articulos (tipo);
+CREATE TABLE IF NOT EXISTS facturas (
+    id INTEGER PRIMARY KEY,
+    dni TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    apellidos TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    abierta INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_facturas_dni ON facturas (dni);
+CREATE INDEX IF NOT EXISTS idx_facturas_fecha ON facturas (fecha);
+CREATE TABLE IF NOT EXISTS lineas (
+    factura_id INTEGER NOT NULL REFERENCES facturas (id),
+    posicion INTEGER NOT NULL,
+    codigo TEXT NOT NULL,
+    denominacion TEXT NOT NULL,
+    cantidad INTEGER NOT NULL,
+    subtotal REAL NOT NULL,
+    PRIMARY KEY (factura_id, posicion)
+);
+CREATE INDEX IF NOT EXISTS idx_lineas_codigo ON lineas (factura_id, codigo);
+CREATE TABLE IF NOT EXISTS estado (
+    clave TEXT PRIMARY KEY,
+    valor
+);
+"""
+# Despues de ESQUEMA (y de añadir la columna abierta a las bases antiguas)
+INDICES = """
+CREATE INDEX IF NOT EXISTS idx_facturas_abiertas ON facturas (id) WHERE abierta = 1;
+"""
+
+# Clientes y articulos ya creados que guarda cada tabla (los usados mas recientemente)
+OBJETOS_EN_CACHE = 10_000
+
+
+class AlmacenSQLite:
+    """
+    Almacen persistente para ModeloLogica basado en sqlite3 (modo WAL)
+    Uso: ModeloLogica(almacen=AlmacenSQLite("tienda.db"))
+    Los clientes y articulos se leen de la base de datos bajo demanda, al
+    buscarlos, asi el arranque no depende del tamaño del catalogo, y en memoria solo
+    quedan los usados mas recientemente (CacheLRU)
+    Las sentencias son siempre las mismas cadenas con parametros, de modo que
+    sqlite3 las reutiliza ya preparadas desde su cache
+    """
+    def __init__(self, ruta: str):
+        # isolation_level=None: las transacciones las abrimos nosotros en lote()
+        # check_same_thread=False: el controlador puede usarla desde su hilo de tareas
+        self.__conexion = sqlite3.connect(ruta, isolation_level=None, cached_statements=256, check_same_thread=False)
+        self.__conexion.execute("PRAGMA journal_mode=WAL")
+        self.__conexion.execute("PRAGMA synchronous=NORMAL")
+        self.__conexion.execute("PRAGMA foreign_keys=ON")
+        self.__conexion.executescript(ESQUEMA)
+        columnas = [fila[1] for fila in self.__conexion.execute("PRAGMA table_info(facturas)")]
+        if "abierta" not in columnas: # Base de una version anterior: todas sus facturas estan cerradas
+            self.__conexion.execute("ALTER TABLE facturas ADD COLUMN abierta INTEGER NOT NULL DEFAULT 0")
+        self.__conexion.executescript(INDICES)
+        self.__profundidad_lote = 0
+        self.clientes = TablaClientes(self.__conexion)
+        self.articulos = TablaArticulos(self.__conexion)
+        self.historial = HistorialSQLite(self.__conexion, self.articulos)
+
+    @contextmanager
+    def lote(self) -> Iterator[None]:
+        """
+        Agrupa varias operaciones en una sola transaccion
+        Se puede anidar: solo el lote mas externo confirma (o deshace si hay error)
+        Al deshacer se vacian las caches, que pueden tener objetos de la transaccion
+        """
+        if self.__profundidad_lote == 0:
+            self.__conexion.execute("BEGIN")
+        self.__profundidad_lote += 1
+        try:
+            yield
+        except BaseException:
+            self.__profundidad_lote -= 1
+            if self.__profundidad_lote == 0:
+                self.__conexion.execute("ROLLBACK")
+                self.clientes.limpiar_cache()
+                self.articulos.limpiar_cache()
+                self.historial.limpiar_cache()
+            raise
+        self.__profundidad_lote -= 1
+        if self.__profundidad_lote == 0:
+            self.__conexion.execute("COMMIT")
+
+    @property
+    def en_transaccion(self) -> bool:
+        """Hay un lote en curso"""
+        return self.__profundidad_lote > 0
+
+    def cerrar(self) -> None:
+        """Cierra la conexion con la base de datos"""
+        self.__conexion.close()
+
+    # Facturas
+
+    def facturas_abiertas(self) -> List[int]:
+        """Ids de las facturas que siguen abiertas, en orden"""
+        return [id_factura for (id_factura,) in self.__conexion.execute(
+            "SELECT id FROM facturas WHERE abierta = 1 ORDER BY id")]
+
+    @property
+    def id_factura_actual(self) -> Optional[int]:
+        """Id de la factura actual guardada (None si no hay)"""
+        fila = self.__conexion.execute("SELECT valor FROM estado WHERE clave = 'factura_actual'").fetchone()
+        return fila[0] if fila is not None else None
+
+    def guardar_factura_actual(self, factura: Optional[Factura]) -> None:
+        self.__conexion.execute("INSERT OR REPLACE INTO estado (clave, valor) VALUES ('factura_actual', ?)",
+                                (factura.id if factura is not None else None,))
+
+    def cerrar_factura(self, factura: Factura) -> None:
+        """Marca la factura como cerrada"""
+        self.__conexion.execute("UPDATE facturas SET abierta = 0 WHERE id = ?", (factura.id,))
+
+    def guardar_linea(self, factura: Factura, linea: LineaFactura) -> None:
+        """Guarda la linea de un articulo de la factura (nueva o con otra cantidad)"""
+        with self.lote():
+            self.historial.guardar_linea(factura.id, linea)
+
+    def borrar_linea(self, factura: Factura, codigo: str) -> None:
+        """Borra la linea de un articulo (las demas no se mueven: las posiciones solo ordenan)"""
+        with self.lote():
+            self.__conexion.execute("DELETE FROM lineas WHERE factura_id = ? AND codigo = ?", (factura.id, codigo))
+
+
+class CacheLRU:
+    """
+    Cache acotada: al pasar de `maximo` elementos se olvida el usado hace mas tiempo
+    Tiene su propio cerrojo: ModeloConcurrente lee las tablas desde varios hilos a la
+    vez (con el cerrojo de lectura) y cada lectura reordena la cache
+    """
+    def __init__(self, maximo: int = OBJETOS_EN_CACHE):
+        self.__maximo = maximo
+        self.__datos: "OrderedDict[str, Any]" = OrderedDict()
+        self.__cerrojo = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__datos)
+
+    def __contains__(self, clave: object) -> bool:
+        return clave in self.__datos
+
+    def get(self, clave: str) -> Optional[Any]:
+        with self.__cerrojo:
+            valor = self.__datos.get(clave)
+            if valor is not None:
+                self.__datos.move_to_end(clave)
+            return valor
+
+    def poner(self, clave: str, valor: Any) -> None:
+        with self.__cerrojo:
+            self.__datos[clave] = valor
+            self.__datos.move_to_end(clave)
+            if len(self.__datos) > self.__maximo:
+                self.__datos.popitem(last=False)
+
+    def quitar(self, clave: str) -> None:
+        with self.__cerrojo:
+            self.__datos.pop(clave, None)
+
+    def limpiar(self) -> None:
+        with self.__cerrojo:
+            self.__datos.clear()
+
+
+@contextmanager
+def _datos_rechazados(que: str) -> Iterator[None]:
+    """
+    Convierte en ValueError una restriccion de la tabla que no se cumple (NOT NULL, CHECK...)
+    SQLite solo deshace esa sentencia: la transaccion del lote sigue (una fila mala de
+    una importacion no se lleva por delante el resto del lote)
+    """
+    try:
+        yield
+    except sqlite3.IntegrityError as e:
+        raise ValueError(f"la base de datos no admite {que}: {e}") from e
+
+
+def _buscar_prefijo(conexion: sqlite3.Connection, tabla: str, columna: str, prefijo: str, limite: int) -> List[str]:
+    # clave >= prefijo AND clave < fin usa el indice de la clave primaria (LIKE no lo usaria)
+    fin = fin_de_prefijo(prefijo)
+    if fin is None:
+        consulta, parametros = f"SELECT {columna} FROM {tabla} WHERE {columna} >= ?", (prefijo,)
+    else:
+        consulta, parametros = f"SELECT {columna} FROM {tabla} WHERE {columna} >= ? AND {columna} < ?", (prefijo, fin)
+    return [clave for (clave,) in conexion.execute(consulta + f" ORDER BY {columna} LIMIT ?", parametros + (limite,))]
+
+
+class TablaClientes(MutableMapping):
+    """
+    Tabla de clientes vista como un diccionario dni -> Cliente, con carga perezosa
+    Solo se guardan en memoria los `en_cache` clientes usados mas recientemente
+    """
+    def __init__(self, conexion: sqlite3.Connection, en_cache: int = OBJETOS_EN_CACHE):
+        self.__conexion = conexion
+        self.__cache = CacheLRU(en_cache)
+
+    def __len__(self) -> int:
+        return self.__conexion.execute("SELECT COUNT(*) FROM clientes").fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        for (dni,) in self.__conexion.execute("SELECT dni FROM clientes ORDER BY rowid"):
+            yield dni
+
+    def __contains__(self, dni: object) -> bool:
+        if dni in self.__cache:
+            return True
+        return self.__conexion.execute("SELECT 1 FROM clientes WHERE dni = ?", (dni,)).fetchone() is not None
+
+    def __getitem__(self, dni: str) -> Cliente:
+        cliente = self.__cache.get(dni)
+        if cliente is None:
+            fila = self.__conexion.execute(
+                "SELECT nombre, apellidos, dni FROM clientes WHERE dni = ?", (dni,)
+            ).fetchone()
+            if fila is None:
+                raise KeyError(dni)
+            cliente = Cliente(*fila)
+            self.__cache.poner(dni, cliente)
+        return cliente
+
+    def __setitem__(self, dni: str, cliente: Cliente) -> None:
+        with _datos_rechazados(f"el cliente {dni}"):
+            self.__conexion.execute(
+                "INSERT OR REPLACE INTO clientes (dni, nombre, apellidos) VALUES (?, ?, ?)",
+                (dni, cliente.nombre, cliente.apellidos),
+            )
+        self.__cache.poner(dni, cliente)
+
+    def __delitem__(self, dni: str) -> None:
+        cursor = self.__conexion.execute("DELETE FROM clientes WHERE dni = ?", (dni,))
+        self.__cache.quitar(dni)
+        if cursor.rowcount == 0:
+            raise KeyError(dni)
+
+    def limpiar_cache(self) -> None:
+        """Olvida los clientes cargados (se vuelven a leer al pedirlos)"""
+        self.__cache.limpiar()
+
+    def values(self) -> List[Cliente]:
+        """Todos los clientes, leidos con una sola consulta (no se guardan en la cache)"""
+        return [cliente for _, cliente in self.items()]
+
+    def items(self) -> List[Tuple[str, Cliente]]:
+        resultado = []
+        for nombre, apellidos, dni in self.__conexion.execute(
+            "SELECT nombre, apellidos, dni FROM clientes ORDER BY rowid"
+        ):
+            cliente = self.__cache.get(dni)
+            resultado.append((dni, cliente if cliente is not None else Cliente(nombre, apellidos, dni)))
+        return resultado
+
+    def pagina(self, inicio: int, cantidad: int) -> List[Cliente]:
+        """Los clientes de `inicio` a `inicio + cantidad` en el orden de values(), con una consulta"""
+        resultado = []
+        for nombre, apellidos, dni in self.__conexion.execute(
+            "SELECT nombre, apellidos, dni FROM clientes ORDER BY rowid LIMIT ? OFFSET ?", (cantidad, inicio)
+        ):
+            cliente = self.__cache.get(dni)
+            if cliente is None:
+                cliente = Cliente(nombre, apellidos, dni)
+                self.__cache.poner(dni, cliente)
+            resultado.append(cliente)
+        return resultado
+
+    def buscar_prefijo(self, prefijo: str, limite: int = 20) -> List[str]:
+        """DNIs que empiezan por el prefijo, en orden (rango sobre la clave primaria)"""
+        return _buscar_prefijo(self.__conexion, "clientes", "dni", prefijo, limite)
+
+
+class TablaArticulos(MutableMapping):
+    """
+    Tabla de articulos vista como un diccionario codigo -> articulo, con carga perezosa
+    Los articulos que devuelve guardan en la base de datos los cambios de precio
+    Solo se guardan en memoria los `en_cache` articulos usados mas recientemente
+    """
+    def __init__(self, conexion: sqlite3.Connection, en_cache: int = OBJETOS_EN_CACHE):
+        self.__conexion = conexion
+        self.__cache = CacheLRU(en_cache)
+
+    def __crear(self, codigo: str, tipo: str, denominacion: str, precio: float,
+                peso: Optional[float], licencia: Optional[str]) -> ArticuloBase:
+        """Construye el articulo a partir de una fila (no lo guarda en la cache)"""
+        if tipo == "fisico":
+            return ArticuloFisicoPersistente(self, codigo, denominacion, precio, peso)
+        return ArticuloDigitalPersistente(self, codigo, denominacion, precio, licencia)
+
+    def __cargar(self, fila: tuple) -> ArticuloBase:
+        """El articulo de la cache o, si no esta, el de la fila (y lo guarda en la cache)"""
+        articulo = self.__cache.get(fila[0])
+        if articulo is None:
+            articulo = self.__crear(*fila)
+            self.__cache.poner(fila[0], articulo)
+        return articulo
+
+    def guardar_precio(self, codigo: str, precio: float) -> None:
+        self.__conexion.execute("UPDATE articulos SET precio = ? WHERE codigo = ?", (precio, codigo))
+
+    def __len__(self) -> int:
+        return self.__conexion.execute("SELECT COUNT(*) FROM articulos").fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        for (codigo,) in self.__conexion.execute("SELECT codigo FROM articulos ORDER BY rowid"):
+            yield codigo
+
+    def __contains__(self, codigo: object) -> bool:
+        if codigo in self.__cache:
+            return True
+        return self.__conexion.execute("SELECT 1 FROM articulos WHERE codigo = ?", (codigo,)).fetchone() is not None
+
+    def __getitem__(self, codigo: str) -> ArticuloBase:
+        articulo = self.__cache.get(codigo)
+        if articulo is None:
+            fila = self.__conexion.execute(
+                "SELECT codigo, tipo, denominacion, precio, peso, licencia FROM articulos WHERE codigo = ?", (codigo,)
+            ).fetchone()
+            if fila is None:
+                raise KeyError(codigo)
+            articulo = self.__crear(*fila)
+            self.__cache.poner(codigo, articulo)
+        return articulo
+
+    def __setitem__(self, codigo: str, articulo: ArticuloBase) -> None:
+        if isinstance(articulo, ArticuloFisico):
+            datos = (codigo, "fisico", articulo.denominacion, articulo.precio, articulo.peso, None)
+        else:
+            datos = (codigo, "digital", articulo.denominacion, articulo.precio, None, articulo.licencia)
+        with _datos_rechazados(f"el articulo {codigo}"):
+            self.__conexion.execute(
+                "INSERT OR REPLACE INTO articulos (codigo, tipo, denominacion, precio, peso, licencia) "
+                "VALUES (?, ?, ?, ?, ?, ?)", datos
+            )
+        self.__cache.poner(codigo, self.__crear(*datos))
+
+    def __delitem__(self, codigo: str) -> None:
+        cursor = self.__conexion.execute("DELETE FROM articulos WHERE codigo = ?", (codigo,))
+        self.__cache.quitar(codigo)
+        if cursor.rowcount == 0:
+            raise KeyError(codigo)
+
+    def limpiar_cache(self) -> None:
+        """Olvida los articulos cargados (se vuelven a leer al pedirlos)"""
+        self.__cache.limpiar()
+
+    def values(self) -> List[ArticuloBase]:
+        """Todos los articulos, leidos con una sola consulta (no se guardan en la cache)"""
+        return [articulo for _, articulo in self.items()]
+
+    def items(self) -> List[Tuple[str, ArticuloBase]]:
+        resultado = []
+        for fila in self.__conexion.execute(
+            "SELECT codigo, tipo, denominacion, precio, peso, licencia FROM articulos ORDER BY rowid"
+        ):
+            articulo = self.__cache.get(fila[0])
+            resultado.append((fila[0], articulo if articulo is not None else self.__crear(*fila)))
+        return resultado
+
+    def pagina(self, inicio: int, cantidad: int) -> List[ArticuloBase]:
+        """Los articulos de `inicio` a `inicio + cantidad` en el orden de values(), con una consulta"""
+        return [self.__cargar(fila) for fila in self.__conexion.execute(
+            "SELECT codigo, tipo, denominacion, precio, peso, licencia FROM articulos ORDER BY rowid LIMIT ? OFFSET ?",
+            (cantidad, inicio),
+        )]
+
+    def denominaciones(self) -> Iterator[Tuple[str, str]]:
+        """Pares (codigo, denominacion) de todo el catalogo, sin crear los articulos"""
+        return self.__conexion.execute("SELECT codigo, denominacion FROM articulos ORDER BY rowid")
+
+    def buscar_prefijo(self, prefijo: str, limite: int = 20) -> List[str]:
+        """Codigos que empiezan por el prefijo, en orden (rango sobre la clave primaria)"""
+        return _buscar_prefijo(self.__conexion, "articulos", "codigo", prefijo, limite)
+
+    def ajustar_precios(self, factor: float = 1.0, incremento: float = 0.0, tipo: Optional[str] = None) -> int:
+        """
+        Aplica precio * factor + incremento con un solo UPDATE
+        Comprueba antes toda la columna: si algun precio quedaria negativo no cambia ninguno
+        """
+        filtro, parametros = ("WHERE tipo = ?", (tipo,)) if tipo is not None else ("", ())
+        negativos = self.__conexion.execute(
+            "SELECT COUNT(*) FROM articulos " + (filtro + " AND" if filtro else "WHERE") + " precio * ? + ? < 0",
+            parametros + (factor, incremento),
+        ).fetchone()[0]
+        if negativos:
+            raise PrecioInvalidoError("el precio no puede ser negativo")
+        cursor = self.__conexion.execute(
+            "UPDATE articulos SET precio = precio * ? + ? " + filtro, (factor, incremento) + parametros
+        )
+        # Los objetos ya cargados se vuelven a leer la proxima vez que se pidan
+        self.__cache.limpiar()
+        return cursor.rowcount
+
+
+class HistorialSQLite:
+    """
+    Historial de facturas guardado en las tablas facturas y lineas
+    Misma interfaz que HistorialFacturas; las busquedas por cliente y por fecha
+    usan los indices de la tabla y las facturas se cargan solo al pedirlas
+    """
+    def __init__(self, conexion: sqlite3.Connection, articulos: TablaArticulos):
+        self.__conexion = conexion
+        self.__articulos = articulos
+        self.__cargadas: "WeakValueDictionary[int, Factura]" = WeakValueDictionary()
+        self.__ultimo_id = conexion.execute("SELECT COALESCE(MAX(id), 0) FROM facturas").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self.__conexion.execute("SELECT COUNT(*) FROM facturas").fetchone()[0]
+
+    def __iter__(self) -> Iterator[Factura]:
+        for (id_factura,) in self.__conexion.execute("SELECT id FROM facturas ORDER BY id").fetchall():
+            yield self.obtener(id_factura)
+
+    @property
+    def ultimo_id(self) -> int:
+        """Ultimo id reservado (puede que su factura aun no este en el historial)"""
+        return self.__ultimo_id
+
+    def nuevo_id(self) -> int:
+        """Reserva el siguiente id de factura"""
+        self.__ultimo_id += 1
+        return self.__ultimo_id
+
+    def agregar(self, factura: Factura, abierta: bool = False) -> None:
+        """Guarda la cabecera de la factura (abierta o cerrada) y las lineas que ya tenga"""
+        cliente = factura.cliente
+        self.__conexion.execute(
+            "INSERT INTO facturas (id, dni, nombre, apellidos, fecha, abierta) VALUES (?, ?, ?, ?, ?, ?)",
+            (factura.id, cliente.dni, cliente.nombre, cliente.apellidos, factura.fecha.isoformat(), int(abierta)),
+        )
+        for posicion, linea in enumerate(factura.lineas):
+            self.guardar_linea(factura.id, linea, posicion)
+        self.__cargadas[factura.id] = factura
+        self.__ultimo_id = max(self.__ultimo_id, factura.id)
+
+    def limpiar_cache(self) -> None:
+        """
+        Olvida las facturas cargadas (se vuelven a leer al pedirlas). Los ids ya
+        reservados no se vuelven a dar: si su factura no se guardo quedan huecos
+        """
+        self.__cargadas.clear()
+
+    def guardar_linea(self, factura_id: int, linea: LineaFactura, posicion: Optional[int] = None) -> None:
+        """
+        Guarda la linea de un articulo: si ya tenia fila se sustituye en su posicion y
+        si no va detras de la ultima. Con `posicion` se inserta directamente (factura nueva)
+        """
+        if posicion is None:
+            codigo = linea.articulo.codigo
+            posicion = self.__conexion.execute(
+                "SELECT MIN(posicion) FROM lineas WHERE factura_id = ? AND codigo = ?", (factura_id, codigo)
+            ).fetchone()[0]
+            if posicion is None:
+                posicion = self.__conexion.execute(
+                    "SELECT COALESCE(MAX(posicion), -1) + 1 FROM lineas WHERE factura_id = ?", (factura_id,)
+                ).fetchone()[0]
+            else:
+                self.__conexion.execute("DELETE FROM lineas WHERE factura_id = ? AND codigo = ?", (factura_id, codigo))
+        self.__conexion.execute(
+            "INSERT INTO lineas (factura_id, posicion, codigo, denominacion, cantidad, subtotal) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (factura_id, posicion, linea.articulo.codigo, linea.articulo.denominacion, linea.cantidad, linea.subtotal),
+        )
+
+    def obtener(self, id_factura: int) -> Factura:
+        """Devuelve la factura con ese id (la carga si hace falta). Lanza error si no existe"""
+        factura = self.__cargadas.get(id_factura)
+        if factura is not None:
+            return factura
+        fila = self.__conexion.execute(
+            "SELECT nombre, apellidos, dni, fecha FROM facturas WHERE id = ?", (id_factura,)
+        ).fetchone()
+        if fila is None:
+            raise FacturaNoEncontradaError("factura no encontrada")
+        nombre, apellidos, dni, fecha = fila
+        factura = Factura(Cliente(nombre, apellidos, dni), id_factura, datetime.fromisoformat(fecha))
+        # Bases antiguas pueden tener varias filas de un articulo: se juntan conservando lo cobrado
+        filas: Dict[str, list] = {}
+        for codigo, denominacion, cantidad, subtotal in self.__conexion.execute(
+            "SELECT codigo, denominacion, cantidad, subtotal FROM lineas WHERE factura_id = ? ORDER BY posicion",
+            (id_factura,),
+        ).fetchall():
+            fila = filas.setdefault(codigo, [denominacion, 0, 0.0])
+            fila[1] += cantidad
+            fila[2] += subtotal
+        for codigo, (denominacion, cantidad, subtotal) in filas.items():
+            precio_unitario = subtotal / cantidad
+            try:
+                articulo = self.__articulos[codigo]
+            except KeyError:
+                # El articulo ya no esta en el catalogo: se conserva lo facturado
+                articulo = ArticuloFisico(codigo, denominacion, precio_unitario, 0.0)
+            factura.agregar_linea(articulo, cantidad, precio_unitario)
+        self.__cargadas[id_factura] = factura
+        return factura
+
+    def de_cliente(self, dni: str) -> List[Factura]:
+        """Facturas de un cliente, en orden de emision"""
+        filas = self.__conexion.execute("SELECT id FROM facturas WHERE dni = ? ORDER BY id", (dni,)).fetchall()
+        return [self.obtener(id_factura) for (id_factura,) in filas]
+
+    def entre(self, desde: datetime, hasta: datetime) -> List[Factura]:
+        """Facturas con fecha en [desde, hasta), ordenadas por fecha"""
+        filas = self.__conexion.execute(
+            "SELECT id FROM facturas WHERE fecha >= ? AND fecha < ? ORDER BY fecha, id",
+            (desde.isoformat(), hasta.isoformat()),
+        ).fetchall()
+        return [self.obtener(id_factura) for (id_factura,) in filas]
+
+
+class ArticuloFisicoPersistente(ArticuloFisico):
+    """Articulo fisico que guarda sus cambios de precio en la TablaArticulos"""
+    __slots__ = ("__tabla",)
+
+    def __init__(self, tabla: Optional[TablaArticulos], codigo: str, denominacion: str, precio: float, peso: float):
+        self.__tabla = None # Durante la construccion no se escribe en la base de datos
+        super().__init__(codigo, denominacion, precio, peso)
+        self.__tabla = tabla
+
+    @ArticuloFisico.precio.setter
+    def precio(self, valor: float):
+        ArticuloBase.precio.fset(self, valor) # Valida y guarda en memoria
+        if self.__tabla is not None:
+            self.__tabla.guardar_precio(self.codigo, valor)
+
+
+class ArticuloDigitalPersistente(ArticuloDigital):
+    """Articulo digital que guarda sus cambios de precio en la TablaArticulos"""
+    __slots__ = ("__tabla",)
+
+    def __init__(self, tabla: Optional[TablaArticulos], codigo: str, denominacion: str, precio: float, licencia: str):
+        self.__tabla = None # Durante la construccion no se escribe en la base de datos
+        super().__init__(codigo, denominacion, precio, licencia)
+        self.__tabla = tabla
+
+    @ArticuloDigital.precio.setter
+    def precio(self, valor: float):
+        ArticuloBase.precio.fset(self, valor) # Valida y guarda en memoria
+        if self.__tabla is not None:
+            self.__tabla.guardar_precio(self.codigo, valor)
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+Archivo binario de facturas: compacto y con acceso directo a cualquier factura
+
+Formato (little-endian):
+    cabecera   CABECERA: magia, version, numero de facturas y de cadenas y
+               posiciones de la tabla de cadenas y del indice
+    facturas   una detras de otra: FACTURA (id, fecha, cliente, total, numero
+               de lineas) seguida de sus lineas, LINEA cada una (ancho fijo)
+    cadenas    (cadenas + 1) posiciones u64 y despues los textos UTF-8 seguidos;
+               codigos, denominaciones y datos de clientes se guardan una sola vez
+    indice     (id, posicion) de cada factura, ordenado por id
+
+El lector usa mmap: buscar una factura es una busqueda binaria en el indice y
+recorrer el archivo entero no lo carga en memoria (solo una cache acotada de cadenas)
+"""
+import mmap
+import os
+import struct
+from array import array
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+from .articulo import ArticuloBase, ArticuloFisico
+from .excepciones import FacturaNoEncontradaError
+from .exportacion import escritura_atomica
+from .factura import Factura
+from .persona import Cliente
+
+MAGIA = b"TIENDAFB"
+VERSION = 1
+CABECERA = struct.Struct("<8sIIQQQQ") # magia, version, reservado, facturas, cadenas, pos. cadenas, pos. indice
+FACTURA = struct.Struct("<qqIIIdI") # id, fecha (us desde 1970), nombre, apellidos, dni, total, lineas
+LINEA = struct.Struct("<IIId") # codigo, denominacion, cantidad, subtotal
+ENTRADA_INDICE = struct.Struct("<qQ") # id, posicion de la factura
+POSICION = struct.Struct("<Q")
+
+# Cadenas decodificadas que guarda el lector (las de los articulos mas vendidos se repiten mucho)
+CADENAS_EN_CACHE = 4096
+
+_EPOCA = datetime(1970, 1, 1)
+_MICROSEGUNDO = timedelta(microseconds=1)
+
+
+def escribir_archivo(facturas: Iterable[Factura], ruta: str) -> int:
+    """
+    Escribe las facturas en un archivo binario (de forma atomica). Devuelve cuantas
+    Las facturas deben tener id y fecha sin zona horaria (como las del modelo)
+    En memoria solo quedan las cadenas distintas y 16 bytes por factura del indice
+    """
+    cadenas: Dict[str, int] = {}
+    textos: List[bytes] = []
+
+    def cadena(texto: str) -> int:
+        numero = cadenas.get(texto)
+        if numero is None:
+            numero = cadenas[texto] = len(textos)
+            textos.append(texto.encode("utf-8"))
+        return numero
+
+    ids = array("q")
+    posiciones = array("Q")
+    with escritura_atomica(ruta, "wb") as archivo:
+        archivo.write(bytes(CABECERA.size)) # Se rellena al final, cuando se conocen las posiciones
+        posicion = CABECERA.size
+        for factura in facturas:
+            if factura.id is None:
+                raise ValueError("solo se pueden archivar facturas con id")
+            cliente = factura.cliente
+            lineas = factura.lineas
+            partes = [FACTURA.pack(factura.id, (factura.fecha - _EPOCA) // _MICROSEGUNDO, cadena(cliente.nombre),
+                                   cadena(cliente.apellidos), cadena(cliente.dni), factura.total, len(lineas))]
+            partes += [LINEA.pack(cadena(l.articulo.codigo), cadena(l.articulo.denominacion), l.cantidad, l.subtotal)
+                       for l in lineas]
+            registro = b"".join(partes)
+            archivo.write(registro)
+            ids.append(factura.id)
+            posiciones.append(posicion)
+            posicion += len(registro)
+
+        pos_cadenas = posicion
+        inicio = 0
+        for texto in textos: # Posicion de cada texto dentro del bloque de textos (y el final del ultimo)
+            archivo.write(POSICION.pack(inicio))
+            inicio += len(texto)
+        archivo.write(POSICION.pack(inicio))
+        for texto in textos:
+            archivo.write(texto)
+
+        pos_indice = pos_cadenas + POSICION.size * (len(textos) + 1) + inicio
+        orden = range(len(ids))
+        if any(ids[i] > ids[i + 1] for i in range(len(ids) - 1)):
+            orden = sorted(orden, key=ids.__getitem__) # Normalmente ya vienen en orden de id
+        for i in orden:
+            archivo.write(ENTRADA_INDICE.pack(ids[i], posiciones[i]))
+
+        archivo.seek(0)
+        archivo.write(CABECERA.pack(MAGIA, VERSION, 0, len(ids), len(textos), pos_cadenas, pos_indice))
+    return len(ids)
+
+
+class LectorArchivo:
+    """
+    Lee un archivo de escribir_archivo sin cargarlo: el archivo se proyecta con mmap
+    - factura(id): busqueda binaria en el indice, O(log n)
+    - factura_en(n): la n-esima por orden de id, O(1)
+    - recorrer(): todas en el orden en que se escribieron, con memoria constante
+    Los articulos de las lineas son los de `catalogo` si se indica y el codigo esta;
+    si no, un articulo con lo facturado (como al cargar facturas antiguas)
+    Uso: `with LectorArchivo(ruta) as archivo: ...`
+    """
+    def __init__(self, ruta: str, catalogo: Optional[Mapping[str, ArticuloBase]] = None):
+        self.__catalogo = catalogo
+        with open(ruta, "rb") as archivo:
+            if os.fstat(archivo.fileno()).st_size < CABECERA.size:
+                raise ValueError(f"{ruta} no es un archivo de facturas")
+            self.__mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) # Sigue valido al cerrar el archivo
+        magia, version, _, facturas, cadenas, pos_cadenas, pos_indice = CABECERA.unpack_from(self.__mapa, 0)
+        if magia != MAGIA:
+            self.__mapa.close()
+            raise ValueError(f"{ruta} no es un archivo de facturas")
+        if version != VERSION:
+            self.__mapa.close()
+            raise ValueError(f"{ruta}: version {version} del archivo de facturas no soportada (se lee la {VERSION})")
+        self.__facturas = facturas
+        self.__pos_cadenas = pos_cadenas
+        self.__pos_textos = pos_cadenas + POSICION.size * (cadenas + 1)
+        self.__pos_indice = pos_indice
+        self.__cadena = lru_cache(maxsize=CADENAS_EN_CACHE)(self.__leer_cadena)
+
+    def __enter__(self) -> "LectorArchivo":
+        return self
+
+    def __exit__(self, *error) -> None:
+        self.cerrar()
+
+    def cerrar(self) -> None:
+        self.__cadena.cache_clear()
+        self.__mapa.close()
+
+    def __len__(self) -> int:
+        return self.__facturas
+
+    def __leer_cadena(self, numero: int) -> str:
+        inicio, fin = struct.unpack_from("<QQ", self.__mapa, self.__pos_cadenas + POSICION.size * numero)
+        return self.__mapa[self.__pos_textos + inicio:self.__pos_textos + fin].decode("utf-8")
+
+    def __entrada(self, n: int) -> Tuple[int, int]:
+        return ENTRADA_INDICE.unpack_from(self.__mapa, self.__pos_indice + ENTRADA_INDICE.size * n)
+
+    def __leer_factura(self, posicion: int) -> Tuple[Factura, int]:
+        """La factura que empieza en `posicion` y la posicion de la siguiente"""
+        cadena = self.__cadena
+        id_factura, fecha, nombre, apellidos, dni, _, lineas = FACTURA.unpack_from(self.__mapa, posicion)
+        factura = Factura(Cliente(cadena(nombre), cadena(apellidos), cadena(dni)), id_factura,
+                          _EPOCA + fecha * _MICROSEGUNDO)
+        posicion += FACTURA.size
+        for codigo, denominacion, cantidad, subtotal in LINEA.iter_unpack(
+                self.__mapa[posicion:posicion + LINEA.size * lineas]):
+            precio_unitario = subtotal / cantidad
+            articulo = self.__catalogo.get(cadena(codigo)) if self.__catalogo is not None else None
+            if articulo is None:
+                articulo = ArticuloFisico(cadena(codigo), cadena(denominacion), precio_unitario, 0.0)
+            factura.agregar_linea(articulo, cantidad, precio_unitario)
+        return factura, posicion + LINEA.size * lineas
+
+    def factura_en(self, n: int) -> Factura:
+        """La factura n (0 = la de menor id). Lanza IndexError si no hay tantas"""
+        if not 0 <= n < self.__facturas:
+            raise IndexError("no hay tantas facturas en el archivo")
+        return self.__leer_factura(self.__entrada(n)[1])[0]
+
+    def factura(self, id_factura: int) -> Factura:
+        """Busca una factura por id en el indice. Lanza error si no esta"""
+        inicio, fin = 0, self.__facturas
+        while inicio < fin:
+            medio = (inicio + fin) // 2
+            if self.__entrada(medio)[0] < id_factura:
+                inicio = medio + 1
+            else:
+                fin = medio
+        if inicio < self.__facturas:
+            id_encontrado, posicion = self.__entrada(inicio)
+            if id_encontrado == id_factura:
+                return self.__leer_factura(posicion)[0]
+        raise FacturaNoEncontradaError("factura no encontrada en el archivo")
+
+    def recorrer(self) -> Iterator[Factura]:
+        """Todas las facturas en el orden del archivo, leyendo de principio a fin"""
+        if hasattr(self.__mapa, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self.__mapa.madvise(mmap.MADV_SEQUENTIAL) # El sistema puede leer por delante y soltar lo leido
+        posicion = CABECERA.size
+        for _ in range(self.__facturas):
+            factura, posicion = self.__leer_factura(posicion)
+            yield factura
+
+    def __iter__(self) -> Iterator[Factura]:
+        return self.recorrer()
\ No newline at end of file
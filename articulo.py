@@ -2,6 +2,12 @@ from abc import ABC, abstractmethod
 from .excepciones import PrecioInvalidoError
 
 class ArticuloBase(ABC):
+    """
+    Clase base de los articulos
+    Usa __slots__ para que cada objeto no cargue con un __dict__
+    """
+    __slots__ = ("__codigo", "__denominacion", "__precio")
+
     def __init__(self, codigo: str, denominacion: str, precio: float):
         self.__codigo = codigo
         self.__denominacion = denominacion
@@ -33,6 +39,9 @@ class ArticuloBase(ABC):
 
 class ArticuloFisico(ArticuloBase):
     """Articulo fisico que tiene un peso"""
+    __slots__ = ("__peso",)
+    FACTOR_DESCUENTO = 1.0 # Multiplica al precio: sin descuento
+
     def __init__(self, codigo: str, denominacion: str, precio: float, peso: float):
         super().__init__(codigo, denominacion, precio)
         self.__peso = peso
@@ -47,6 +56,9 @@ class ArticuloFisico(ArticuloBase):
 
 class ArticuloDigital(ArticuloBase):
     """Articulo digital que tiene una licencia y descuento"""
+    __slots__ = ("__licencia",)
+    FACTOR_DESCUENTO = 0.9 # Multiplica al precio: 10% de descuento
+
     def __init__(self, codigo: str, denominacion: str, precio: float, licencia: str):
         super().__init__(codigo, denominacion, precio)
         self.__licencia = licencia
@@ -57,4 +69,4 @@ class ArticuloDigital(ArticuloBase):
     
     def calcular_precio_descuento(self) -> float:
         """Los articulos digitales tienen un 10% de descuento"""
-        return self.precio * 0.9
\ No newline at end of file
+        return self.precio * self.FACTOR_DESCUENTO
\ No newline at end of file
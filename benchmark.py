@@ -0,0 +1,748 @@
+"""
+Pruebas de rendimiento del modelo (se ejecutan sin interfaz grafica)
+
+Uso:
+    python benchmark.py memoria [--n 1000000]
+    python benchmark.py importacion [--n 1000000] [--db ruta.db]
+    python benchmark.py servidor [--conexiones 8] [--segundos 10] [--url http://127.0.0.1:8000]
+    python benchmark.py concurrencia [--cajas 8] [--lectores 4] [--segundos 5] [--db ruta.db]
+    python benchmark.py totales [--operaciones 1000000] [--articulos 1000]
+    python benchmark.py lotes [--pedidos 20000] [--procesos 1 2 4]
+    python benchmark.py archivo [--facturas 100000] [--lineas 5]
+    python benchmark.py catalogo [--n 1000000]
+    python benchmark.py suite [--tamanos 1000 10000] [--salida actual.json] [--comparar referencia.json]
+
+La suite escribe los resultados en JSON; para detectar regresiones se guarda una
+referencia (--salida referencia.json) y despues se ejecuta con --comparar referencia.json
+"""
+import argparse
+import csv
+import gc
+import http.client
+import io
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+from modelo.articulo import ArticuloFisico
+from modelo.factura import Factura
+from modelo.exportacion import escritura_atomica, exportar_facturas
+from modelo.archivo_binario import LectorArchivo, escribir_archivo
+from modelo.catalogo_mmap import CatalogoMmap
+from modelo.persona import Cliente
+from modelo.modelo_logica import ModeloLogica
+from modelo.modelo_concurrente import ModeloConcurrente
+from modelo.almacen_sqlite import AlmacenSQLite
+from modelo.excepciones import ArticuloNoEncontradoError
+
+
+class _ArticuloFisicoConDict:
+    """
+    Replica de la representacion anterior de ArticuloFisico (sin __slots__)
+    Solo sirve como referencia para comparar el consumo de memoria
+    """
+    def __init__(self, codigo: str, denominacion: str, precio: float, peso: float):
+        self.__codigo = codigo
+        self.__denominacion = denominacion
+        self.__precio = precio
+        self.__peso = peso
+
+
+def medir_memoria(clase, n: int) -> float:
+    """Crea n articulos de la clase dada y devuelve los bytes usados por objeto"""
+    gc.collect()
+    tracemalloc.start()
+    inicio, _ = tracemalloc.get_traced_memory()
+    articulos = [clase(f"A{i}", "articulo de prueba", float(i), 1.5) for i in range(n)]
+    fin, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del articulos
+    return (fin - inicio) / n
+
+
+def comando_memoria(args: argparse.Namespace) -> None:
+    """Compara la memoria por articulo antes y despues de usar __slots__"""
+    muestra_antes = _ArticuloFisicoConDict("A0", "articulo de prueba", 0.0, 1.5)
+    muestra_despues = ArticuloFisico("A0", "articulo de prueba", 0.0, 1.5)
+    tam_antes = sys.getsizeof(muestra_antes) + sys.getsizeof(muestra_antes.__dict__)
+    tam_despues = sys.getsizeof(muestra_despues)
+
+    antes = medir_memoria(_ArticuloFisicoConDict, args.n)
+    despues = medir_memoria(ArticuloFisico, args.n)
+
+    print(f"articulos: {args.n}")
+    print(f"objeto sin slots: {tam_antes} bytes (objeto + __dict__)")
+    print(f"objeto con slots: {tam_despues} bytes")
+    print(f"memoria total sin slots: {antes:.1f} bytes/articulo ({antes * args.n / 2**20:.1f} MiB)")
+    print(f"memoria total con slots: {despues:.1f} bytes/articulo ({despues * args.n / 2**20:.1f} MiB)")
+    print(f"ahorro: {(1 - despues / antes) * 100:.1f}%")
+
+
+def generar_csv_articulos(ruta: str, n: int) -> None:
+    """Escribe un CSV de n articulos (mitad fisicos, mitad digitales)"""
+    with open(ruta, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["tipo", "codigo", "denominacion", "precio", "peso", "licencia"])
+        for i in range(n):
+            if i % 2:
+                writer.writerow(["fisico", f"A{i}", f"articulo {i}", f"{i % 1000}.5", "1.25", ""])
+            else:
+                writer.writerow(["digital", f"A{i}", f"articulo {i}", f"{i % 1000}.5", "", f"LIC-{i}"])
+
+
+def comando_importacion(args: argparse.Namespace) -> None:
+    """Mide las filas por segundo de la importacion masiva de articulos"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "articulos.csv")
+        generar_csv_articulos(ruta, args.n)
+        almacen = AlmacenSQLite(args.db) if args.db else None
+        modelo = ModeloLogica(almacen=almacen)
+        inicio = time.perf_counter()
+        informe = modelo.importar_articulos(ruta)
+        segundos = time.perf_counter() - inicio
+        if almacen is not None:
+            almacen.cerrar()
+    print(f"filas: {informe.total} (importadas {informe.importados}, errores {len(informe.errores)})")
+    print(f"tiempo: {segundos:.2f} s")
+    print(f"rendimiento: {informe.total / segundos:,.0f} filas/s")
+
+
+def comando_catalogo(args: argparse.Namespace) -> None:
+    """Arranque, memoria y busquedas con el catalogo en memoria frente al CatalogoMmap"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_csv = os.path.join(directorio, "articulos.csv")
+        ruta = os.path.join(directorio, "articulos.cat")
+        generar_csv_articulos(ruta_csv, args.n)
+        codigos = [f"A{random.randrange(args.n)}" for _ in range(10_000)]
+
+        gc.collect()
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        modelo = ModeloLogica()
+        modelo.importar_articulos(ruta_csv)
+        segundos = time.perf_counter() - inicio
+        memoria = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"en memoria: arranque {segundos:8.3f} s  memoria {memoria / 2**20:8.1f} MiB")
+        modelo.guardar_catalogo(ruta)
+        del modelo
+        gc.collect()
+
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        modelo = ModeloLogica(catalogo=CatalogoMmap(ruta))
+        segundos = time.perf_counter() - inicio
+        memoria = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"mmap:       arranque {segundos:8.3f} s  memoria {memoria / 2**20:8.1f} MiB"
+              f"  archivo {os.path.getsize(ruta) / 2**20:.1f} MiB")
+        for vuelta in ("sin cache", "con cache"):
+            inicio = time.perf_counter()
+            for codigo in codigos:
+                modelo.buscar_articulo(codigo)
+            print(f"buscar_articulo ({vuelta}): {(time.perf_counter() - inicio) / len(codigos) * 1e6:.1f} us")
+        inicio = time.perf_counter()
+        for codigo in codigos[:1000]:
+            modelo.sugerir_articulos(codigo[:4], 20)
+        print(f"sugerir_articulos: {(time.perf_counter() - inicio) / 1000 * 1e6:.1f} us")
+
+
+def generar_csv_pedidos(ruta: str, pedidos: int, clientes: int, articulos: int) -> None:
+    """Escribe un CSV de pedidos de 1 a 10 lineas de clientes y articulos al azar"""
+    aleatorio = random.Random(1)
+    with open(ruta, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["pedido", "dni", "codigo", "cantidad"])
+        for pedido in range(pedidos):
+            dni = f"{aleatorio.randrange(clientes):08d}X"
+            for _ in range(aleatorio.randint(1, 10)):
+                writer.writerow([pedido, dni, f"A{aleatorio.randrange(articulos)}", aleatorio.randint(1, 5)])
+
+
+def comando_lotes(args: argparse.Namespace) -> None:
+    """Pedidos por segundo de la facturacion por lotes con distintos numeros de procesos"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_articulos = os.path.join(directorio, "articulos.csv")
+        ruta_pedidos = os.path.join(directorio, "pedidos.csv")
+        generar_csv_articulos(ruta_articulos, args.articulos)
+        generar_csv_pedidos(ruta_pedidos, args.pedidos, args.clientes, args.articulos)
+        print(f"CPUs: {os.cpu_count()}, pedidos: {args.pedidos}")
+        referencia = None
+        for procesos in args.procesos:
+            modelo = ModeloLogica() # Historial vacio en cada ronda: mismos ids y mismo trabajo
+            modelo.importar_articulos(ruta_articulos)
+            with modelo.lote():
+                for i in range(args.clientes):
+                    modelo.registrar_cliente(f"cliente {i}", "prueba", f"{i:08d}X")
+            destino = os.path.join(directorio, "facturas.jsonl") if args.exportar else None
+            inicio = time.perf_counter()
+            informe = modelo.facturar_pedidos(ruta_pedidos, procesos=procesos, destino=destino)
+            segundos = time.perf_counter() - inicio
+            referencia = referencia or segundos
+            print(f"procesos {procesos:>2}: {segundos:6.2f} s  {informe.facturas / segundos:10,.0f} pedidos/s"
+                  f"  aceleracion x{referencia / segundos:.2f}  errores {len(informe.errores)}")
+
+
+def generar_facturas(facturas: int, lineas: int, articulos: int = 10_000, clientes: int = 10_000):
+    """Facturas de prueba, de una en una (no se guardan todas en memoria)"""
+    aleatorio = random.Random(1)
+    catalogo = [ArticuloFisico(f"A{i:07d}", f"articulo de prueba {i}", 1 + i % 100, 1.0) for i in range(articulos)]
+    for id_factura in range(1, facturas + 1):
+        i = aleatorio.randrange(clientes)
+        factura = Factura(Cliente(f"cliente {i}", "prueba", f"{i:08d}X"), id_factura)
+        for articulo in aleatorio.sample(catalogo, lineas):
+            factura.agregar_linea(articulo, aleatorio.randint(1, 5))
+        yield factura
+
+
+def comando_archivo(args: argparse.Namespace) -> None:
+    """Tamaño y velocidad del archivo binario frente a JSON Lines, y memoria al recorrerlo"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "facturas.tfb")
+        ruta_jsonl = os.path.join(directorio, "facturas.jsonl")
+        for nombre, escribir in (("binario", lambda: escribir_archivo(generar_facturas(args.facturas, args.lineas), ruta)),
+                                 ("jsonl", lambda: exportar_facturas(generar_facturas(args.facturas, args.lineas),
+                                                                     ruta_jsonl, "jsonl"))):
+            inicio = time.perf_counter()
+            escribir()
+            segundos = time.perf_counter() - inicio
+            tamano = os.path.getsize(ruta if nombre == "binario" else ruta_jsonl)
+            print(f"escribir {nombre:>7}: {segundos:6.2f} s  {tamano / 2**20:8.1f} MiB  {tamano / args.facturas:6.1f} bytes/factura")
+
+        with LectorArchivo(ruta) as archivo:
+            ids = [random.randint(1, args.facturas) for _ in range(10_000)]
+            inicio = time.perf_counter()
+            for id_factura in ids:
+                archivo.factura(id_factura)
+            print(f"factura(id) al azar: {(time.perf_counter() - inicio) / len(ids) * 1e6:.1f} us")
+
+            inicio = time.perf_counter()
+            total = sum(factura.total for factura in archivo.recorrer())
+            segundos = time.perf_counter() - inicio
+            tracemalloc.start() # En otra pasada: tracemalloc ralentiza mucho
+            for _ in archivo.recorrer():
+                pass
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"recorrer: {segundos:6.2f} s  {args.facturas / segundos:10,.0f} facturas/s"
+                  f"  pico de memoria {pico / 2**20:.2f} MiB  (importe {total:,.2f})")
+
+
+def _peticion(conexion: http.client.HTTPConnection, metodo: str, ruta: str, datos=None):
+    """Hace una peticion por una conexion persistente y devuelve (estado, json)"""
+    cuerpo = json.dumps(datos) if datos is not None else None
+    cabeceras = {"Content-Type": "application/json"} if cuerpo is not None else {}
+    conexion.request(metodo, ruta, cuerpo, cabeceras)
+    respuesta = conexion.getresponse()
+    contenido = respuesta.read() # Hay que leerla entera para reutilizar la conexion
+    return respuesta.status, json.loads(contenido) if contenido else None
+
+
+def _caja(host: str, puerto: int, dni: str, codigos: list, fin: float, latencias: list, errores: list) -> None:
+    """
+    Una caja: abre facturas y les añade lineas (con alguna consulta de articulo)
+    hasta el instante `fin`, guardando la latencia de cada peticion
+    """
+    conexion = http.client.HTTPConnection(host, puerto)
+    factura = None
+    while time.perf_counter() < fin:
+        if factura is None or random.random() < 0.02: # De vez en cuando se cierra y se abre otra
+            if factura is not None:
+                peticion = ("POST", f"/facturas/{factura}/cerrar", None)
+            else:
+                peticion = ("POST", "/facturas", {"dni": dni})
+        elif random.random() < 0.3:
+            peticion = ("GET", f"/articulos/{random.choice(codigos)}", None)
+        else:
+            peticion = ("POST", f"/facturas/{factura}/lineas", {"codigo": random.choice(codigos), "cantidad": 1})
+        inicio = time.perf_counter()
+        estado, respuesta = _peticion(conexion, *peticion)
+        latencias.append(time.perf_counter() - inicio)
+        if estado >= 400:
+            errores.append(estado)
+        elif peticion[1] == "/facturas":
+            factura = respuesta["id"]
+        elif peticion[1].endswith("/cerrar"):
+            factura = None
+    conexion.close()
+
+
+def comando_servidor(args: argparse.Namespace) -> None:
+    """Peticiones por segundo y latencias del servidor HTTP con varias cajas a la vez"""
+    servidor = None
+    if args.url:
+        partes = urlsplit(args.url)
+        host, puerto = partes.hostname, partes.port or 80
+    else:
+        from servidor import ServidorTienda # Solo hace falta si se arranca aqui
+        servidor = ServidorTienda(("127.0.0.1", 0), ModeloLogica())
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        host, puerto = servidor.server_address
+
+    # Datos de prueba: un cliente por caja y un catalogo de articulos
+    conexion = http.client.HTTPConnection(host, puerto)
+    prefijo = f"bench{int(time.time())}"
+    codigos = [f"{prefijo}-A{i}" for i in range(args.articulos)]
+    for i, codigo in enumerate(codigos):
+        _peticion(conexion, "POST", "/articulos", {"tipo": "fisico", "codigo": codigo,
+                                                   "denominacion": f"articulo {i}", "precio": 1.5, "peso": 1.0})
+    dnis = [f"{prefijo}-C{i}" for i in range(args.conexiones)]
+    for dni in dnis:
+        _peticion(conexion, "POST", "/clientes", {"nombre": "caja", "apellidos": "prueba", "dni": dni})
+    conexion.close()
+
+    latencias: list = []
+    errores: list = []
+    fin = time.perf_counter() + args.segundos
+    hilos = [threading.Thread(target=_caja, args=(host, puerto, dni, codigos, fin, latencias, errores))
+             for dni in dnis]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+    if servidor is not None:
+        servidor.shutdown()
+        servidor.server_close()
+
+    latencias.sort()
+    def percentil(p: float) -> float:
+        return latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000
+    print(f"conexiones: {args.conexiones} (keep-alive), duracion: {segundos:.1f} s")
+    print(f"peticiones: {len(latencias)} (errores {len(errores)})")
+    print(f"rendimiento: {len(latencias) / segundos:,.0f} peticiones/s")
+    print(f"latencia: p50 {percentil(0.50):.2f} ms, p99 {percentil(0.99):.2f} ms, max {latencias[-1] * 1000:.2f} ms")
+
+
+def comando_concurrencia(args: argparse.Namespace) -> None:
+    """
+    Prueba de estres de ModeloConcurrente: cajas que facturan, lectores que buscan,
+    un hilo que da de alta y baja articulos y otro que exporta facturas abiertas,
+    todos a la vez. Al final comprueba que el estado es coherente
+    """
+    almacen = AlmacenSQLite(args.db) if args.db else None
+    modelo = ModeloConcurrente(almacen=almacen)
+    codigos = [f"A{i}" for i in range(args.articulos)]
+    with modelo.lote():
+        for codigo in codigos:
+            modelo.registrar_articulo_fisico(codigo, f"articulo {codigo}", 2.5, 1.0)
+        for caja in range(args.cajas):
+            modelo.registrar_cliente("caja", str(caja), f"C{caja}")
+
+    parar = threading.Event() # Todos los hilos arrancan antes de empezar a contar el tiempo
+    problemas: list = []
+    operaciones = itertools.count() # next() es atomico: sirve de contador entre hilos
+    esperadas: dict = {} # id de factura -> {codigo: cantidad} que deberia tener
+    catalogo_esperado = set(codigos)
+    # Lo que deben dar las busquedas de los lectores: las altas y bajas (codigos X) no lo cambian
+    sugeridos = modelo.sugerir_articulos("A1", 10)
+    encontrados = [a.codigo for a in modelo.buscar_articulos("articulo a2", 10)]
+    if len(sugeridos) < 10 or len(encontrados) < 10:
+        raise SystemExit("el catalogo es demasiado pequeño para las busquedas de la prueba (--articulos)")
+
+    def vigilar(funcion, *argumentos) -> threading.Thread:
+        """Hilo que ejecuta la funcion y anota como fallo cualquier excepcion"""
+        def hilo():
+            try:
+                funcion(*argumentos)
+            except Exception as e:
+                problemas.append(f"{funcion.__name__}: {type(e).__name__}: {e}")
+        return threading.Thread(target=hilo)
+
+    def caja(dni: str) -> None:
+        while not parar.is_set():
+            factura = modelo.crear_nueva_factura(dni)
+            lineas: dict = {}
+            for _ in range(random.randint(1, 30)):
+                azar = random.random()
+                if lineas and azar < 0.2:
+                    codigo = random.choice(list(lineas))
+                    modelo.eliminar_linea_factura(codigo, factura.id)
+                    del lineas[codigo]
+                elif lineas and azar < 0.3:
+                    codigo = random.choice(list(lineas))
+                    lineas[codigo] = random.randint(1, 5)
+                    modelo.ajustar_linea_factura(codigo, lineas[codigo], factura.id)
+                else:
+                    # Pocos articulos por caja: se repiten y se suman a su linea
+                    codigo, cantidad = random.choice(codigos[:50]), random.randint(1, 3)
+                    modelo.agregar_linea_factura(codigo, cantidad, factura.id)
+                    lineas[codigo] = lineas.get(codigo, 0) + cantidad
+                next(operaciones)
+            modelo.cerrar_factura(factura.id)
+            esperadas[factura.id] = lineas
+
+    def lector() -> None:
+        while not parar.is_set():
+            azar = random.random()
+            if azar < 1 / 3:
+                codigo = random.choice(codigos)
+                leido = modelo.buscar_articulo(codigo).codigo
+                esperado = codigo
+            elif azar < 2 / 3:
+                leido, esperado = modelo.sugerir_articulos("A1", 10), sugeridos
+            else:
+                leido, esperado = [a.codigo for a in modelo.buscar_articulos("articulo a2", 10)], encontrados
+            if leido != esperado: # Se anota la primera lectura mala y el lector termina
+                problemas.append(f"lectura incorrecta: {leido!r} en lugar de {esperado!r}")
+                return
+            next(operaciones)
+
+    def altas_y_bajas() -> None:
+        n = 0
+        while not parar.is_set():
+            codigo = f"X{n}"
+            # Una sola palabra, la de las busquedas: va delante de los "articulo A..." en su indice
+            modelo.registrar_articulo_digital(codigo, "articulo", 1.0, "L")
+            if n % 2:
+                modelo.eliminar_articulo(codigo)
+            else:
+                catalogo_esperado.add(codigo)
+            n += 1
+            next(operaciones)
+
+    def exportador() -> None:
+        while not parar.is_set():
+            for factura in modelo.facturas_abiertas:
+                flujo = io.StringIO()
+                modelo.exportar_factura_json(flujo, factura.id)
+                datos = json.loads(flujo.getvalue())
+                suma = sum(linea["subtotal"] for linea in datos["lineas"])
+                if abs(suma - datos["total"]) > 1e-6: # Una factura leida a medio cambiar
+                    problemas.append(f"factura {datos['id']} exportada con total {datos['total']} y lineas {suma}")
+                next(operaciones)
+            time.sleep(0.001)
+
+    hilos = [vigilar(caja, f"C{i}") for i in range(args.cajas)]
+    hilos += [vigilar(lector) for _ in range(args.lectores)]
+    hilos += [vigilar(altas_y_bajas), vigilar(exportador)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(args.segundos)
+    parar.set()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+    total_operaciones = next(operaciones)
+
+    # Invariantes
+    facturas = list(modelo.recorrer_facturas())
+    if len({f.id for f in facturas}) != len(facturas):
+        problemas.append("ids de factura repetidos")
+    for factura in facturas:
+        if factura.id not in esperadas:
+            problemas.append(f"factura {factura.id} sin cerrar")
+        elif {l.articulo.codigo: l.cantidad for l in factura.lineas} != esperadas[factura.id]:
+            problemas.append(f"factura {factura.id}: las lineas no coinciden con las añadidas y quitadas")
+        if abs(factura.total - sum(l.subtotal for l in factura.lineas)) > 1e-6:
+            problemas.append(f"factura {factura.id}: total acumulado distinto de la suma de lineas")
+    if modelo.facturas_abiertas:
+        problemas.append(f"{len(modelo.facturas_abiertas)} facturas siguen abiertas")
+    if {a.codigo for a in modelo.articulos} != catalogo_esperado:
+        problemas.append("el catalogo no coincide con las altas y bajas hechas")
+    if modelo.sugerir_articulos("X", 10 ** 9) != sorted(c for c in catalogo_esperado if c.startswith("X")):
+        problemas.append("el indice de prefijos no coincide con el catalogo")
+    try:
+        modelo.buscar_articulo("X1")
+        problemas.append("un articulo borrado sigue en el catalogo")
+    except ArticuloNoEncontradoError:
+        pass
+    if almacen is not None:
+        almacen.cerrar()
+
+    print(f"hilos: {len(hilos)} ({args.cajas} cajas, {args.lectores} lectores, altas/bajas, exportador)")
+    print(f"operaciones: {total_operaciones:,} en {segundos:.1f} s ({total_operaciones / segundos:,.0f}/s)")
+    print(f"facturas: {len(facturas)}, articulos: {len(catalogo_esperado)}")
+    if problemas:
+        for problema in problemas[:20]:
+            print(f"FALLO: {problema}")
+        raise SystemExit(1)
+    print("invariantes: OK")
+
+
+def comando_totales(args: argparse.Namespace) -> None:
+    """
+    Comprueba que el total acumulado de Factura coincide con recalcular(): muchas altas,
+    ajustes y bajas de lineas con precios con decimales, comparando cada cierto tiempo
+    """
+    aleatorio = random.Random(args.semilla)
+    articulos = [ArticuloFisico(f"A{i}", f"articulo {i}", round(aleatorio.uniform(0.01, 5000), 2), 1.0)
+                 for i in range(args.articulos)]
+    factura = Factura(Cliente("prueba", "totales", "00000000T"))
+    problemas = []
+    maxima = 0.0
+    for operacion in range(1, args.operaciones + 1):
+        azar = aleatorio.random()
+        articulo = aleatorio.choice(articulos)
+        precio = round(articulo.precio * aleatorio.uniform(0.5, 1.0), 4)
+        if azar < 0.5:
+            factura.agregar_linea(articulo, aleatorio.randint(1, 50), precio)
+        elif azar < 0.8 and factura.linea(articulo.codigo) is not None:
+            factura.ajustar_linea(articulo.codigo, aleatorio.randint(1, 50), precio)
+        else:
+            factura.eliminar_linea(articulo.codigo)
+        if operacion % 1000 == 0 or operacion == args.operaciones:
+            incremental = factura.total
+            # recalcular() corrige el acumulado: solo al final, para que el error se acumule toda la prueba
+            completo = factura.recalcular() if operacion == args.operaciones else math.fsum(
+                linea.subtotal for linea in factura.lineas)
+            maxima = max(maxima, abs(incremental - completo))
+            if not math.isclose(incremental, completo, rel_tol=1e-9, abs_tol=1e-6):
+                problemas.append(f"operacion {operacion}: total {incremental!r} != recalcular() {completo!r}")
+
+    print(f"operaciones: {args.operaciones:,}, lineas al final: {len(factura.lineas)}, "
+          f"mayor diferencia: {maxima:.3g}")
+    if problemas:
+        for problema in problemas[:20]:
+            print(f"FALLO: {problema}")
+        raise SystemExit(1)
+    print("total incremental == recalcular(): OK")
+
+
+# Suite de escalado: cada operacion con 10^3 ... 10^6 entidades
+
+TAMANOS_SUITE = (1_000, 10_000, 100_000, 1_000_000)
+TOLERANCIA_SUITE = 0.25 # Mas de un 25% mas lento que la referencia cuenta como regresion
+# Y ademas al menos estos ns por operacion: en las operaciones de pocos ns el ruido supera el 25%
+DIFERENCIA_MINIMA_SUITE_NS = 50
+REPETICIONES_SUITE = 7
+# Lineas que se borran (por codigo) en cada ronda, como mucho n
+BORRADOS_POR_RONDA = 10_000
+CONSULTAS_DE_TOTAL = 100_000
+
+
+def _cronometrar(tiempos: dict, operacion: str, veces: int, funcion, *argumentos) -> None:
+    """Ejecuta la funcion y añade sus segundos a los de las rondas anteriores: (veces, [segundos...])"""
+    gc.collect()
+    inicio = time.perf_counter()
+    funcion(*argumentos)
+    segundos = time.perf_counter() - inicio
+    tiempos.setdefault(operacion, (veces, []))[1].append(segundos)
+
+
+def _ronda_suite(n: int, directorio: str, tiempos: dict) -> None:
+    """Una ronda de todas las operaciones con n clientes, n articulos y una factura de n lineas"""
+    modelo = ModeloLogica()
+    dnis = [f"C{i}" for i in range(n)]
+    codigos = [f"A{i}" for i in range(n)]
+    mitad = n // 2
+
+    def registrar_clientes():
+        for dni in dnis:
+            modelo.registrar_cliente("cliente", "de prueba", dni)
+
+    def registrar_fisicos():
+        for codigo in codigos[:mitad]:
+            modelo.registrar_articulo_fisico(codigo, f"articulo {codigo}", 1.5, 1.0)
+
+    def registrar_digitales():
+        for codigo in codigos[mitad:]:
+            modelo.registrar_articulo_digital(codigo, f"articulo {codigo}", 1.5, "LIC")
+
+    _cronometrar(tiempos, "registrar_cliente", n, registrar_clientes)
+    _cronometrar(tiempos, "registrar_articulo_fisico", mitad, registrar_fisicos)
+    _cronometrar(tiempos, "registrar_articulo_digital", n - mitad, registrar_digitales)
+
+    # Las busquedas van en orden aleatorio para no favorecer a la cache
+    aleatorio = random.Random(n)
+    dnis_al_azar = aleatorio.sample(dnis, n)
+    codigos_al_azar = aleatorio.sample(codigos, n)
+
+    def buscar_clientes():
+        for dni in dnis_al_azar:
+            modelo.buscar_cliente(dni)
+
+    def buscar_articulos():
+        for codigo in codigos_al_azar:
+            modelo.buscar_articulo(codigo)
+
+    _cronometrar(tiempos, "buscar_cliente", n, buscar_clientes)
+    _cronometrar(tiempos, "buscar_articulo", n, buscar_articulos)
+
+    factura = Factura(modelo.buscar_cliente(dnis[0]), id_factura=1)
+    articulos = [modelo.buscar_articulo(codigo) for codigo in codigos_al_azar]
+
+    def agregar_lineas():
+        for articulo in articulos:
+            factura.agregar_linea(articulo, 2)
+
+    def consultar_total():
+        for _ in range(CONSULTAS_DE_TOTAL):
+            factura.total
+
+    _cronometrar(tiempos, "Factura.agregar_linea", n, agregar_lineas)
+    # Articulos que ya estan en la factura: se suman a su linea
+    _cronometrar(tiempos, "Factura.agregar_linea_existente", n, agregar_lineas)
+    # Lo mismo desde el modelo, con los precios calculados en bloque por el motor de precios
+    otra = modelo.crear_nueva_factura(dnis[0])
+    lineas = [(codigo, 2) for codigo in codigos_al_azar]
+    _cronometrar(tiempos, "agregar_lineas_factura", n, modelo.agregar_lineas_factura, lineas, otra.id)
+    _cronometrar(tiempos, "Factura.total", CONSULTAS_DE_TOTAL, consultar_total)
+    _cronometrar(tiempos, "Factura.exportar_json", n, factura.exportar_json, os.path.join(directorio, "factura.json"))
+    _cronometrar(tiempos, "Factura.exportar_csv", n, factura.exportar_csv, os.path.join(directorio, "factura.csv"))
+
+    borrados = min(n, BORRADOS_POR_RONDA)
+    a_borrar = aleatorio.sample(codigos, borrados)
+
+    def eliminar_lineas():
+        for codigo in a_borrar:
+            factura.eliminar_linea(codigo)
+
+    _cronometrar(tiempos, "Factura.eliminar_linea", borrados, eliminar_lineas)
+
+
+def ejecutar_suite(tamanos, repeticiones: int) -> dict:
+    """Mide todas las operaciones para cada tamaño: la mejor y la mediana de `repeticiones` rondas"""
+    resultados = []
+    with tempfile.TemporaryDirectory() as directorio:
+        for n in tamanos:
+            tiempos: dict = {}
+            for _ in range(repeticiones):
+                _ronda_suite(n, directorio, tiempos)
+            for operacion, (veces, rondas) in tiempos.items():
+                segundos = min(rondas)
+                mediana = statistics.median(rondas)
+                resultados.append({"operacion": operacion, "n": n, "veces": veces, "segundos": segundos,
+                                   "ns_por_operacion": segundos / veces * 1e9,
+                                   "ns_mediana": mediana / veces * 1e9})
+                print(f"{operacion:<28} n={n:<9} {segundos / veces * 1e9:>12,.0f} ns/op "
+                      f"(mediana {mediana / veces * 1e9:,.0f})", file=sys.stderr)
+    return {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "plataforma": sys.platform,
+        "repeticiones": repeticiones,
+        "resultados": resultados,
+    }
+
+
+def _ns_comparables(resultado: dict) -> float:
+    # La mediana de las rondas varia menos entre ejecuciones; los JSON antiguos solo tienen la mejor
+    return resultado.get("ns_mediana", resultado["ns_por_operacion"])
+
+
+def comparar_suite(actual: dict, referencia: dict, tolerancia: float,
+                   diferencia_minima: float = DIFERENCIA_MINIMA_SUITE_NS) -> list:
+    """
+    Compara la mediana de ns por operacion con la referencia
+    Es regresion si empeora mas de `tolerancia` y ademas mas de `diferencia_minima` ns
+    Devuelve las regresiones: (operacion, n, ns referencia, ns actual, cociente)
+    """
+    base = {(r["operacion"], r["n"]): _ns_comparables(r) for r in referencia["resultados"]}
+    regresiones = []
+    for r in actual["resultados"]:
+        anterior = base.get((r["operacion"], r["n"]))
+        if anterior is None:
+            continue # Operacion o tamaño nuevo: no hay con que comparar
+        ns = _ns_comparables(r)
+        cociente = ns / anterior
+        marca = "REGRESION" if cociente > 1 + tolerancia and ns - anterior > diferencia_minima else ""
+        print(f"{r['operacion']:<28} n={r['n']:<9} {anterior:>12,.0f} -> {ns:>12,.0f} ns/op "
+              f"({cociente:.2f}x) {marca}")
+        if marca:
+            regresiones.append((r["operacion"], r["n"], anterior, ns, cociente))
+    return regresiones
+
+
+def comando_suite(args: argparse.Namespace) -> None:
+    """Suite de escalado con salida JSON; con --comparar falla si hay regresiones"""
+    if args.resultados:
+        with open(args.resultados, "r", encoding="utf-8") as f:
+            actual = json.load(f)
+    else:
+        actual = ejecutar_suite(args.tamanos, args.repeticiones)
+    if args.salida:
+        with escritura_atomica(args.salida) as f:
+            json.dump(actual, f, indent=2)
+    elif not args.comparar:
+        json.dump(actual, sys.stdout, indent=2)
+        print()
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            referencia = json.load(f)
+        regresiones = comparar_suite(actual, referencia, args.tolerancia, args.diferencia_minima)
+        if regresiones:
+            print(f"{len(regresiones)} regresion(es) de mas del {args.tolerancia:.0%}")
+            raise SystemExit(1)
+        print("sin regresiones")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="pruebas de rendimiento de la tienda")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_memoria = subparsers.add_parser("memoria", help="memoria por articulo con y sin __slots__")
+    p_memoria.add_argument("--n", type=int, default=1_000_000, help="numero de articulos")
+    p_memoria.set_defaults(funcion=comando_memoria)
+
+    p_importacion = subparsers.add_parser("importacion", help="filas por segundo al importar un CSV")
+    p_importacion.add_argument("--n", type=int, default=1_000_000, help="numero de filas")
+    p_importacion.add_argument("--db", help="importar a esta base de datos SQLite en lugar de memoria")
+    p_importacion.set_defaults(funcion=comando_importacion)
+
+    p_servidor = subparsers.add_parser("servidor", help="peticiones por segundo y latencia p99 del servidor HTTP")
+    p_servidor.add_argument("--conexiones", type=int, default=8, help="cajas simultaneas (una conexion cada una)")
+    p_servidor.add_argument("--segundos", type=float, default=10.0, help="duracion de la prueba")
+    p_servidor.add_argument("--articulos", type=int, default=1000, help="articulos del catalogo de prueba")
+    p_servidor.add_argument("--url", help="servidor ya arrancado (por defecto se arranca uno en memoria)")
+    p_servidor.set_defaults(funcion=comando_servidor)
+
+    p_concurrencia = subparsers.add_parser("concurrencia", help="prueba de estres de ModeloConcurrente")
+    p_concurrencia.add_argument("--cajas", type=int, default=8, help="hilos que facturan")
+    p_concurrencia.add_argument("--lectores", type=int, default=4, help="hilos que buscan articulos")
+    p_concurrencia.add_argument("--segundos", type=float, default=5.0, help="duracion de la prueba")
+    p_concurrencia.add_argument("--articulos", type=int, default=10_000, help="articulos del catalogo")
+    p_concurrencia.add_argument("--db", help="usar esta base de datos SQLite en lugar de memoria")
+    p_concurrencia.set_defaults(funcion=comando_concurrencia)
+
+    p_totales = subparsers.add_parser("totales", help="total incremental de Factura frente a recalcular()")
+    p_totales.add_argument("--operaciones", type=int, default=1_000_000, help="altas, ajustes y bajas de lineas")
+    p_totales.add_argument("--articulos", type=int, default=1000, help="articulos distintos")
+    p_totales.add_argument("--semilla", type=int, default=1)
+    p_totales.set_defaults(funcion=comando_totales)
+
+    p_lotes = subparsers.add_parser("lotes", help="escalado de la facturacion por lotes con el numero de procesos")
+    p_lotes.add_argument("--pedidos", type=int, default=20_000, help="pedidos del archivo de prueba")
+    p_lotes.add_argument("--clientes", type=int, default=2_000, help="clientes distintos")
+    p_lotes.add_argument("--articulos", type=int, default=10_000, help="articulos del catalogo")
+    p_lotes.add_argument("--procesos", type=int, nargs="+", default=[1, 2, 4, 8], help="numeros de procesos a medir")
+    p_lotes.add_argument("--exportar", action="store_true", help="exportar tambien las facturas (JSON Lines)")
+    p_lotes.set_defaults(funcion=comando_lotes)
+
+    p_archivo = subparsers.add_parser("archivo", help="archivo binario de facturas: tamaño, acceso directo y recorrido")
+    p_archivo.add_argument("--facturas", type=int, default=100_000, help="facturas del archivo de prueba")
+    p_archivo.add_argument("--lineas", type=int, default=5, help="lineas por factura")
+    p_archivo.set_defaults(funcion=comando_archivo)
+
+    p_catalogo = subparsers.add_parser("catalogo", help="arranque y busquedas con el catalogo en un archivo (mmap)")
+    p_catalogo.add_argument("--n", type=int, default=1_000_000, help="numero de articulos")
+    p_catalogo.set_defaults(funcion=comando_catalogo)
+
+    p_suite = subparsers.add_parser("suite", help="tiempo por operacion de 10^3 a 10^6 entidades, en JSON")
+    p_suite.add_argument("--tamanos", type=int, nargs="+", default=list(TAMANOS_SUITE), help="numeros de entidades")
+    p_suite.add_argument("--repeticiones", type=int, default=REPETICIONES_SUITE,
+                         help="rondas por tamaño (se guardan la mejor y la mediana)")
+    p_suite.add_argument("--salida", help="guardar los resultados en este JSON (por defecto se escriben en pantalla)")
+    p_suite.add_argument("--comparar", help="JSON de referencia: sale con error si hay regresiones")
+    p_suite.add_argument("--tolerancia", type=float, default=TOLERANCIA_SUITE, help="empeoramiento tolerado (0.25 = 25%%)")
+    p_suite.add_argument("--diferencia-minima", type=float, default=DIFERENCIA_MINIMA_SUITE_NS,
+                         help="ns por operacion que ademas tiene que empeorar para contar como regresion")
+    p_suite.add_argument("--resultados", help="comparar este JSON ya medido en lugar de ejecutar la suite")
+    p_suite.set_defaults(funcion=comando_suite)
+
+    args = parser.parse_args()
+    args.funcion(args)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,301 @@
+from array import array
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional
+from weakref import WeakValueDictionary
+from .articulo import ArticuloBase, ArticuloFisico, ArticuloDigital
+from .excepciones import ArticuloNoEncontradoError, PrecioInvalidoError
+
+try:
+    import numpy as np # Opcional: acelera las operaciones en bloque
+except ImportError:
+    np = None
+
+# Codigos de la columna de tipos
+TIPO_BORRADO = -1
+TIPO_FISICO = 0
+TIPO_DIGITAL = 1
+TIPOS = {"fisico": TIPO_FISICO, "digital": TIPO_DIGITAL}
+
+# Filas borradas a partir de las que se compactan las columnas (si ademas son mas que las vivas)
+FILAS_BORRADAS_MINIMAS = 1024
+
+
+def tipo_articulo(articulo: ArticuloBase) -> str:
+    """Devuelve 'fisico' o 'digital' segun la clase del articulo"""
+    return "fisico" if isinstance(articulo, ArticuloFisico) else "digital"
+
+
+class CatalogoColumnar(MutableMapping):
+    """
+    Catalogo de articulos guardado por columnas (precio, peso y tipo en arrays)
+    Se usa como un diccionario codigo -> articulo, pero los articulos que
+    devuelve son vistas ligeras sobre una fila, no objetos independientes
+    Permite cambiar precios y calcular descuentos de todo el catalogo en bloque
+    Borrar un articulo solo marca su fila: las vistas que aun lo usan (las lineas de
+    las facturas) siguen leyendo sus datos, pero ya no se le puede cambiar el precio.
+    Cuando hay muchas filas borradas se compactan las columnas y las vistas que se
+    han dado se mueven a su nueva fila (o se quedan con una copia de la borrada)
+    """
+    def __init__(self):
+        self.__filas: Dict[str, int] = {}
+        self.__codigos: List[str] = []
+        self.__denominaciones: List[str] = []
+        self.__licencias: List[Optional[str]] = []
+        self.__precios = array("d")
+        self.__pesos = array("d")
+        self.__tipos = array("b")
+        self.__borradas = 0
+        # fila -> vista dada por __getitem__ (mientras alguien la use), para moverla al compactar
+        self.__vistas: "WeakValueDictionary[int, ArticuloBase]" = WeakValueDictionary()
+
+    # Interfaz de diccionario
+
+    def __len__(self) -> int:
+        return len(self.__filas)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__filas)
+
+    def __contains__(self, codigo: object) -> bool:
+        return codigo in self.__filas
+
+    def __getitem__(self, codigo: str) -> ArticuloBase:
+        fila = self.__filas[codigo] # Lanza KeyError si no existe
+        vista = self.__vistas.get(fila)
+        if vista is None:
+            if self.__tipos[fila] == TIPO_FISICO:
+                vista = ArticuloFisicoFila(self, fila)
+            else:
+                vista = ArticuloDigitalFila(self, fila)
+            self.__vistas[fila] = vista
+        return vista
+
+    def __setitem__(self, codigo: str, articulo: ArticuloBase) -> None:
+        """Copia los datos del articulo a una fila nueva (o sobreescribe la existente)"""
+        if codigo in self.__filas:
+            del self[codigo]
+        self.__filas[codigo] = len(self.__codigos)
+        self.__codigos.append(codigo)
+        self.__denominaciones.append(articulo.denominacion)
+        self.__precios.append(articulo.precio)
+        if isinstance(articulo, ArticuloFisico):
+            self.__tipos.append(TIPO_FISICO)
+            self.__pesos.append(articulo.peso)
+            self.__licencias.append(None)
+        else:
+            self.__tipos.append(TIPO_DIGITAL)
+            self.__pesos.append(0.0)
+            self.__licencias.append(articulo.licencia)
+
+    def __delitem__(self, codigo: str) -> None:
+        """Marca la fila como borrada (sus datos se quedan para las vistas que la usan)"""
+        fila = self.__filas.pop(codigo)
+        self.__tipos[fila] = TIPO_BORRADO
+        self.__borradas += 1
+        if self.__borradas > max(FILAS_BORRADAS_MINIMAS, len(self.__filas)):
+            self.compactar()
+
+    def compactar(self) -> None:
+        """
+        Quita las filas borradas de las columnas. Las vistas que se han dado pasan a su
+        nueva fila, y las de articulos borrados a una copia de sus datos
+        """
+        vivas = [fila for fila, tipo in enumerate(self.__tipos) if tipo != TIPO_BORRADO]
+        nueva_de = {fila: nueva for nueva, fila in enumerate(vivas)}
+        vistas: "WeakValueDictionary[int, ArticuloBase]" = WeakValueDictionary()
+        for fila, vista in list(self.__vistas.items()):
+            nueva = nueva_de.get(fila)
+            if nueva is not None:
+                vista.reubicar(self, nueva)
+                vistas[nueva] = vista
+            else:
+                vista.reubicar(_FilaSuelta(self.__codigos[fila], self.__denominaciones[fila], self.__precios[fila],
+                                           self.__pesos[fila], self.__licencias[fila]), 0)
+        self.__vistas = vistas
+        self.__codigos = [self.__codigos[fila] for fila in vivas]
+        self.__denominaciones = [self.__denominaciones[fila] for fila in vivas]
+        self.__licencias = [self.__licencias[fila] for fila in vivas]
+        self.__precios = array("d", (self.__precios[fila] for fila in vivas))
+        self.__pesos = array("d", (self.__pesos[fila] for fila in vivas))
+        self.__tipos = array("b", (self.__tipos[fila] for fila in vivas))
+        self.__filas = {codigo: fila for fila, codigo in enumerate(self.__codigos)}
+        self.__borradas = 0
+
+    # Acceso por fila (lo usan las vistas)
+
+    def codigo_en(self, fila: int) -> str:
+        return self.__codigos[fila]
+
+    def denominacion_en(self, fila: int) -> str:
+        return self.__denominaciones[fila]
+
+    def precio_en(self, fila: int) -> float:
+        return self.__precios[fila]
+
+    def fijar_precio_en(self, fila: int, valor: float) -> None:
+        if self.__tipos[fila] == TIPO_BORRADO:
+            raise ArticuloNoEncontradoError(f"el articulo {self.__codigos[fila]} ya no esta en el catalogo")
+        if valor < 0:
+            raise PrecioInvalidoError("el precio no puede ser negativo")
+        self.__precios[fila] = valor
+
+    def peso_en(self, fila: int) -> float:
+        return self.__pesos[fila]
+
+    def licencia_en(self, fila: int) -> str:
+        return self.__licencias[fila]
+
+    @property
+    def codigos(self) -> List[Optional[str]]:
+        """Codigo de cada fila (None en las filas borradas)"""
+        return [codigo if tipo != TIPO_BORRADO else None for codigo, tipo in zip(self.__codigos, self.__tipos)]
+
+    # Operaciones en bloque
+
+    def ajustar_precios(self, factor: float = 1.0, incremento: float = 0.0, tipo: Optional[str] = None) -> int:
+        """
+        Aplica precio * factor + incremento a todos los articulos (o solo a los de un tipo)
+        Valida la columna completa antes de escribir: si algun precio quedaria
+        negativo lanza PrecioInvalidoError y no se modifica ninguno
+        Devuelve el numero de articulos modificados
+        """
+        codigo_tipo = TIPOS[tipo] if tipo is not None else None
+        if np is not None:
+            precios = np.frombuffer(self.__precios, dtype=np.float64)
+            tipos = np.frombuffer(self.__tipos, dtype=np.int8)
+            if codigo_tipo is None:
+                mascara = tipos != TIPO_BORRADO
+            else:
+                mascara = tipos == codigo_tipo
+            nuevos = precios[mascara] * factor + incremento
+            if nuevos.size and nuevos.min() < 0:
+                raise PrecioInvalidoError("el precio no puede ser negativo")
+            precios[mascara] = nuevos
+            return int(nuevos.size)
+
+        # Sin numpy: misma logica recorriendo las columnas
+        if codigo_tipo is None:
+            seleccion = [t != TIPO_BORRADO for t in self.__tipos]
+        else:
+            seleccion = [t == codigo_tipo for t in self.__tipos]
+        nuevos = array("d", (p * factor + incremento if s else p for p, s in zip(self.__precios, seleccion)))
+        if nuevos and min(nuevos) < 0:
+            raise PrecioInvalidoError("el precio no puede ser negativo")
+        self.__precios[:] = nuevos
+        return sum(seleccion)
+
+    def precios_con_descuento(self, factores_por_tipo: Optional[Dict[str, float]] = None) -> array:
+        """
+        Calcula el precio con descuento de todas las filas de una vez
+        factores_por_tipo ('fisico'/'digital' -> factor) sustituye a los descuentos de las clases
+        Devuelve un array alineado con `codigos` (0.0 en las filas borradas)
+        """
+        resultado = array("d", self.__precios)
+        if factores_por_tipo is None:
+            factores_por_tipo = {"fisico": ArticuloFisico.FACTOR_DESCUENTO, "digital": ArticuloDigital.FACTOR_DESCUENTO}
+        # Indexado por codigo de tipo; el indice -1 (borrado) cae en el ultimo
+        factores = [factores_por_tipo["fisico"], factores_por_tipo["digital"], 0.0]
+        if np is not None:
+            vista = np.frombuffer(resultado, dtype=np.float64)
+            vista *= np.array(factores)[np.frombuffer(self.__tipos, dtype=np.int8)]
+            return resultado
+        resultado[:] = array("d", (p * factores[t] for p, t in zip(resultado, self.__tipos)))
+        return resultado
+
+
+class _FilaSuelta:
+    """Copia de la fila de un articulo borrado, para las vistas que aun lo usan al compactar"""
+    __slots__ = ("__codigo", "__denominacion", "__precio", "__peso", "__licencia")
+
+    def __init__(self, codigo: str, denominacion: str, precio: float, peso: float, licencia: Optional[str]):
+        self.__codigo = codigo
+        self.__denominacion = denominacion
+        self.__precio = precio
+        self.__peso = peso
+        self.__licencia = licencia
+
+    def codigo_en(self, fila: int) -> str:
+        return self.__codigo
+
+    def denominacion_en(self, fila: int) -> str:
+        return self.__denominacion
+
+    def precio_en(self, fila: int) -> float:
+        return self.__precio
+
+    def fijar_precio_en(self, fila: int, valor: float) -> None:
+        raise ArticuloNoEncontradoError(f"el articulo {self.__codigo} ya no esta en el catalogo")
+
+    def peso_en(self, fila: int) -> float:
+        return self.__peso
+
+    def licencia_en(self, fila: int) -> str:
+        return self.__licencia
+
+
+class ArticuloFisicoFila(ArticuloFisico):
+    """Vista de un articulo fisico sobre una fila del CatalogoColumnar (o del CatalogoMmap)"""
+    __slots__ = ("__catalogo", "__fila", "__weakref__")
+
+    def __init__(self, catalogo: CatalogoColumnar, fila: int):
+        self.__catalogo = catalogo
+        self.__fila = fila
+
+    def reubicar(self, catalogo, fila: int) -> None:
+        """Pasa la vista a otra fila (al compactar el catalogo)"""
+        self.__catalogo = catalogo
+        self.__fila = fila
+
+    @property
+    def codigo(self) -> str:
+        return self.__catalogo.codigo_en(self.__fila)
+
+    @property
+    def denominacion(self) -> str:
+        return self.__catalogo.denominacion_en(self.__fila)
+
+    @property
+    def precio(self) -> float:
+        return self.__catalogo.precio_en(self.__fila)
+
+    @precio.setter
+    def precio(self, valor: float):
+        self.__catalogo.fijar_precio_en(self.__fila, valor)
+
+    @property
+    def peso(self) -> float:
+        return self.__catalogo.peso_en(self.__fila)
+
+
+class ArticuloDigitalFila(ArticuloDigital):
+    """Vista de un articulo digital sobre una fila del CatalogoColumnar (o del CatalogoMmap)"""
+    __slots__ = ("__catalogo", "__fila", "__weakref__")
+
+    def __init__(self, catalogo: CatalogoColumnar, fila: int):
+        self.__catalogo = catalogo
+        self.__fila = fila
+
+    def reubicar(self, catalogo, fila: int) -> None:
+        """Pasa la vista a otra fila (al compactar el catalogo)"""
+        self.__catalogo = catalogo
+        self.__fila = fila
+
+    @property
+    def codigo(self) -> str:
+        return self.__catalogo.codigo_en(self.__fila)
+
+    @property
+    def denominacion(self) -> str:
+        return self.__catalogo.denominacion_en(self.__fila)
+
+    @property
+    def precio(self) -> float:
+        return self.__catalogo.precio_en(self.__fila)
+
+    @precio.setter
+    def precio(self, valor: float):
+        self.__catalogo.fijar_precio_en(self.__fila, valor)
+
+    @property
+    def licencia(self) -> str:
+        return self.__catalogo.licencia_en(self.__fila)
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""
+Catalogo de articulos en un archivo proyectado con mmap, para catalogos muy grandes
+que se leen mucho y se cambian poco: abrirlo no lee el archivo
+
+Formato (little-endian):
+    cabecera         CABECERA: magia, version, numero de articulos y posiciones
+    registros        REGISTRO por articulo (precio, peso, tipo), en orden de codigo
+    codigos          (articulos + 1) posiciones u64 y los textos UTF-8 seguidos (ordenados)
+    denominaciones   igual, una por articulo
+    licencias        igual ("" en los fisicos)
+"""
+import heapq
+import mmap
+import os
+import struct
+from collections.abc import MutableMapping, Sequence
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from .articulo import ArticuloBase, ArticuloFisico
+from .catalogo_columnar import TIPO_FISICO, TIPO_DIGITAL, ArticuloFisicoFila, ArticuloDigitalFila
+from .excepciones import PrecioInvalidoError
+from .exportacion import escritura_atomica
+
+MAGIA = b"TIENDACT"
+VERSION = 1
+CABECERA = struct.Struct("<8sIIQQQQQ") # magia, version, reservado, articulos, pos. de cada seccion
+REGISTRO = struct.Struct("<ddb7x") # precio, peso, tipo
+POSICION = struct.Struct("<Q")
+
+# Articulos (vistas sobre su fila) que se guardan tras buscarlos
+ARTICULOS_EN_CACHE = 10_000
+
+
+def _escribir_textos(archivo, textos: List[bytes]) -> int:
+    """Escribe una tabla de textos; devuelve cuantos bytes ocupa"""
+    inicio = 0
+    for texto in textos:
+        archivo.write(POSICION.pack(inicio))
+        inicio += len(texto)
+    archivo.write(POSICION.pack(inicio))
+    for texto in textos:
+        archivo.write(texto)
+    return POSICION.size * (len(textos) + 1) + inicio
+
+
+def escribir_catalogo(articulos: Iterable[ArticuloBase], ruta: str) -> int:
+    """Escribe los articulos en un archivo de catalogo (de forma atomica). Devuelve cuantos"""
+    articulos = sorted(articulos, key=lambda articulo: articulo.codigo)
+    with escritura_atomica(ruta, "wb") as archivo:
+        archivo.write(bytes(CABECERA.size)) # Se rellena al final
+        licencias = []
+        for articulo in articulos:
+            if isinstance(articulo, ArticuloFisico):
+                archivo.write(REGISTRO.pack(articulo.precio, articulo.peso, TIPO_FISICO))
+                licencias.append(b"")
+            else:
+                archivo.write(REGISTRO.pack(articulo.precio, 0.0, TIPO_DIGITAL))
+                licencias.append(articulo.licencia.encode("utf-8"))
+        pos_codigos = CABECERA.size + REGISTRO.size * len(articulos)
+        pos_denominaciones = pos_codigos + _escribir_textos(archivo, [a.codigo.encode("utf-8") for a in articulos])
+        pos_licencias = pos_denominaciones + _escribir_textos(archivo, [a.denominacion.encode("utf-8") for a in articulos])
+        _escribir_textos(archivo, licencias)
+        archivo.seek(0)
+        archivo.write(CABECERA.pack(MAGIA, VERSION, 0, len(articulos), CABECERA.size,
+                                    pos_codigos, pos_denominaciones, pos_licencias))
+    return len(articulos)
+
+
+class _Textos(Sequence):
+    """Una tabla de textos del archivo vista como lista (se decodifican al pedirlos)"""
+    def __init__(self, mapa: mmap.mmap, posicion: int, cantidad: int):
+        self.__mapa = mapa
+        self.__posicion = posicion
+        self.__inicio_textos = posicion + POSICION.size * (cantidad + 1)
+        self.__cantidad = cantidad
+
+    def __len__(self) -> int:
+        return self.__cantidad
+
+    def __getitem__(self, fila: int) -> str:
+        if not 0 <= fila < self.__cantidad:
+            raise IndexError(fila)
+        return self.bytes_en(fila).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for fila in range(self.__cantidad):
+            yield self.bytes_en(fila).decode("utf-8")
+
+    def bytes_en(self, fila: int) -> bytes:
+        inicio, fin = struct.unpack_from("<QQ", self.__mapa, self.__posicion + POSICION.size * fila)
+        return self.__mapa[self.__inicio_textos + inicio:self.__inicio_textos + fin]
+
+    def posicion_de(self, texto: str) -> int:
+        """Primera fila cuyo texto no es menor que `texto` (la tabla debe estar ordenada)"""
+        clave = texto.encode("utf-8") # En UTF-8 el orden de los bytes es el de los caracteres
+        inicio, fin = 0, self.__cantidad
+        while inicio < fin:
+            medio = (inicio + fin) // 2
+            if self.bytes_en(medio) < clave:
+                inicio = medio + 1
+            else:
+                fin = medio
+        return inicio
+
+
+class CatalogoMmap(MutableMapping):
+    """
+    Catalogo codigo -> articulo sobre un archivo de escribir_catalogo, abierto con mmap
+    - abrir solo lee la cabecera: no depende del tamaño del catalogo
+    - buscar un codigo es una busqueda binaria en los codigos ordenados; el articulo
+      es una vista ligera sobre su fila (como en CatalogoColumnar) y los ultimos
+      `articulos_en_cache` codigos buscados se guardan en una cache LRU
+    - buscar_prefijo recorre los codigos ordenados, sin indice en memoria
+    El archivo no se modifica: altas, bajas y cambios de precio se guardan en memoria
+    encima del archivo y se conservan con guardar() (en Windows no se puede sustituir
+    un archivo abierto con mmap: hay que guardar en otra ruta)
+    """
+    def __init__(self, ruta: str, articulos_en_cache: int = ARTICULOS_EN_CACHE):
+        with open(ruta, "rb") as archivo:
+            if os.fstat(archivo.fileno()).st_size < CABECERA.size:
+                raise ValueError(f"{ruta} no es un archivo de catalogo")
+            self.__mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        magia, version, _, filas, pos_registros, pos_codigos, pos_denominaciones, pos_licencias = \
+            CABECERA.unpack_from(self.__mapa, 0)
+        if magia != MAGIA:
+            self.__mapa.close()
+            raise ValueError(f"{ruta} no es un archivo de catalogo")
+        if version != VERSION:
+            self.__mapa.close()
+            raise ValueError(f"{ruta}: version {version} del archivo de catalogo no soportada (se lee la {VERSION})")
+        self.__filas = filas
+        self.__pos_registros = pos_registros
+        self.__codigos = _Textos(self.__mapa, pos_codigos, filas)
+        self.__denominaciones = _Textos(self.__mapa, pos_denominaciones, filas)
+        self.__licencias = _Textos(self.__mapa, pos_licencias, filas)
+        # Cambios sobre el archivo
+        self.__nuevos: Dict[str, ArticuloBase] = {} # Altas (y articulos del archivo sustituidos)
+        self.__borrados: Set[str] = set() # Codigos del archivo borrados o sustituidos
+        self.__precios: Dict[int, float] = {} # Precios cambiados, por fila
+        # lru_cache es seguro entre hilos; el archivo no cambia, asi que no hay que invalidarla
+        self.__del_archivo = lru_cache(maxsize=articulos_en_cache)(self.__leer_articulo)
+
+    def cerrar(self) -> None:
+        self.__del_archivo.cache_clear()
+        self.__mapa.close()
+
+    # Filas del archivo
+
+    def __fila(self, codigo: str) -> Optional[int]:
+        """Fila del codigo en el archivo (None si no esta; no mira los borrados)"""
+        fila = self.__codigos.posicion_de(codigo)
+        if fila < self.__filas and self.__codigos[fila] == codigo:
+            return fila
+        return None
+
+    def __registro(self, fila: int) -> Tuple[float, float, int]:
+        return REGISTRO.unpack_from(self.__mapa, self.__pos_registros + REGISTRO.size * fila)
+
+    def __leer_articulo(self, codigo: str) -> Optional[ArticuloBase]:
+        """Vista sobre la fila del codigo (None si no esta en el archivo)"""
+        fila = self.__fila(codigo)
+        if fila is None:
+            return None
+        if self.__registro(fila)[2] == TIPO_FISICO:
+            return ArticuloFisicoFila(self, fila)
+        return ArticuloDigitalFila(self, fila)
+
+    def __en_archivo(self, codigo: object) -> bool:
+        return isinstance(codigo, str) and codigo not in self.__borrados and self.__del_archivo(codigo) is not None
+
+    def __tapar(self, codigo: str) -> None:
+        """Oculta el articulo del archivo (y olvida su cambio de precio)"""
+        self.__borrados.add(codigo)
+        self.__precios.pop(self.__fila(codigo), None)
+
+    # Acceso por fila (lo usan las vistas)
+
+    def codigo_en(self, fila: int) -> str:
+        return self.__codigos[fila]
+
+    def denominacion_en(self, fila: int) -> str:
+        return self.__denominaciones[fila]
+
+    def precio_en(self, fila: int) -> float:
+        precio = self.__precios.get(fila)
+        return precio if precio is not None else self.__registro(fila)[0]
+
+    def fijar_precio_en(self, fila: int, valor: float) -> None:
+        if valor < 0:
+            raise PrecioInvalidoError("el precio no puede ser negativo")
+        self.__precios[fila] = valor
+
+    def peso_en(self, fila: int) -> float:
+        return self.__registro(fila)[1]
+
+    def licencia_en(self, fila: int) -> str:
+        return self.__licencias[fila]
+
+    # Interfaz de diccionario
+
+    def __len__(self) -> int:
+        return self.__filas - len(self.__borrados) + len(self.__nuevos)
+
+    def __iter__(self) -> Iterator[str]:
+        """Primero los codigos del archivo (en orden) y despues las altas"""
+        borrados = self.__borrados
+        for codigo in self.__codigos:
+            if codigo not in borrados:
+                yield codigo
+        yield from list(self.__nuevos)
+
+    def __contains__(self, codigo: object) -> bool:
+        return codigo in self.__nuevos or self.__en_archivo(codigo)
+
+    def __getitem__(self, codigo: str) -> ArticuloBase:
+        articulo = self.__nuevos.get(codigo)
+        if articulo is None:
+            if codigo in self.__borrados:
+                raise KeyError(codigo)
+            articulo = self.__del_archivo(codigo)
+            if articulo is None:
+                raise KeyError(codigo)
+        return articulo
+
+    def __setitem__(self, codigo: str, articulo: ArticuloBase) -> None:
+        if self.__en_archivo(codigo):
+            self.__tapar(codigo) # El archivo no se toca: el nuevo tapa su fila
+        self.__nuevos[codigo] = articulo
+
+    def __delitem__(self, codigo: str) -> None:
+        if self.__nuevos.pop(codigo, None) is not None:
+            return
+        if not self.__en_archivo(codigo):
+            raise KeyError(codigo)
+        self.__tapar(codigo)
+
+    # Consultas sin crear los articulos
+
+    def denominaciones(self) -> Iterator[Tuple[str, str]]:
+        """Pares (codigo, denominacion) de todo el catalogo"""
+        borrados = self.__borrados
+        for fila, codigo in enumerate(self.__codigos):
+            if codigo not in borrados:
+                yield codigo, self.__denominaciones[fila]
+        for codigo, articulo in list(self.__nuevos.items()):
+            yield codigo, articulo.denominacion
+
+    def buscar_prefijo(self, prefijo: str, limite: int = 20) -> List[str]:
+        """Codigos que empiezan por el prefijo, en orden (busqueda binaria en el archivo)"""
+        def del_archivo() -> Iterator[str]:
+            for fila in range(self.__codigos.posicion_de(prefijo), self.__filas):
+                codigo = self.__codigos[fila]
+                if not codigo.startswith(prefijo):
+                    return
+                if codigo not in self.__borrados:
+                    yield codigo
+        nuevos = sorted(codigo for codigo in self.__nuevos if codigo.startswith(prefijo))
+        return list(islice(heapq.merge(del_archivo(), nuevos), limite))
+
+    @property
+    def cambios(self) -> int:
+        """Altas, bajas y cambios de precio que aun no estan en el archivo"""
+        return len(self.__nuevos) + len(self.__borrados) + len(self.__precios)
+
+    def guardar(self, ruta: str) -> int:
+        """Escribe el catalogo con todos los cambios en un archivo nuevo. Devuelve cuantos articulos"""
+        return escribir_catalogo(self.values(), ruta)
\ No newline at end of file
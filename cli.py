@@ -0,0 +1,276 @@
+"""
+Linea de comandos de la tienda, sin interfaz grafica (no importa tkinter)
+Pensada para servidores sin pantalla y para scripts
+
+Uso:
+    python cli.py [--db ruta.db | --diario directorio | --catalogo ruta.cat] <comando> ...
+
+Comandos:
+    importar clientes|articulos ARCHIVO [--formato csv|jsonl]
+    factura DNI CODIGO[:CANTIDAD] ... [--abierta] [--exportar RUTA] [--formato json|csv|jsonl]
+    exportar ID [ID ...] [--formato json|csv|jsonl] [--salida RUTA]
+    exportar --todas [--formato jsonl|csv] [--salida RUTA]
+    facturar PEDIDOS [--procesos N] [--exportar RUTA] [--formato jsonl|csv]
+    archivar RUTA
+    archivo RUTA [ID ...] [--formato jsonl|csv] [--salida RUTA]   (no abre el modelo)
+    ventas dias [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]
+    ventas articulos|clientes [--limite 10]
+    ventas verificar
+    buscar TEXTO [--limite 20]
+    catalogo RUTA   (guarda los articulos en un archivo para --catalogo)
+
+Sin --db ni --diario se usan TIENDA_DB / TIENDA_DIARIO (como main.py); si tampoco
+existen los datos solo viven mientras dura el comando
+Con --catalogo los articulos se leen de un archivo de catalogo (CatalogoMmap) sin
+cargarlo; los demas datos viven mientras dura el comando
+Los modulos pesados (sqlite3, json, csv) se cargan solo si el comando los usa;
+el tiempo de arranque se puede ver con `python -X importtime cli.py ...`
+"""
+import argparse
+import os
+import sys
+from datetime import date
+from typing import List, Optional, Tuple
+from modelo.modelo_logica import ModeloLogica
+from modelo.excepciones import (CantidadInvalidaError, ArticuloNoEncontradoError, ClienteNoEncontradoError,
+                                PrecioInvalidoError, ClienteDuplicadoError, ArticuloDuplicadoError,
+                                FacturaNoEncontradaError)
+
+# Errores que se muestran como un mensaje (y codigo de salida 1) en lugar de una traza
+ERRORES_DE_USUARIO = (CantidadInvalidaError, ArticuloNoEncontradoError, ClienteNoEncontradoError,
+                      PrecioInvalidoError, ClienteDuplicadoError, ArticuloDuplicadoError,
+                      FacturaNoEncontradaError, ValueError, OSError)
+
+
+def abrir_modelo(args: argparse.Namespace) -> Tuple[ModeloLogica, Optional[object]]:
+    """Crea el modelo segun las opciones: devuelve (modelo, almacen o None)"""
+    ruta_db = args.db or (None if args.diario else os.environ.get("TIENDA_DB"))
+    directorio_diario = args.diario or (None if args.db else os.environ.get("TIENDA_DIARIO"))
+    if args.catalogo:
+        from modelo.catalogo_mmap import CatalogoMmap
+        return ModeloLogica(catalogo=CatalogoMmap(args.catalogo)), None
+    if directorio_diario:
+        from modelo.modelo_diario import ModeloDiario
+        return ModeloDiario(directorio_diario), None
+    if ruta_db:
+        from modelo.almacen_sqlite import AlmacenSQLite
+        almacen = AlmacenSQLite(ruta_db)
+        return ModeloLogica(almacen=almacen), almacen
+    print("aviso: sin --db ni --diario los datos no se guardan", file=sys.stderr)
+    return ModeloLogica(), None
+
+
+def cerrar_modelo(modelo: ModeloLogica, almacen) -> None:
+    if almacen is not None:
+        almacen.cerrar()
+    cerrar = getattr(modelo, "cerrar", None) # ModeloDiario
+    if cerrar is not None:
+        cerrar()
+
+
+def leer_linea(texto: str) -> Tuple[str, int]:
+    """'CODIGO:CANTIDAD' (o solo 'CODIGO', cantidad 1) -> (codigo, cantidad)"""
+    codigo, separador, cantidad = texto.rpartition(":")
+    if not separador:
+        return texto, 1
+    return codigo, int(cantidad) # ValueError si no es un numero
+
+
+def exportar_una(modelo: ModeloLogica, id_factura: int, formato: str, destino) -> Optional[str]:
+    return getattr(modelo, f"exportar_factura_{formato}")(destino, id_factura=id_factura)
+
+
+# Comandos
+
+def comando_importar(modelo: ModeloLogica, args: argparse.Namespace) -> int:
+    importar = modelo.importar_clientes if args.tipo == "clientes" else modelo.importar_articulos
+    informe = importar(args.archivo, args.formato)
+    print(f"importados: {informe.importados}, errores: {len(informe.errores)}")
+    for numero, mensaje in informe.errores[:20]:
+        print(f"  fila {numero}: {mensaje}", file=sys.stderr)
+    if len(informe.errores) > 20:
+        print(f"  ... y {len(informe.errores) - 20} errores mas", file=sys.stderr)
+    return 1 if informe.errores else 0
+
+
+def comando_factura(modelo: ModeloLogica, args: argparse.Namespace) -> int:
+    lineas = [leer_linea(texto) for texto in args.lineas]
+    with modelo.lote():
+        factura = modelo.crear_nueva_factura(args.dni)
+        modelo.agregar_lineas_factura(lineas, factura.id)
+        if not args.abierta:
+            modelo.cerrar_factura(factura.id)
+    print(f"factura {factura.id}: {len(factura.lineas)} lineas, total {factura.total:.2f}")
+    if args.exportar:
+        destino = sys.stdout if args.exportar == "-" else args.exportar
+        exportar_una(modelo, factura.id, args.formato, destino)
+    return 0
+
+
+def comando_exportar(modelo: ModeloLogica, args: argparse.Namespace) -> int:
+    destino = sys.stdout if args.salida in (None, "-") else args.salida
+    if args.todas:
+        escritas = modelo.exportar_facturas(destino, args.formato)
+        print(f"facturas exportadas: {escritas}", file=sys.stderr)
+        return 0
+    if not args.ids:
+        raise ValueError("indique los ids de las facturas o --todas")
+    if len(args.ids) > 1 and args.formato in ("jsonl", "csv"):
+        # Varias facturas a un mismo destino: una sola pasada con una sola cabecera
+        modelo.exportar_facturas(destino, args.formato, [modelo.buscar_factura(i) for i in args.ids])
+        return 0
+    for id_factura in args.ids:
+        if args.salida not in (None, "-") and len(args.ids) > 1:
+            raiz, extension = os.path.splitext(args.salida)
+            destino = f"{raiz}_{id_factura}{extension}"
+        exportar_una(modelo, id_factura, args.formato, destino)
+    return 0
+
+
+def comando_facturar(modelo: ModeloLogica, args: argparse.Namespace) -> int:
+    destino = None if args.exportar is None else sys.stdout if args.exportar == "-" else args.exportar
+    informe = modelo.facturar_pedidos(args.pedidos, args.formato_pedidos, args.procesos, destino, args.formato)
+    print(f"facturas: {informe.facturas}, lineas: {informe.lineas}, importe: {informe.importe:.2f}, "
+          f"errores: {len(informe.errores)}", file=sys.stderr)
+    for pedido, mensaje in informe.errores[:20]:
+        print(f"  {pedido}: {mensaje}", file=sys.stderr)
+    if len(informe.errores) > 20:
+        print(f"  ... y {len(informe.errores) - 20} errores mas", file=sys.stderr)
+    return 1 if informe.errores else 0
+
+
+def comando_archivar(modelo: ModeloLogica, args: argparse.Namespace) -> int:
+    escritas = modelo.archivar_facturas(args.ruta)
+    print(f"facturas archivadas: {escritas} ({os.path.getsize(args.ruta)} bytes)", file=sys.stderr)
+    return 0
+
+
+def comando_archivo(modelo: None, args: argparse.Namespace) -> int:
+    from modelo.archivo_binario import LectorArchivo
+    from modelo.exportacion import exportar_facturas
+    destino = sys.stdout if args.salida in (None, "-") else args.salida
+    with LectorArchivo(args.ruta) as archivo:
+        facturas = [archivo.factura(i) for i in args.ids] if args.ids else archivo.recorrer()
+        escritas = exportar_facturas(facturas, destino, args.formato)
+        print(f"facturas leidas: {escritas} de {len(archivo)}", file=sys.stderr)
+    return 0
+
+
+def comando_ventas(modelo: ModeloLogica, args: argparse.Namespace) -> int:
+    if args.consulta == "verificar":
+        diferencias = modelo.reconstruir_ventas()
+        for mensaje in diferencias:
+            print(mensaje)
+        print(f"agregados reconstruidos, diferencias: {len(diferencias)}", file=sys.stderr)
+        return 1 if diferencias else 0
+    if args.consulta == "dias":
+        filas = modelo.ventas_por_dia(args.desde, args.hasta)
+    elif args.consulta == "articulos":
+        filas = modelo.articulos_mas_vendidos(args.limite)
+    else:
+        filas = modelo.mejores_clientes(args.limite)
+    for clave, facturas, unidades, importe in filas:
+        print(f"{clave}\t{facturas}\t{unidades}\t{importe:.2f}")
+    return 0
+
+
+def comando_catalogo(modelo: ModeloLogica, args: argparse.Namespace) -> int:
+    escritos = modelo.guardar_catalogo(args.ruta)
+    print(f"articulos guardados: {escritos} ({os.path.getsize(args.ruta)} bytes)", file=sys.stderr)
+    return 0
+
+
+def comando_buscar(modelo: ModeloLogica, args: argparse.Namespace) -> int:
+    for articulo in modelo.buscar_articulos(args.texto, args.limite):
+        print(f"{articulo.codigo}\t{articulo.denominacion}\t{modelo.motor_precios.precio_catalogo(articulo):.2f}")
+    return 0
+
+
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="tienda sin interfaz grafica")
+    parser.add_argument("--db", help="base de datos SQLite")
+    parser.add_argument("--diario", help="directorio del diario (ModeloDiario)")
+    parser.add_argument("--catalogo", help="archivo de catalogo (solo lectura, se abre con mmap)")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p_importar = subparsers.add_parser("importar", help="importar clientes o articulos de un CSV/JSON Lines")
+    p_importar.add_argument("tipo", choices=("clientes", "articulos"))
+    p_importar.add_argument("archivo")
+    p_importar.add_argument("--formato", choices=("csv", "jsonl"), help="por defecto, segun la extension")
+    p_importar.set_defaults(funcion=comando_importar)
+
+    p_factura = subparsers.add_parser("factura", help="crear una factura con sus lineas")
+    p_factura.add_argument("dni")
+    p_factura.add_argument("lineas", nargs="+", metavar="CODIGO[:CANTIDAD]")
+    p_factura.add_argument("--abierta", action="store_true", help="no cerrar la factura")
+    p_factura.add_argument("--exportar", metavar="RUTA", help="exportarla tambien ('-' = pantalla)")
+    p_factura.add_argument("--formato", choices=("json", "csv", "jsonl"), default="json")
+    p_factura.set_defaults(funcion=comando_factura)
+
+    p_exportar = subparsers.add_parser("exportar", help="exportar facturas del historial")
+    p_exportar.add_argument("ids", nargs="*", type=int, metavar="ID")
+    p_exportar.add_argument("--todas", action="store_true", help="todo el historial en un solo archivo")
+    p_exportar.add_argument("--formato", choices=("json", "csv", "jsonl"), default="jsonl")
+    p_exportar.add_argument("--salida", help="archivo de salida (por defecto, la pantalla)")
+    p_exportar.set_defaults(funcion=comando_exportar)
+
+    p_facturar = subparsers.add_parser("facturar", help="facturar un archivo de pedidos en varios procesos")
+    p_facturar.add_argument("pedidos", help="CSV/JSON Lines con dni, codigo, cantidad y opcionalmente pedido")
+    p_facturar.add_argument("--formato-pedidos", choices=("csv", "jsonl"), help="por defecto, segun la extension")
+    p_facturar.add_argument("--procesos", type=int, help="por defecto, uno por CPU")
+    p_facturar.add_argument("--exportar", metavar="RUTA", help="exportar las facturas creadas ('-' = pantalla)")
+    p_facturar.add_argument("--formato", choices=("jsonl", "csv"), default="jsonl")
+    p_facturar.set_defaults(funcion=comando_facturar)
+
+    p_archivar = subparsers.add_parser("archivar", help="guardar el historial en un archivo binario compacto")
+    p_archivar.add_argument("ruta")
+    p_archivar.set_defaults(funcion=comando_archivar)
+
+    p_archivo = subparsers.add_parser("archivo", help="leer facturas de un archivo binario")
+    p_archivo.add_argument("ruta")
+    p_archivo.add_argument("ids", nargs="*", type=int, metavar="ID", help="por defecto, todas")
+    p_archivo.add_argument("--formato", choices=("jsonl", "csv"), default="jsonl")
+    p_archivo.add_argument("--salida", help="archivo de salida (por defecto, la pantalla)")
+    p_archivo.set_defaults(funcion=comando_archivo, sin_modelo=True)
+
+    p_ventas = subparsers.add_parser("ventas", help="informes de ventas (facturas cerradas)")
+    p_ventas.add_argument("consulta", choices=("dias", "articulos", "clientes", "verificar"),
+                          help="verificar: recalcular los agregados desde el historial y comparar")
+    p_ventas.add_argument("--desde", type=date.fromisoformat, help="primer dia (AAAA-MM-DD)")
+    p_ventas.add_argument("--hasta", type=date.fromisoformat, help="ultimo dia (AAAA-MM-DD)")
+    p_ventas.add_argument("--limite", type=int, default=10)
+    p_ventas.set_defaults(funcion=comando_ventas)
+
+    p_buscar = subparsers.add_parser("buscar", help="buscar articulos por nombre")
+    p_buscar.add_argument("texto")
+    p_buscar.add_argument("--limite", type=int, default=20)
+    p_buscar.set_defaults(funcion=comando_buscar)
+
+    p_catalogo = subparsers.add_parser("catalogo", help="guardar los articulos en un archivo de catalogo")
+    p_catalogo.add_argument("ruta")
+    p_catalogo.set_defaults(funcion=comando_catalogo)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    if sum(map(bool, (args.db, args.diario, args.catalogo))) > 1:
+        parser.error("use solo una de --db, --diario y --catalogo")
+    if args.comando == "exportar" and args.todas and args.formato == "json":
+        args.formato = "jsonl" # Varias facturas: un objeto por linea
+    modelo, almacen = None, None
+    try:
+        if not getattr(args, "sin_modelo", False):
+            modelo, almacen = abrir_modelo(args) # Dentro del try: un archivo que falta es un error de usuario
+        return args.funcion(modelo, args)
+    except ERRORES_DE_USUARIO as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if modelo is not None:
+            cerrar_modelo(modelo, almacen)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -1,28 +1,56 @@
 # Importamos los tipos para los "type hints"
 from modelo.modelo_logica import ModeloLogica
-from vista.vista_tk import VistaPrincipal
-from modelo.excepciones import CantidadInvalidaError, ArticuloNoEncontradoError, ClienteNoEncontradoError, PrecioInvalidoError
-from typing import Optional
+from modelo.excepciones import CantidadInvalidaError, ArticuloNoEncontradoError, ClienteNoEncontradoError, PrecioInvalidoError, ClienteDuplicadoError, ArticuloDuplicadoError
+from typing import TYPE_CHECKING, Any, Callable, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+import queue
+import threading
+
+if TYPE_CHECKING:
+    # Solo para las anotaciones: importar la vista carga tkinter
+    from vista.vista_tk import VistaPrincipal
+
+# Cada cuanto (ms) mira el hilo de Tk si han terminado tareas en segundo plano
+INTERVALO_SONDEO_MS = 50
 
 class Controlador:
     """
     Conecta la vista con el modelo escucha los eventos de la vista (clics de boton) y actua sobre el modelo
     luego, le pide a la vista que se actualice
     """
-    def __init__(self, modelo: ModeloLogica, vista: VistaPrincipal):
+    # Metodos que atienden eventos de la vista (ver envolver_manejadores)
+    MANEJADORES = ("registrar_cliente", "eliminar_cliente", "importar_clientes", "registrar_articulo",
+                   "importar_articulos", "nueva_factura", "agregar_linea", "eliminar_linea",
+                   "exportar_json", "exportar_csv", "cancelar_tareas")
+
+    def __init__(self, modelo: ModeloLogica, vista: "VistaPrincipal"):
         self.modelo = modelo
         self.vista = vista
+        # Tareas largas (exportar, importar): un hilo aparte para no congelar mainloop
+        # Un solo hilo: el modelo no es seguro entre hilos y asi las tareas no se solapan
+        self.ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tienda-tarea")
+        self.resultados: "queue.Queue[Callable[[], None]]" = queue.Queue() # Avisos para el hilo de Tk
+        self.tareas_pendientes = 0
+        self.cancelaciones = {} # Event de cada tarea -> su Future
+        self.sondeando = False
+        # al_error(manejador, excepcion): aviso de cada error que se muestra al usuario
+        # (los manejadores capturan sus errores, asi las metricas tambien los ven)
+        self.al_error: Optional[Callable[[str, BaseException], None]] = None
         # Conectamos los botones de la vista a metodos de este controlador
         self.asignar_controladores()
+        # Mostramos los datos que ya tenga el modelo (por ejemplo, de una base de datos)
+        self.actualizar_listas_y_combos()
     
     def asignar_controladores(self) -> None:
         """Asigna los 'command' de los botones de la vista"""
         # Pestaña Clientes
         self.vista.btn_registrar_cliente.config(command=self.registrar_cliente)
         self.vista.btn_eliminar_cliente.config(command=self.eliminar_cliente)
+        self.vista.btn_importar_clientes.config(command=self.importar_clientes)
         
         # Pestaña Articulos
         self.vista.btn_registrar_articulo.config(command=self.registrar_articulo)
+        self.vista.btn_importar_articulos.config(command=self.importar_articulos)
         
         # Pestaña Facturacion
         self.vista.btn_nueva_factura.config(command=self.nueva_factura)
@@ -30,17 +58,108 @@ class Controlador:
         self.vista.btn_eliminar_linea.config(command=self.eliminar_linea)
         self.vista.btn_exportar_json.config(command=self.exportar_json)
         self.vista.btn_exportar_csv.config(command=self.exportar_csv)
+        self.vista.configurar_autocompletado(self.modelo.sugerir_clientes, self.modelo.sugerir_articulos)
+        # Las tablas piden al modelo solo la pagina que muestran
+        self.vista.configurar_tablas(lambda: self.modelo.numero_clientes, self.modelo.pagina_clientes,
+                                     lambda: self.modelo.numero_articulos, self.modelo.pagina_articulos)
+
+        # Barra de progreso
+        self.vista.btn_cancelar_tarea.config(command=self.cancelar_tareas)
+
+    def envolver_manejadores(self, envoltorio: Callable[[str, Callable[[], None]], Callable[[], None]]) -> None:
+        """
+        Sustituye cada manejador por envoltorio(nombre, manejador) y vuelve a conectar
+        los botones. Sirve para medir los manejadores sin tocarlos uno a uno
+        """
+        for nombre in self.MANEJADORES:
+            setattr(self, nombre, envoltorio(nombre, getattr(self, nombre)))
+        self.asignar_controladores()
 
     def actualizar_listas_y_combos(self) -> None:
         """
         Metodo ayudante para actualizar todos los datos
         en la vista despues de un cambio en el modelo
         """
-        clientes = self.modelo.clientes
-        articulos = self.modelo.articulos
-        self.vista.actualizar_lista_clientes(clientes)
-        self.vista.actualizar_lista_articulos(articulos)
-        self.vista.actualizar_combos(clientes, articulos)
+        self.vista.actualizar_lista_clientes()
+        self.vista.actualizar_lista_articulos()
+
+    # Tareas en segundo plano
+
+    def ejecutar_en_segundo_plano(self, descripcion: str, tarea: Callable[[threading.Event, Callable[[str], None]], Any],
+                                  al_terminar: Callable[[Any], None], manejador: str = "tarea") -> Future:
+        """
+        Ejecuta tarea(cancelar, progreso) en el hilo de tareas
+        - cancelar: Event que se activa con el boton 'cancelar'
+        - progreso(texto): actualiza el texto de la barra de progreso
+        El resultado (al_terminar) o el error (mostrar_error, a nombre de `manejador`) se entregan en el hilo de Tk
+        """
+        cancelar = threading.Event()
+        self.tareas_pendientes += 1
+        self.vista.mostrar_progreso(descripcion)
+
+        def progreso(texto: str) -> None:
+            # Se llama desde el hilo de tareas: no se toca Tk aqui
+            self.resultados.put(lambda: self.vista.actualizar_progreso(f"{descripcion}: {texto}"))
+
+        def terminada(futuro: Future) -> None:
+            self.resultados.put(lambda: self.__tarea_terminada(futuro, cancelar, al_terminar, manejador))
+
+        futuro = self.ejecutor.submit(tarea, cancelar, progreso)
+        self.cancelaciones[cancelar] = futuro
+        futuro.add_done_callback(terminada)
+        if not self.sondeando:
+            self.sondeando = True
+            self.vista.root.after(INTERVALO_SONDEO_MS, self.procesar_resultados)
+        return futuro
+
+    def procesar_resultados(self) -> None:
+        """Entrega en el hilo de Tk los avisos de las tareas (se reprograma con root.after)"""
+        while True:
+            try:
+                aviso = self.resultados.get_nowait()
+            except queue.Empty:
+                break
+            aviso()
+        if self.tareas_pendientes > 0:
+            self.vista.root.after(INTERVALO_SONDEO_MS, self.procesar_resultados)
+        else:
+            self.sondeando = False
+
+    def mostrar_error(self, manejador: str, titulo: str, error: BaseException) -> None:
+        """Muestra el error en la vista y lo avisa a al_error con el nombre del manejador"""
+        if self.al_error is not None:
+            self.al_error(manejador, error)
+        self.vista.mostrar_error(titulo, str(error))
+
+    def __tarea_terminada(self, futuro: Future, cancelar: threading.Event, al_terminar: Callable[[Any], None],
+                          manejador: str) -> None:
+        self.cancelaciones.pop(cancelar, None)
+        self.tareas_pendientes -= 1
+        if self.tareas_pendientes == 0:
+            self.vista.ocultar_progreso()
+        if futuro.cancelled():
+            return
+        error = futuro.exception()
+        if error is not None:
+            self.mostrar_error(manejador, "error", error)
+        else:
+            al_terminar(futuro.result())
+
+    def cancelar_tareas(self) -> None:
+        """
+        Maneja el clic en 'cancelar': las tareas en cola no llegan a empezar
+        y las que estan en curso paran en cuanto pueden
+        """
+        for cancelar, futuro in self.cancelaciones.items():
+            cancelar.set()
+            futuro.cancel()
+        self.vista.actualizar_progreso("cancelando...")
+
+    def cerrar(self) -> None:
+        """Cancela las tareas pendientes y espera a la que este en curso"""
+        for cancelar in self.cancelaciones:
+            cancelar.set()
+        self.ejecutor.shutdown(wait=True, cancel_futures=True)
 
     # Manejadores de eventos (Clientes) 
 
@@ -59,17 +178,17 @@ class Controlador:
             # 3. Llamar al Modelo
             self.modelo.registrar_cliente(nombre, apellidos, dni)
             
-            # 4. Actualizar la Vista
-            self.actualizar_listas_y_combos()
+            # 4. Actualizar la Vista (solo se vuelve a pedir la pagina visible)
+            self.vista.actualizar_lista_clientes()
             
             # 5. Limpiar campos de entrada
             self.vista.entry_cliente_nombre.delete(0, 'end')
             self.vista.entry_cliente_apellidos.delete(0, 'end')
             self.vista.entry_cliente_dni.delete(0, 'end')
             
-        except ValueError as e:
+        except (ValueError, ClienteDuplicadoError) as e:
             # Si hay un error, mostrarlo
-            self.vista.mostrar_error("error de validacion", str(e))
+            self.mostrar_error("registrar_cliente", "error de validacion", e)
 
     def eliminar_cliente(self) -> None:
         """Maneja el clic en el boton 'eliminar cliente'"""
@@ -79,18 +198,37 @@ class Controlador:
             if not seleccion:
                 raise ValueError("debe seleccionar un cliente")
             
-            item = self.vista.tree_clientes.item(seleccion)
-            dni = item['values'][2] # El DNI esta en la tercera columna
+            dni = seleccion # El iid de cada fila es el DNI del cliente
             
             # 2 Llamar al Modelo
             self.modelo.eliminar_cliente(dni)
             
-            # 3Actualizar la Vista
-            self.actualizar_listas_y_combos()
+            # 3 Actualizar la Vista (solo se vuelve a pedir la pagina visible)
+            self.vista.actualizar_lista_clientes()
             self.vista.actualizar_vista_factura(None) # Limpiar factura si se borra el cliente
             
         except (ValueError, ClienteNoEncontradoError) as e:
-            self.vista.mostrar_error("error al eliminar", str(e))
+            self.mostrar_error("eliminar_cliente", "error al eliminar", e)
+
+    def importar_clientes(self) -> None:
+        """Maneja el clic en 'importar clientes' (CSV o JSON Lines, en segundo plano)"""
+        ruta = self.vista.pedir_archivo_importacion("importar clientes")
+        if ruta:
+            self.ejecutar_en_segundo_plano(
+                "importando clientes",
+                lambda cancelar, progreso: self.modelo.importar_clientes(
+                    ruta, cancelar=cancelar, progreso=lambda n: progreso(f"{n} filas")),
+                self.importacion_terminada, "importar_clientes")
+
+    def importacion_terminada(self, informe) -> None:
+        """Muestra el resultado de una importacion y refresca las listas"""
+        self.actualizar_listas_y_combos()
+        mensaje = f"importados: {informe.importados}, errores: {len(informe.errores)}"
+        if informe.cancelada:
+            mensaje += " (cancelada)"
+        for fila, error in informe.errores[:10]: # Solo los primeros, para no llenar la ventana
+            mensaje += f"\nfila {fila}: {error}"
+        self.vista.mostrar_info("importacion", mensaje)
 
     # Manejadores de eventos (Articulos) 
 
@@ -118,8 +256,8 @@ class Controlador:
                 licencia = extra
                 self.modelo.registrar_articulo_digital(codigo, denominacion, precio, licencia)
             
-            # 4 Actualizar la Vista
-            self.actualizar_listas_y_combos()
+            # 4 Actualizar la Vista (solo se vuelve a pedir la pagina visible)
+            self.vista.actualizar_lista_articulos()
             
             # 5 Limpiar campos
             self.vista.entry_articulo_codigo.delete(0, 'end')
@@ -127,9 +265,19 @@ class Controlador:
             self.vista.entry_articulo_precio.delete(0, 'end')
             self.vista.entry_articulo_extra.delete(0, 'end')
 
-        except (ValueError, PrecioInvalidoError) as e:
+        except (ValueError, PrecioInvalidoError, ArticuloDuplicadoError) as e:
             # Capturamos error de conversion (float/int) o de precio
-            self.vista.mostrar_error("error de validacion", str(e))
+            self.mostrar_error("registrar_articulo", "error de validacion", e)
+
+    def importar_articulos(self) -> None:
+        """Maneja el clic en 'importar articulos' (CSV o JSON Lines, en segundo plano)"""
+        ruta = self.vista.pedir_archivo_importacion("importar articulos")
+        if ruta:
+            self.ejecutar_en_segundo_plano(
+                "importando articulos",
+                lambda cancelar, progreso: self.modelo.importar_articulos(
+                    ruta, cancelar=cancelar, progreso=lambda n: progreso(f"{n} filas")),
+                self.importacion_terminada, "importar_articulos")
 
     #Manejadores de eventos (Facturacion) 
 
@@ -141,14 +289,15 @@ class Controlador:
             if not dni_cliente:
                 raise ValueError("debe seleccionar un cliente")
             
-            # 2. Llamar al Modelo
+            # 2. Llamar al Modelo (la factura anterior de esta caja queda cerrada en el historial)
+            self.modelo.cerrar_factura()
             factura = self.modelo.crear_nueva_factura(dni_cliente)
             
             # 3. Actualizar la Vista (la seccion de factura)
             self.vista.actualizar_vista_factura(factura)
             
         except (ValueError, ClienteNoEncontradoError) as e:
-            self.vista.mostrar_error("error", str(e))
+            self.mostrar_error("nueva_factura", "error", e)
 
     def agregar_linea(self) -> None:
         """Maneja el clic en 'agregar linea'."""
@@ -177,7 +326,7 @@ class Controlador:
             self.vista.entry_factura_cantidad.delete(0, 'end')
         
         except (ValueError, ArticuloNoEncontradoError, CantidadInvalidaError) as e:
-            self.vista.mostrar_error("error al agregar linea", str(e))
+            self.mostrar_error("agregar_linea", "error al agregar linea", e)
     
     def eliminar_linea(self) -> None:
         """Maneja el clic en 'eliminar linea seleccionada'."""
@@ -191,42 +340,47 @@ class Controlador:
             if not seleccion:
                 raise ValueError("debe seleccionar una linea")
             
-            # Obtenemos el indice de la fila seleccionada
-            indice = self.vista.tree_factura_lineas.index(seleccion)
-            
-            # 3 Llamar al Modelo
-            self.modelo.eliminar_linea_factura(indice)
+            # 3 Llamar al Modelo (el iid de cada fila es el codigo del articulo de la linea)
+            self.modelo.eliminar_linea_factura(seleccion)
             
             # 4 Actualizar la Vista
             self.vista.actualizar_vista_factura(self.modelo.factura_actual)
         
         except ValueError as e:
-            self.vista.mostrar_error("error al eliminar", str(e))
+            self.mostrar_error("eliminar_linea", "error al eliminar", e)
 
     #  Manejadores de eventos (Exportacion)
 
     def exportar_json(self) -> None:
-        """Maneja el clic en 'exportar a json'."""
+        """Maneja el clic en 'exportar a json' (el archivo se escribe en segundo plano)"""
         try:
-            if self.modelo.factura_actual:
-                # 1 Llamar al Modelo
-                self.modelo.exportar_factura_json()
-                # 2 Mostrar info en la Vista
-                self.vista.mostrar_info("exportacion", "factura exportada a json")
+            factura = self.modelo.factura_actual
+            if factura:
+                # 1 Llamar al Modelo desde el hilo de tareas
+                # 2 Mostrar info en la Vista cuando termine
+                self.ejecutar_en_segundo_plano(
+                    "exportando a json",
+                    lambda cancelar, progreso: self.modelo.exportar_factura_json(id_factura=factura.id),
+                    lambda ruta: self.vista.mostrar_info("exportacion", f"factura exportada a json: {ruta}"),
+                    "exportar_json")
             else:
                 raise ValueError("no hay factura para exportar")
         except Exception as e:
-            self.vista.mostrar_error("error", str(e))
+            self.mostrar_error("exportar_json", "error", e)
 
     def exportar_csv(self) -> None:
-        """Maneja el clic en 'exportar a csv'."""
+        """Maneja el clic en 'exportar a csv' (el archivo se escribe en segundo plano)"""
         try:
-            if self.modelo.factura_actual:
-                # 1Llamar al Modelo
-                self.modelo.exportar_factura_csv()
-                # 2 Mostrar info en la Vista
-                self.vista.mostrar_info("exportacion", "factura exportada a csv")
+            factura = self.modelo.factura_actual
+            if factura:
+                # 1 Llamar al Modelo desde el hilo de tareas
+                # 2 Mostrar info en la Vista cuando termine
+                self.ejecutar_en_segundo_plano(
+                    "exportando a csv",
+                    lambda cancelar, progreso: self.modelo.exportar_factura_csv(id_factura=factura.id),
+                    lambda ruta: self.vista.mostrar_info("exportacion", f"factura exportada a csv: {ruta}"),
+                    "exportar_csv")
             else:
                 raise ValueError("no hay factura para exportar")
         except Exception as e:
-            self.vista.mostrar_error("error", str(e))
\ No newline at end of file
+            self.mostrar_error("exportar_csv", "error", e)
\ No newline at end of file
@@ -16,4 +16,16 @@ class ClienteNoEncontradoError(Exception):
 
 class PrecioInvalidoError(Exception):
     """Lanzada cuando se intenta poner un precio negativo"""
+    pass
+
+class ClienteDuplicadoError(Exception):
+    """Lanzada cuando se registra un cliente con un DNI que ya existe"""
+    pass
+
+class ArticuloDuplicadoError(Exception):
+    """Lanzada cuando se registra un articulo con un codigo que ya existe"""
+    pass
+
+class FacturaNoEncontradaError(Exception):
+    """Lanzada cuando no se encuentra una factura (o no esta abierta) por su id"""
     pass
\ No newline at end of file
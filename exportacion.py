@@ -0,0 +1,83 @@
+import io
+import os
+from contextlib import contextmanager
+from typing import BinaryIO, Iterable, Iterator, TextIO, Union
+
+# Un destino de exportacion puede ser una ruta o cualquier flujo escribible (texto o binario)
+Destino = Union[str, TextIO, BinaryIO]
+
+# Cabecera del CSV con varias facturas: una fila por linea de factura
+CABECERA_LINEAS = ["Factura", "Fecha", "Cliente", "DNI", "Articulo", "Cantidad", "Subtotal"]
+
+
+@contextmanager
+def escritura_atomica(ruta: str, modo: str = "w") -> Iterator[TextIO]:
+    """
+    Abre un archivo temporal junto a `ruta` y, si todo va bien, lo renombra
+    a `ruta` al terminar. Nunca queda un archivo escrito a medias
+    """
+    import uuid # Solo al escribir (uuid carga platform, que es lento de importar)
+    # Mismo directorio que el destino, para que el rename sea atomico
+    temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+    modo_exclusivo = modo.replace("w", "x")
+    try:
+        if "b" in modo:
+            archivo = open(temporal, modo_exclusivo)
+        else:
+            archivo = open(temporal, modo_exclusivo, encoding="utf-8", newline="")
+        with archivo:
+            yield archivo
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+@contextmanager
+def abrir_destino(destino: Destino) -> Iterator[TextIO]:
+    """
+    Devuelve un flujo de texto para escribir en el destino:
+    - ruta: se escribe de forma atomica (temporal + rename)
+    - flujo de texto: se usa tal cual
+    - flujo binario: se envuelve en UTF-8 sin cerrarlo al terminar
+    """
+    if isinstance(destino, str):
+        with escritura_atomica(destino) as archivo:
+            yield archivo
+    elif isinstance(destino, io.TextIOBase):
+        yield destino
+    else:
+        texto = io.TextIOWrapper(destino, encoding="utf-8", newline="", write_through=True)
+        try:
+            yield texto
+            texto.flush()
+        finally:
+            texto.detach() # Deja abierto el flujo binario del llamador
+
+
+def exportar_facturas(facturas: Iterable, destino: Destino, formato: str = "jsonl") -> int:
+    """
+    Exporta muchas facturas a un unico destino en una sola pasada
+    formato 'jsonl': un objeto JSON por linea de factura
+    formato 'csv': una fila por linea de factura, con una sola cabecera
+    Devuelve el numero de facturas escritas
+    """
+    if formato not in ("jsonl", "csv"):
+        raise ValueError(f"formato no soportado para varias facturas: {formato}")
+    escritas = 0
+    with abrir_destino(destino) as flujo:
+        if formato == "csv":
+            import csv
+            writer = csv.writer(flujo)
+            writer.writerow(CABECERA_LINEAS)
+            for factura in facturas:
+                factura.escribir_filas_csv(writer)
+                escritas += 1
+        else:
+            for factura in facturas:
+                factura.escribir_jsonl(flujo)
+                escritas += 1
+    return escritas
\ No newline at end of file
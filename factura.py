@@ -1,18 +1,57 @@
-import json
-import csv
-from typing import List
+# json y csv se importan al exportar: asi cargar el modelo es mas rapido
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, TextIO, Tuple, ValuesView
 from .interfaces import Exportable
-from .excepciones import CantidadInvalidaError
+from .exportacion import Destino, abrir_destino
+from .excepciones import CantidadInvalidaError, ArticuloNoEncontradoError
 from .persona import Cliente
 from .articulo import ArticuloBase
 
+
+def escribir_filas_csv(writer, id_factura: Optional[int], fecha: str, cliente: Cliente,
+                       lineas: Iterable[Tuple[str, int, float]]) -> None:
+    """
+    Una fila por linea (denominacion, cantidad, subtotal) con las columnas de exportacion.CABECERA_LINEAS
+    Factura lo usa con sus lineas y la facturacion por lotes con las suyas, sin crear la Factura
+    """
+    datos_cliente = cliente.obtener_datos()
+    for denominacion, cantidad, subtotal in lineas:
+        writer.writerow([id_factura, fecha, datos_cliente, cliente.dni, denominacion, cantidad, subtotal])
+
+
+def escribir_jsonl(flujo: TextIO, id_factura: Optional[int], fecha: str, cliente: Cliente,
+                   lineas: Iterable[Tuple[str, int, float]]) -> None:
+    """Un objeto JSON por linea (denominacion, cantidad, subtotal); como escribir_filas_csv"""
+    import json
+    datos_cliente = cliente.obtener_datos()
+    for denominacion, cantidad, subtotal in lineas:
+        flujo.write(json.dumps({
+            "factura": id_factura,
+            "fecha": fecha,
+            "cliente": datos_cliente,
+            "dni": cliente.dni,
+            "articulo": denominacion,
+            "cantidad": cantidad,
+            "subtotal": subtotal
+        }) + "\n")
+
+
 class LineaFactura:
-    """Representa una linea de la factura (Articulo + Cantidad)"""
-    def __init__(self, articulo: ArticuloBase, cantidad: int):
+    """
+    Representa una linea de la factura (Articulo + Cantidad)
+    El subtotal se calcula una sola vez, al crear la linea
+    Si no se indica precio_unitario se usa el precio con descuento del articulo
+    """
+    __slots__ = ("__articulo", "__cantidad", "__subtotal")
+
+    def __init__(self, articulo: ArticuloBase, cantidad: int, precio_unitario: Optional[float] = None):
         if cantidad <= 0:
             raise CantidadInvalidaError("la cantidad debe ser positiva")
+        if precio_unitario is None:
+            precio_unitario = articulo.calcular_precio_descuento()
         self.__articulo = articulo
         self.__cantidad = cantidad
+        self.__subtotal = precio_unitario * cantidad
 
     @property
     def articulo(self) -> ArticuloBase:
@@ -24,82 +63,185 @@ class LineaFactura:
 
     @property
     def subtotal(self) -> float:
-        """Propiedad calculada para el subtotal"""
-        return self.articulo.calcular_precio_descuento() * self.cantidad
+        """Subtotal de la linea (precio con descuento * cantidad)"""
+        return self.__subtotal
+
+    @property
+    def precio_unitario(self) -> float:
+        return self.__subtotal / self.__cantidad
 
 class Factura(Exportable):
     """
     Representa una factura completa, asociada a un cliente
     Implementa la interfaz Exportable
+    El total se mantiene acumulado: cada linea nueva o eliminada lo ajusta
+    con su subtotal, sin volver a sumar todas las lineas
+    Hay una linea por articulo, indexada por codigo (en orden de alta): volver a
+    añadir un articulo suma unidades a su linea, y ajustar o quitar es O(1)
+    El id lo asigna el modelo al guardarla en el historial; la fecha es la de emision
     """
-    def __init__(self, cliente: Cliente):
+    def __init__(self, cliente: Cliente, id_factura: Optional[int] = None, fecha: Optional[datetime] = None):
         self.__cliente = cliente
-        self.__lineas: List[LineaFactura] = []
+        self.__id = id_factura
+        self.__fecha = fecha if fecha is not None else datetime.now()
+        self.__lineas: Dict[str, LineaFactura] = {}
         self.__total = 0.0
 
+    @property
+    def id(self) -> Optional[int]:
+        return self.__id
+
+    @id.setter
+    def id(self, valor: int):
+        """El id solo se puede asignar una vez"""
+        if self.__id is not None:
+            raise ValueError("la factura ya tiene id")
+        self.__id = valor
+
+    @property
+    def fecha(self) -> datetime:
+        return self.__fecha
+
     @property
     def cliente(self) -> Cliente:
         return self.__cliente
 
     @property
-    def lineas(self) -> List[LineaFactura]:
-        return self.__lineas
+    def lineas(self) -> ValuesView[LineaFactura]:
+        """Las lineas en orden de alta (vista de solo lectura, sin copiarlas)"""
+        return self.__lineas.values()
+
+    def linea(self, codigo: str) -> Optional[LineaFactura]:
+        """La linea del articulo con ese codigo, o None si no esta en la factura"""
+        return self.__lineas.get(codigo)
 
     @property
     def total(self) -> float:
-        """Propiedad calculada para el total"""
-        self.calcular_total()
+        """Total acumulado de la factura"""
         return self.__total
 
-    def agregar_linea(self, articulo: ArticuloBase, cantidad: int) -> None:
-        """Añade una nueva linea a la factura."""
-        linea = LineaFactura(articulo, cantidad)
-        self.__lineas.append(linea)
-        self.calcular_total() # Recalcula el total
+    def agregar_linea(self, articulo: ArticuloBase, cantidad: int, precio_unitario: Optional[float] = None) -> LineaFactura:
+        """
+        Añade `cantidad` unidades del articulo. Si ya tiene linea se suman a ella (no
+        cambia de sitio) y toda la linea pasa a cobrarse al precio_unitario indicado
+        Devuelve la linea del articulo
+        """
+        if cantidad <= 0:
+            raise CantidadInvalidaError("la cantidad debe ser positiva")
+        anterior = self.__lineas.get(articulo.codigo)
+        if anterior is not None:
+            cantidad += anterior.cantidad
+        return self.__poner(LineaFactura(articulo, cantidad, precio_unitario), anterior)
+
+    def ajustar_linea(self, codigo: str, cantidad: int, precio_unitario: Optional[float] = None) -> LineaFactura:
+        """Cambia la cantidad (y el precio unitario) de la linea de un articulo"""
+        anterior = self.__lineas.get(codigo)
+        if anterior is None:
+            raise ArticuloNoEncontradoError("el articulo no esta en la factura")
+        return self.__poner(LineaFactura(anterior.articulo, cantidad, precio_unitario), anterior)
+
+    def __poner(self, linea: LineaFactura, anterior: Optional[LineaFactura]) -> LineaFactura:
+        """Pone la linea en lugar de la anterior del mismo articulo (o al final) y ajusta el total"""
+        self.__lineas[linea.articulo.codigo] = linea
+        self.__total += linea.subtotal - (anterior.subtotal if anterior is not None else 0.0)
+        return linea
 
-    def eliminar_linea(self, indice: int) -> None:
-        """Elimina una linea por su indice."""
-        if 0 <= indice < len(self.__lineas):
-            del self.__lineas[indice]
-            self.calcular_total() # Recalcula el total
+    def eliminar_linea(self, codigo: str) -> Optional[LineaFactura]:
+        """Quita la linea de un articulo. Devuelve la linea quitada (None si no estaba)"""
+        linea = self.__lineas.pop(codigo, None)
+        if linea is not None:
+            if self.__lineas:
+                self.__total -= linea.subtotal # Resta solo la linea eliminada
+            else:
+                self.__total = 0.0 # Sin lineas no arrastramos error de redondeo
+        return linea
+
+    def recalcular(self) -> float:
+        """
+        Vuelve a sumar todas las lineas y corrige el total acumulado
+        Sirve para verificar que el total incremental es correcto
+        """
+        self.__total = sum(linea.subtotal for linea in self.__lineas.values())
+        return self.__total
 
     def calcular_total(self) -> None:
-        """Metodo privado para recalcular el total de la factura"""
-        self.__total = sum(linea.subtotal for linea in self.__lineas)
-
-    def exportar_json(self) -> None:
-        """Exporta la factura a un archivo JSON"""
-        datos = {
-            "cliente": self.cliente.obtener_datos(),
-            "total": self.total,
-            "lineas": [
-                {
-                    "articulo": linea.articulo.denominacion,
-                    "cantidad": linea.cantidad,
-                    "subtotal": linea.subtotal
-                } for linea in self.lineas
-            ]
-        }
-        # Guardamos el archivo
-        with open(f"factura_{self.cliente.dni}.json", "w") as f:
-            json.dump(datos, f, indent=4)
-        print("factura exportada a json")
-
-    def exportar_csv(self) -> None:
-        """Exporta la factura a un archivo CSV"""
-        with open(f"factura_{self.cliente.dni}.csv", "w", newline='') as f:
-            writer = csv.writer(f)
-            # Escribimos los datos del cliente y total
-            writer.writerow(["Cliente", self.cliente.obtener_datos()])
-            writer.writerow(["Total", self.total])
-            writer.writerow([]) # Linea en blanco
-            # Escribimos las cabeceras de las lineas
-            writer.writerow(["Articulo", "Cantidad", "Subtotal"])
-            # Escribimos cada linea
-            for linea in self.lineas:
-                writer.writerow([
-                    linea.articulo.denominacion,
-                    linea.cantidad,
-                    linea.subtotal
-                ])
-        print("factura exportada a csv")
\ No newline at end of file
+        """Recalcula el total completo (equivale a recalcular())"""
+        self.recalcular()
+
+    def nombre_archivo(self, extension: str) -> str:
+        """Nombre de archivo por defecto: lleva el id (o la hora) para no pisar otras facturas"""
+        if self.id is not None:
+            return f"factura_{self.id}_{self.cliente.dni}.{extension}"
+        marca = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return f"factura_{self.cliente.dni}_{marca}.{extension}"
+
+    def __exportar(self, destino: Optional[Destino], extension: str, escribir: Callable[[TextIO], None]) -> Optional[str]:
+        """Abre el destino (o el archivo por defecto) y escribe con la funcion dada"""
+        if destino is None:
+            destino = self.nombre_archivo(extension)
+        with abrir_destino(destino) as flujo:
+            escribir(flujo)
+        return destino if isinstance(destino, str) else None
+
+    def exportar_json(self, destino: Optional[Destino] = None) -> Optional[str]:
+        """Exporta la factura en JSON"""
+        return self.__exportar(destino, "json", self.escribir_json)
+
+    def exportar_csv(self, destino: Optional[Destino] = None) -> Optional[str]:
+        """Exporta la factura en CSV"""
+        return self.__exportar(destino, "csv", self.escribir_csv)
+
+    def exportar_jsonl(self, destino: Optional[Destino] = None) -> Optional[str]:
+        """Exporta la factura en JSON Lines (un objeto por linea de factura)"""
+        return self.__exportar(destino, "jsonl", self.escribir_jsonl)
+
+    def escribir_json(self, flujo: TextIO) -> None:
+        """Escribe la factura como un objeto JSON, linea a linea sin armarlo en memoria"""
+        import json
+        flujo.write("{\n")
+        flujo.write(f'    "id": {json.dumps(self.id)},\n')
+        flujo.write(f'    "fecha": {json.dumps(self.fecha.isoformat())},\n')
+        flujo.write(f'    "cliente": {json.dumps(self.cliente.obtener_datos())},\n')
+        flujo.write(f'    "total": {json.dumps(self.total)},\n')
+        flujo.write('    "lineas": [')
+        separador = "\n"
+        for linea in self.lineas:
+            flujo.write(separador)
+            flujo.write("        " + json.dumps({
+                "articulo": linea.articulo.denominacion,
+                "cantidad": linea.cantidad,
+                "subtotal": linea.subtotal
+            }))
+            separador = ",\n"
+        flujo.write("\n    ]\n}\n")
+
+    def escribir_csv(self, flujo: TextIO) -> None:
+        """Escribe la factura en CSV: cliente, total y despues una fila por linea"""
+        import csv
+        writer = csv.writer(flujo)
+        # Escribimos los datos de la factura, el cliente y el total
+        writer.writerow(["Factura", self.id])
+        writer.writerow(["Fecha", self.fecha.isoformat()])
+        writer.writerow(["Cliente", self.cliente.obtener_datos()])
+        writer.writerow(["Total", self.total])
+        writer.writerow([]) # Linea en blanco
+        # Escribimos las cabeceras de las lineas
+        writer.writerow(["Articulo", "Cantidad", "Subtotal"])
+        # Escribimos cada linea
+        for linea in self.lineas:
+            writer.writerow([
+                linea.articulo.denominacion,
+                linea.cantidad,
+                linea.subtotal
+            ])
+
+    def __datos_lineas(self) -> Iterable[Tuple[str, int, float]]:
+        return ((linea.articulo.denominacion, linea.cantidad, linea.subtotal) for linea in self.lineas)
+
+    def escribir_filas_csv(self, writer) -> None:
+        """Escribe una fila por linea con las columnas de exportacion.CABECERA_LINEAS"""
+        escribir_filas_csv(writer, self.id, self.fecha.isoformat(), self.cliente, self.__datos_lineas())
+
+    def escribir_jsonl(self, flujo: TextIO) -> None:
+        """Escribe un objeto JSON por cada linea de la factura"""
+        escribir_jsonl(flujo, self.id, self.fecha.isoformat(), self.cliente, self.__datos_lineas())
\ No newline at end of file
@@ -0,0 +1,397 @@
+import heapq
+import io
+import os
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+from .articulo import ArticuloBase, ArticuloFisico, ArticuloDigital
+from .catalogo_columnar import tipo_articulo
+from .excepciones import (ArticuloNoEncontradoError, CantidadInvalidaError, ClienteNoEncontradoError,
+                          PrecioInvalidoError)
+from .exportacion import CABECERA_LINEAS, Destino, abrir_destino
+from .factura import Factura, escribir_filas_csv, escribir_jsonl
+from .importacion import formato_por_extension, leer_filas
+from .persona import Cliente
+from .precios import MotorPrecios, Regla
+
+# Lineas (aprox.) de cada tarea que se manda a un proceso: bastantes para que el reparto
+# compense y pocas para que el proceso principal vaya guardando mientras los demas trabajan
+# El reparto solo depende de los pedidos, no del numero de procesos: los ids salen iguales
+LINEAS_POR_TAREA = 5_000
+# Lineas del archivo de pedidos de cada trozo que se analiza en un proceso (antes de facturar)
+LINEAS_POR_TROZO = 10_000
+# Errores que rechazan un pedido (se anotan en el informe); cualquier otro detiene la facturacion
+ERRORES_DE_PEDIDO = (ClienteNoEncontradoError, ArticuloNoEncontradoError, PrecioInvalidoError,
+                     CantidadInvalidaError, ValueError)
+
+# (texto con lineas enteras del archivo, desplazamiento de los numeros de fila, formato)
+Trozo = Tuple[str, int, str]
+# (pedido, id de factura, (nombre, apellidos, dni), lineas) de cada pedido de una tarea
+Tarea = List[Tuple[str, int, Tuple[str, str, str], List[Tuple[str, int]]]]
+# Lo que devuelve un proceso: (id, precios unitarios) de cada factura, su exportacion y
+# los errores. Solo numeros y texto: la Factura solo se crea en el proceso principal
+Resultado = Tuple[List[Tuple[int, List[float]]], str, List[Tuple[str, str]]]
+
+
+class InformeFacturacion:
+    """Resultado de una facturacion por lotes: facturas creadas y errores por pedido"""
+    def __init__(self):
+        self.facturas = 0
+        self.lineas = 0
+        self.importe = 0.0
+        self.errores: List[Tuple[str, str]] = [] # (pedido, mensaje)
+
+    @property
+    def total(self) -> int:
+        return self.facturas + len(self.errores)
+
+    def __repr__(self) -> str:
+        return f"InformeFacturacion(facturas={self.facturas}, lineas={self.lineas}, errores={len(self.errores)})"
+
+
+class Pedido:
+    """
+    Unidades por articulo (codigo -> cantidad) de un pedido de un cliente; se convierte
+    en una factura. Las filas de un mismo articulo se suman, como en la factura
+    """
+    __slots__ = ("clave", "dni", "fila", "lineas", "error")
+
+    def __init__(self, clave: str, dni: str, fila: int):
+        self.clave = clave
+        self.dni = dni
+        self.fila = fila # Primera fila del pedido (en el trozo que lo ha leido)
+        self.lineas: Dict[str, int] = {}
+        self.error: Optional[str] = None # Primer error encontrado: el pedido entero se rechaza
+
+
+def leer_pedidos(origen: Union[str, TextIO], formato: Optional[str] = None) -> Tuple[List[Pedido], List[Tuple[str, str]]]:
+    """
+    Lee un archivo de pedidos CSV/JSON Lines con los campos dni, codigo, cantidad
+    y, opcionalmente, pedido. Las filas con el mismo `pedido` (o, si no hay esa
+    columna, todas las de un mismo cliente) forman un pedido
+    Devuelve los pedidos en orden de aparicion y los errores de filas que no se
+    pueden asignar a ningun pedido
+    """
+    pedidos, sueltos = _agrupar(leer_filas(origen, formato))
+    return list(pedidos.values()), sueltos
+
+
+def _agrupar(filas: Iterable[Tuple[int, Any]]) -> Tuple[Dict[str, Pedido], List[Tuple[str, str]]]:
+    """Agrupa en pedidos las filas (numero, diccionario o excepcion) de leer_filas"""
+    pedidos: Dict[str, Pedido] = {}
+    sueltos: List[Tuple[str, str]] = []
+    for numero, fila in filas:
+        if isinstance(fila, Exception) or not fila.get("dni"):
+            sueltos.append((f"fila {numero}", str(fila) if isinstance(fila, Exception) else "falta el dni"))
+            continue
+        dni = str(fila["dni"])
+        clave = str(fila.get("pedido") or dni)
+        pedido = pedidos.get(clave)
+        if pedido is None:
+            pedido = pedidos[clave] = Pedido(clave, dni, numero)
+        if pedido.error is not None:
+            continue
+        try:
+            if dni != pedido.dni:
+                raise ValueError("el pedido mezcla varios clientes")
+            codigo, cantidad = fila.get("codigo"), fila.get("cantidad") or 0
+            if isinstance(cantidad, (dict, list)):
+                raise ValueError("la cantidad debe ser un numero")
+            cantidad = int(cantidad)
+            if not codigo:
+                raise ValueError("falta el codigo de articulo")
+            if cantidad <= 0:
+                raise ValueError("la cantidad debe ser positiva")
+            codigo = str(codigo)
+            pedido.lineas[codigo] = pedido.lineas.get(codigo, 0) + cantidad
+        except ValueError as e:
+            pedido.error = f"fila {numero}: {e}"
+    return pedidos, sueltos
+
+
+# Lectura en varios procesos
+
+def _trozos(origen: Union[str, TextIO], formato: Optional[str]) -> Iterator[Trozo]:
+    """
+    Parte el archivo en trozos de unas LINEAS_POR_TROZO lineas enteras, sin analizarlas
+    En CSV cada trozo lleva delante la cabecera y no se corta dentro de un campo entre
+    comillas que tenga saltos de linea (solo donde las comillas leidas son pares)
+    """
+    if isinstance(origen, str):
+        with open(origen, "r", encoding="utf-8", newline="") as f:
+            yield from _trozos(f, formato or formato_por_extension(origen))
+        return
+    formato = formato or "jsonl" # Como en leer_filas
+    es_csv = formato == "csv"
+    cabecera: Optional[str] = None if es_csv else ""
+    lineas_cabecera = 0
+    lineas: List[str] = []
+    comillas = 0
+    leidas = 0 # Lineas del archivo leidas
+    inicio = 1 # Numero de la primera linea del trozo
+    for linea in origen:
+        leidas += 1
+        lineas.append(linea)
+        if es_csv:
+            comillas += linea.count('"')
+            if comillas % 2: # El campo entre comillas sigue en la linea siguiente
+                continue
+            if cabecera is None:
+                cabecera, lineas_cabecera = "".join(lineas), len(lineas)
+                lineas, inicio = [], leidas + 1
+                continue
+        if len(lineas) >= LINEAS_POR_TROZO:
+            yield cabecera + "".join(lineas), inicio - 1 - lineas_cabecera, formato
+            lineas, inicio = [], leidas + 1
+    if lineas:
+        yield (cabecera or "") + "".join(lineas), inicio - 1 - lineas_cabecera, formato
+
+
+def _leer_trozo(trozo: Trozo) -> Tuple[List[Pedido], List[Tuple[str, str]]]:
+    """Agrupa las filas de un trozo (en un proceso) con los numeros de fila del archivo"""
+    texto, desplazamiento, formato = trozo
+    filas = leer_filas(io.StringIO(texto, newline=""), formato)
+    pedidos, sueltos = _agrupar((numero + desplazamiento, fila) for numero, fila in filas)
+    return list(pedidos.values()), sueltos
+
+
+def _unir(pedidos: Dict[str, Pedido], partes: Iterable[Pedido]) -> None:
+    """
+    Añade a `pedidos` los de un trozo (que va despues en el archivo): suma las lineas
+    de los que ya estaban y conserva el primer error, como al leer el archivo de una vez
+    """
+    for parte in partes:
+        pedido = pedidos.get(parte.clave)
+        if pedido is None:
+            pedidos[parte.clave] = parte
+        elif pedido.error is not None:
+            continue
+        elif parte.dni != pedido.dni:
+            pedido.error = f"fila {parte.fila}: el pedido mezcla varios clientes"
+        else:
+            for codigo, cantidad in parte.lineas.items():
+                pedido.lineas[codigo] = pedido.lineas.get(codigo, 0) + cantidad
+            pedido.error = parte.error
+
+
+def _leer_en_procesos(origen: Union[str, TextIO], formato: Optional[str],
+                      procesos: int) -> Tuple[List[Pedido], List[Tuple[str, str]]]:
+    """leer_pedidos con el analisis de las filas repartido por trozos entre `procesos` procesos"""
+    if procesos <= 1:
+        return leer_pedidos(origen, formato)
+    trozos = list(_trozos(origen, formato))
+    pedidos: Dict[str, Pedido] = {}
+    sueltos: List[Tuple[str, str]] = []
+
+    def unir(resultados: Iterable[Tuple[List[Pedido], List[Tuple[str, str]]]]) -> None:
+        for partes, errores in resultados: # En el orden de los trozos
+            _unir(pedidos, partes)
+            sueltos.extend(errores)
+
+    if len(trozos) <= 1:
+        unir(map(_leer_trozo, trozos))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(procesos, len(trozos))) as pool:
+            unir(pool.map(_leer_trozo, trozos))
+    return list(pedidos.values()), sueltos
+
+
+# Trabajo de cada proceso
+
+def _datos_articulo(articulo: ArticuloBase) -> tuple:
+    tipo = tipo_articulo(articulo)
+    extra = articulo.peso if tipo == "fisico" else articulo.licencia
+    return (tipo, articulo.denominacion, articulo.precio, extra)
+
+
+class _Facturador:
+    """
+    Pone precio a los pedidos y los exporta a partir de una instantanea de solo lectura
+    del catalogo (codigo -> datos) y de las reglas de precios, sin crear las Facturas:
+    el proceso principal crea cada una una sola vez con los precios que le llegan
+    Cada proceso tiene el suyo
+    """
+    def __init__(self, catalogo: Dict[str, tuple], reglas: List[Regla], fecha: datetime, formato: Optional[str]):
+        self.__catalogo = catalogo
+        self.__articulos: Dict[str, ArticuloBase] = {} # Objetos creados la primera vez que se usan
+        self.__motor = MotorPrecios(reglas)
+        self.__fecha = fecha
+        self.__texto_fecha = fecha.isoformat()
+        self.__formato = formato
+
+    def __articulo(self, codigo: str) -> ArticuloBase:
+        articulo = self.__articulos.get(codigo)
+        if articulo is None:
+            tipo, denominacion, precio, extra = self.__catalogo[codigo]
+            clase = ArticuloFisico if tipo == "fisico" else ArticuloDigital
+            articulo = self.__articulos[codigo] = clase(codigo, denominacion, precio, extra)
+        return articulo
+
+    def facturar(self, tarea: Tarea) -> Resultado:
+        precios_facturas: List[Tuple[int, List[float]]] = []
+        errores: List[Tuple[str, str]] = []
+        flujo = io.StringIO()
+        exportar = self.__exportador(flujo)
+        for clave, id_factura, datos_cliente, lineas in tarea:
+            try:
+                articulos = [self.__articulo(codigo) for codigo, _ in lineas]
+                cantidades = [cantidad for _, cantidad in lineas]
+                precios = self.__motor.precios_unitarios(articulos, cantidades, datos_cliente[2], self.__fecha)
+            except ERRORES_DE_PEDIDO as e: # Se informa del pedido y se sigue con los demas
+                errores.append((clave, f"{type(e).__name__}: {e}"))
+                continue
+            precios_facturas.append((id_factura, precios))
+            if exportar is not None:
+                # Subtotal = precio * cantidad, como en LineaFactura
+                exportar(id_factura, self.__texto_fecha, Cliente(*datos_cliente),
+                         ((a.denominacion, c, p * c) for a, c, p in zip(articulos, cantidades, precios)))
+        return precios_facturas, flujo.getvalue(), errores
+
+    def __exportador(self, flujo: io.StringIO) -> Optional[Callable[..., None]]:
+        """
+        Funcion que exporta una factura de la tarea en `flujo` (sin cabecera) desde sus
+        datos, con el mismo formato que Factura: la exportacion tambien se hace en paralelo
+        """
+        if self.__formato is None:
+            return None
+        if self.__formato == "csv":
+            import csv
+            writer = csv.writer(flujo)
+            return lambda *datos: escribir_filas_csv(writer, *datos)
+        return lambda *datos: escribir_jsonl(flujo, *datos)
+
+
+_facturador: Optional[_Facturador] = None # El de este proceso (ver _iniciar_proceso)
+
+
+def _iniciar_proceso(*argumentos: Any) -> None:
+    global _facturador
+    _facturador = _Facturador(*argumentos)
+
+
+def _facturar_en_proceso(tarea: Tarea) -> Resultado:
+    return _facturador.facturar(tarea)
+
+
+# Reparto y union de resultados
+
+def _repartir(pedidos: List[Pedido], tareas: int) -> List[List[Pedido]]:
+    """Reparte los pedidos por cliente (todos los de un cliente van juntos) igualando lineas"""
+    por_cliente: Dict[str, List[Pedido]] = {}
+    for pedido in pedidos:
+        por_cliente.setdefault(pedido.dni, []).append(pedido)
+    grupos = sorted(por_cliente.values(), key=lambda g: sum(len(p.lineas) for p in g), reverse=True)
+    cargas = [(0, i) for i in range(tareas)] # (lineas asignadas, tarea): el mas vacio primero
+    reparto: List[List[Pedido]] = [[] for _ in range(tareas)]
+    for grupo in grupos:
+        carga, i = heapq.heappop(cargas)
+        reparto[i].extend(grupo)
+        heapq.heappush(cargas, (carga + sum(len(p.lineas) for p in grupo), i))
+    return [tarea for tarea in reparto if tarea]
+
+
+def _validar(modelo, pedidos: List[Pedido], informe: InformeFacturacion) -> Tuple[List[Pedido], Dict[str, ArticuloBase], Dict[str, Cliente]]:
+    """
+    Comprueba en el proceso principal que existen clientes y articulos (son busquedas
+    baratas) asi solo se reservan ids para pedidos que se van a facturar
+    Devuelve los pedidos validos y los articulos y clientes que usan
+    """
+    articulos: Dict[str, ArticuloBase] = {}
+    clientes: Dict[str, Cliente] = {}
+    validos = []
+    for pedido in pedidos:
+        if pedido.error is None and not pedido.lineas:
+            pedido.error = "pedido sin lineas"
+        if pedido.error is not None:
+            informe.errores.append((pedido.clave, pedido.error))
+            continue
+        try:
+            if pedido.dni not in clientes:
+                clientes[pedido.dni] = modelo.buscar_cliente(pedido.dni)
+            for codigo in pedido.lineas:
+                if codigo not in articulos:
+                    articulos[codigo] = modelo.buscar_articulo(codigo)
+        except ERRORES_DE_PEDIDO as e:
+            informe.errores.append((pedido.clave, str(e)))
+            continue
+        validos.append(pedido)
+    return validos, articulos, clientes
+
+
+def facturar_pedidos(modelo, origen: Union[str, TextIO], formato: Optional[str] = None,
+                     procesos: Optional[int] = None, destino: Optional[Destino] = None,
+                     formato_exportacion: str = "jsonl", fecha: Optional[datetime] = None,
+                     progreso: Optional[Callable[[int], None]] = None) -> InformeFacturacion:
+    """
+    Convierte un archivo de pedidos en facturas cerradas del historial
+    1 los procesos analizan el archivo por trozos; el principal junta los pedidos,
+      los valida y reserva sus ids
+    2 reparte los pedidos por cliente en tareas que ponen precio a las lineas y las
+      exportan en `procesos` procesos (por defecto uno por CPU) a partir de una
+      instantanea de solo lectura de los articulos usados y de las reglas de precios
+    3 crea cada factura (una sola vez) con los articulos del modelo y los precios
+      calculados, la guarda en el historial y escribe su exportacion en `destino`
+      (jsonl o csv) segun van llegando, en orden de id
+    Un pedido con errores no se factura y se anota en el informe; los demas siguen
+    """
+    if formato_exportacion not in ("jsonl", "csv"):
+        raise ValueError(f"formato no soportado para varias facturas: {formato_exportacion}")
+    procesos = procesos or os.cpu_count() or 1
+    fecha = fecha or datetime.now()
+    informe = InformeFacturacion()
+    pedidos, sueltos = _leer_en_procesos(origen, formato, procesos)
+    informe.errores.extend(sueltos)
+    validos, articulos, clientes = _validar(modelo, pedidos, informe)
+
+    total_lineas = sum(len(p.lineas) for p in validos)
+    numero_tareas = max(1, -(-total_lineas // LINEAS_POR_TAREA))
+    tareas: List[Tarea] = []
+    por_id: Dict[int, Pedido] = {}
+    ids = iter(modelo.reservar_ids_factura(len(validos)))
+    for grupo in _repartir(validos, numero_tareas):
+        # Ids consecutivos dentro de cada tarea y entre tareas: se exporta en orden de id
+        tarea = []
+        for pedido in grupo:
+            id_factura = next(ids)
+            por_id[id_factura] = pedido
+            cliente = clientes[pedido.dni]
+            tarea.append((pedido.clave, id_factura, (cliente.nombre, cliente.apellidos, cliente.dni),
+                          list(pedido.lineas.items())))
+        tareas.append(tarea)
+
+    catalogo = {codigo: _datos_articulo(articulo) for codigo, articulo in articulos.items()}
+    argumentos = (catalogo, modelo.motor_precios.reglas, fecha, formato_exportacion if destino is not None else None)
+    with abrir_destino(destino) if destino is not None else nullcontext() as flujo:
+        if flujo is not None and formato_exportacion == "csv":
+            import csv
+            csv.writer(flujo).writerow(CABECERA_LINEAS)
+        for precios_facturas, texto, errores in _ejecutar(tareas, argumentos, procesos):
+            with modelo.lote(): # Una transaccion (o un fsync del diario) por tarea
+                for id_factura, precios in precios_facturas:
+                    pedido = por_id.pop(id_factura)
+                    factura = Factura(clientes[pedido.dni], id_factura, fecha)
+                    for (codigo, cantidad), precio in zip(pedido.lineas.items(), precios):
+                        factura.agregar_linea(articulos[codigo], cantidad, precio)
+                    modelo.agregar_factura_al_historial(factura)
+                    informe.lineas += len(factura.lineas)
+                    informe.importe += factura.total
+            informe.facturas += len(precios_facturas)
+            informe.errores.extend(errores)
+            if flujo is not None:
+                flujo.write(texto)
+            if progreso is not None:
+                progreso(informe.facturas)
+    return informe
+
+
+def _ejecutar(tareas: List[Tarea], argumentos: tuple, procesos: int) -> Iterator[Resultado]:
+    """Resultados de las tareas, en orden; con un solo proceso no se crea el pool"""
+    if procesos <= 1 or len(tareas) <= 1:
+        facturador = _Facturador(*argumentos)
+        yield from map(facturador.facturar, tareas)
+        return
+    from concurrent.futures import ProcessPoolExecutor # Solo si hay varios procesos
+    # La instantanea se pasa una vez a cada proceso al crearlo, no con cada tarea
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso, initargs=argumentos) as pool:
+        yield from pool.map(_facturar_en_proceso, tareas)
\ No newline at end of file
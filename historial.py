@@ -0,0 +1,66 @@
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+from .factura import Factura
+from .excepciones import FacturaNoEncontradaError
+
+
+class HistorialFacturas:
+    """
+    Guarda todas las facturas emitidas, indexadas por id, por DNI del cliente y por fecha
+    - por id: diccionario, O(1)
+    - por cliente: lista de ids de cada DNI, sin recorrer el historial
+    - por fecha: lista ordenada de (fecha, id), los rangos se buscan con bisect
+    """
+    def __init__(self):
+        self.__facturas: Dict[int, Factura] = {}
+        self.__por_cliente: Dict[str, List[int]] = {}
+        self.__por_fecha: List[Tuple[datetime, int]] = []
+        self.__ultimo_id = 0
+
+    def __len__(self) -> int:
+        return len(self.__facturas)
+
+    def __iter__(self) -> Iterator[Factura]:
+        return iter(self.__facturas.values())
+
+    @property
+    def ultimo_id(self) -> int:
+        """Ultimo id reservado (puede que su factura aun no este en el historial)"""
+        return self.__ultimo_id
+
+    def nuevo_id(self) -> int:
+        """Reserva el siguiente id de factura"""
+        self.__ultimo_id += 1
+        return self.__ultimo_id
+
+    def agregar(self, factura: Factura, abierta: bool = False) -> None:
+        """
+        Añade una factura (con id) al historial y a sus indices
+        `abierta` solo lo guardan los almacenes: en memoria las abiertas las lleva el modelo
+        """
+        self.__facturas[factura.id] = factura
+        self.__por_cliente.setdefault(factura.cliente.dni, []).append(factura.id)
+        clave = (factura.fecha, factura.id)
+        if not self.__por_fecha or self.__por_fecha[-1] <= clave:
+            self.__por_fecha.append(clave) # Caso normal: las facturas llegan en orden
+        else:
+            insort(self.__por_fecha, clave)
+        self.__ultimo_id = max(self.__ultimo_id, factura.id)
+
+    def obtener(self, id_factura: int) -> Factura:
+        """Devuelve la factura con ese id. Lanza error si no existe"""
+        try:
+            return self.__facturas[id_factura]
+        except KeyError:
+            raise FacturaNoEncontradaError("factura no encontrada") from None
+
+    def de_cliente(self, dni: str) -> List[Factura]:
+        """Facturas de un cliente, en orden de emision"""
+        return [self.__facturas[i] for i in self.__por_cliente.get(dni, [])]
+
+    def entre(self, desde: datetime, hasta: datetime) -> List[Factura]:
+        """Facturas con fecha en [desde, hasta), ordenadas por fecha"""
+        inicio = bisect_left(self.__por_fecha, (desde, 0))
+        fin = bisect_left(self.__por_fecha, (hasta, 0))
+        return [self.__facturas[i] for _, i in self.__por_fecha[inicio:fin]]
\ No newline at end of file
@@ -0,0 +1,149 @@
+import math
+import os
+from threading import Event
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple, Union
+from .excepciones import PrecioInvalidoError, ClienteDuplicadoError, ArticuloDuplicadoError
+
+CAMPOS_CLIENTE = ("nombre", "apellidos", "dni")
+CAMPOS_ARTICULO = ("tipo", "codigo", "denominacion", "precio")
+
+# Errores de una fila que se anotan en el informe sin detener la importacion
+ERRORES_DE_FILA = (ValueError, PrecioInvalidoError, ClienteDuplicadoError, ArticuloDuplicadoError)
+
+
+class InformeImportacion:
+    """Resultado de una importacion: filas importadas y errores por fila"""
+    def __init__(self):
+        self.importados = 0
+        self.errores: List[Tuple[int, str]] = [] # (numero de fila, mensaje)
+        self.cancelada = False
+
+    @property
+    def total(self) -> int:
+        return self.importados + len(self.errores)
+
+    def __repr__(self) -> str:
+        return f"InformeImportacion(importados={self.importados}, errores={len(self.errores)}, cancelada={self.cancelada})"
+
+
+def formato_por_extension(ruta: str) -> str:
+    """'csv' si el archivo acaba en .csv; si no, 'jsonl'"""
+    return "csv" if os.path.splitext(ruta)[1].lower() == ".csv" else "jsonl"
+
+
+def leer_filas(origen: Union[str, TextIO], formato: Optional[str] = None) -> Iterator[Tuple[int, Any]]:
+    """
+    Recorre un archivo CSV (con cabecera) o JSON Lines fila a fila, sin cargarlo entero
+    Devuelve pares (numero de fila, diccionario). Una linea JSON mal formada o que
+    no es un objeto se devuelve como (numero, excepcion) para que la anote el informe
+    """
+    if isinstance(origen, str):
+        if formato is None:
+            formato = formato_por_extension(origen)
+        with open(origen, "r", encoding="utf-8", newline="") as f:
+            yield from leer_filas(f, formato)
+        return
+    # Se importan aqui y no al cargar el modulo: el modelo arranca sin ellos
+    import csv
+    import json
+    if formato == "csv":
+        lector = csv.DictReader(origen)
+        for fila in lector:
+            yield lector.line_num, fila
+    else:
+        for numero, linea in enumerate(origen, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except ValueError as e:
+                yield numero, ValueError(f"json invalido: {e}")
+                continue
+            yield numero, fila if isinstance(fila, dict) else ValueError("la fila no es un objeto")
+
+
+def _campos(fila: Dict[str, Any], nombres: Tuple[str, ...]) -> List[Any]:
+    """Devuelve los campos pedidos. Lanza error si falta alguno o esta vacio"""
+    valores = [fila.get(nombre) for nombre in nombres]
+    if any(valor is None or valor == "" for valor in valores):
+        raise ValueError("todos los campos son obligatorios")
+    for nombre, valor in zip(nombres, valores):
+        if isinstance(valor, (dict, list)): # JSON: float() o str() no darian un error claro
+            raise ValueError(f"el campo {nombre} debe ser un texto o un numero")
+    return valores
+
+
+def _numero(valor: Any, nombre: str) -> float:
+    """El campo como float. Lanza ValueError si no es un numero finito ('nan' o 'inf' no valen)"""
+    numero = float(valor)
+    if not math.isfinite(numero):
+        raise ValueError(f"el campo {nombre} debe ser un numero finito")
+    return numero
+
+
+def _importar_por_lotes(modelo, filas: Iterator[Tuple[int, Any]], registrar_fila: Callable[[Any, Dict[str, Any]], None],
+                        tam_lote: int, cancelar: Optional[Event] = None,
+                        progreso: Optional[Callable[[int], None]] = None) -> InformeImportacion:
+    """
+    Aplica registrar_fila a cada fila dentro de lotes de tam_lote filas (modelo.lote())
+    Los errores de una fila se anotan en el informe y se sigue con la siguiente
+    Entre lote y lote llama a progreso(filas procesadas) y mira si se pidio cancelar;
+    los lotes ya terminados se conservan
+    """
+    informe = InformeImportacion()
+    terminado = False
+    while not terminado:
+        if cancelar is not None and cancelar.is_set():
+            informe.cancelada = True
+            break
+        terminado = True
+        with modelo.lote():
+            for procesadas, (numero, fila) in enumerate(filas, start=1):
+                try:
+                    if isinstance(fila, Exception):
+                        raise fila
+                    registrar_fila(modelo, fila)
+                    informe.importados += 1
+                except ERRORES_DE_FILA as e:
+                    informe.errores.append((numero, str(e)))
+                if procesadas == tam_lote:
+                    terminado = False # Quedan filas: se abre otro lote
+                    break
+        if progreso is not None:
+            progreso(informe.total)
+    return informe
+
+
+def _registrar_cliente(modelo, fila: Dict[str, Any]) -> None:
+    nombre, apellidos, dni = _campos(fila, CAMPOS_CLIENTE)
+    modelo.registrar_cliente(str(nombre), str(apellidos), str(dni))
+
+
+def _registrar_articulo(modelo, fila: Dict[str, Any]) -> None:
+    tipo, codigo, denominacion, precio = _campos(fila, CAMPOS_ARTICULO)
+    precio = _numero(precio, "precio")
+    if tipo == "fisico":
+        peso, = _campos(fila, ("peso",))
+        modelo.registrar_articulo_fisico(str(codigo), str(denominacion), precio, _numero(peso, "peso"))
+    elif tipo == "digital":
+        licencia, = _campos(fila, ("licencia",))
+        modelo.registrar_articulo_digital(str(codigo), str(denominacion), precio, str(licencia))
+    else:
+        raise ValueError(f"tipo de articulo desconocido: {tipo}")
+
+
+def importar_clientes(modelo, origen: Union[str, TextIO], formato: Optional[str] = None,
+                      tam_lote: int = 1000, cancelar: Optional[Event] = None,
+                      progreso: Optional[Callable[[int], None]] = None) -> InformeImportacion:
+    """Registra en el modelo los clientes de un CSV/JSON Lines (campos nombre, apellidos, dni)"""
+    return _importar_por_lotes(modelo, leer_filas(origen, formato), _registrar_cliente, tam_lote, cancelar, progreso)
+
+
+def importar_articulos(modelo, origen: Union[str, TextIO], formato: Optional[str] = None,
+                       tam_lote: int = 1000, cancelar: Optional[Event] = None,
+                       progreso: Optional[Callable[[int], None]] = None) -> InformeImportacion:
+    """
+    Registra en el modelo los articulos de un CSV/JSON Lines
+    Campos: tipo (fisico/digital), codigo, denominacion, precio y peso o licencia
+    """
+    return _importar_por_lotes(modelo, leer_filas(origen, formato), _registrar_articulo, tam_lote, cancelar, progreso)
\ No newline at end of file
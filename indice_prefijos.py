@@ -0,0 +1,66 @@
+from bisect import bisect_left, insort
+from typing import Iterable, List, Optional
+
+
+def fin_de_prefijo(prefijo: str) -> Optional[str]:
+    """
+    Primera cadena mayor que todas las que empiezan por `prefijo`
+    (None si no hay cota: el prefijo esta vacio o solo tiene el ultimo caracter posible)
+    """
+    while prefijo:
+        ultimo = ord(prefijo[-1])
+        if ultimo < 0x10FFFF:
+            return prefijo[:-1] + chr(ultimo + 1)
+        prefijo = prefijo[:-1]
+    return None
+
+
+class IndicePrefijos:
+    """
+    Claves (DNI, codigo) ordenadas para buscar por prefijo con bisect
+    Las altas se añaden al final y se ordenan en la siguiente busqueda:
+    importar muchas claves no cuesta una insercion ordenada por cada una
+    (insertar() la pone ya en su sitio). La busqueda no cambia la lista que puede estar
+    leyendo otro hilo: ordena una copia y la pone en su lugar
+    """
+    def __init__(self, claves: Iterable[str] = ()):
+        self.__claves: List[str] = sorted(claves)
+        self.__desordenado = False
+
+    def __len__(self) -> int:
+        return len(self.__claves)
+
+    def __ordenadas(self) -> List[str]:
+        # La marca se mira antes que la lista: quien la ve quitada ya ve la lista ordenada
+        if not self.__desordenado:
+            return self.__claves
+        claves = sorted(self.__claves) # Timsort: casi lineal con la cola sin ordenar al final
+        self.__claves = claves
+        self.__desordenado = False
+        return claves
+
+    def agregar(self, clave: str) -> None:
+        if self.__claves and self.__claves[-1] > clave:
+            self.__desordenado = True
+        self.__claves.append(clave)
+
+    def insertar(self, clave: str) -> None:
+        """Como agregar, pero la clave se pone ya en su sitio (para altas sueltas entre busquedas)"""
+        insort(self.__ordenadas(), clave)
+
+    def quitar(self, clave: str) -> None:
+        claves = self.__ordenadas()
+        posicion = bisect_left(claves, clave)
+        if posicion < len(claves) and claves[posicion] == clave:
+            del claves[posicion]
+
+    def buscar(self, prefijo: str, limite: int = 20) -> List[str]:
+        """Las primeras `limite` claves (en orden) que empiezan por el prefijo"""
+        claves = self.__ordenadas()
+        inicio = bisect_left(claves, prefijo)
+        resultado = []
+        for clave in claves[inicio:inicio + limite]:
+            if not clave.startswith(prefijo):
+                break
+            resultado.append(clave)
+        return resultado
\ No newline at end of file
@@ -0,0 +1,145 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+import unicodedata
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+from .indice_prefijos import IndicePrefijos
+
+_PALABRA = re.compile(r"\w+")
+# Palabras del vocabulario que se mezclan como mucho al buscar solo por un prefijo corto ("a")
+PALABRAS_POR_PREFIJO = 200
+# Con menos codigos comunes que esto se ordenan directamente en lugar de recorrer la lista
+INTERSECCION_PEQUENA = 5000
+
+
+def normalizar(texto: str) -> List[str]:
+    """Palabras del texto sin tildes y en minusculas: 'Cafetera ELÉCTRICA' -> ['cafetera', 'electrica']"""
+    texto = texto.casefold()
+    if not texto.isascii():
+        descompuesto = unicodedata.normalize("NFKD", texto)
+        texto = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return _PALABRA.findall(texto)
+
+
+class IndiceTexto:
+    """
+    Indice invertido palabra -> codigos de los articulos cuya denominacion la contiene
+    - todas las palabras de la consulta deben aparecer (la ultima puede ser un prefijo,
+      para buscar mientras se escribe)
+    - sin distinguir mayusculas ni tildes
+    - orden: primero los que contienen la ultima palabra completa, despues los de
+      denominacion mas corta (se parecen mas a la consulta), despues por codigo
+    Cada palabra guarda sus codigos en un conjunto (para intersectar) y en una lista
+    en ese mismo orden, asi una busqueda para en cuanto tiene `limite` resultados
+    Las listas se mantienen ordenadas al agregar y quitar (busqueda binaria): buscar
+    no cambia nada, y varios hilos pueden buscar a la vez mientras nadie escribe
+    """
+    def __init__(self, denominaciones: Iterable[Tuple[str, str]] = ()):
+        self.__codigos_de: Dict[str, Set[str]] = {} # palabra -> codigos
+        self.__orden_de: Dict[str, List[str]] = {} # palabra -> codigos ordenados por __rango
+        self.__palabras_de: Dict[str, Tuple[str, ...]] = {} # codigo -> palabras
+        # Al crearlo se añade al final de las listas y se ordena cada una una sola vez
+        for codigo, denominacion in dict(denominaciones).items():
+            self.__poner(codigo, denominacion, en_su_sitio=False)
+        for orden in self.__orden_de.values():
+            orden.sort(key=self.__rango)
+        self.__vocabulario = IndicePrefijos(self.__codigos_de)
+
+    def __len__(self) -> int:
+        return len(self.__palabras_de)
+
+    def __rango(self, codigo: str) -> Tuple[int, str]:
+        return (len(self.__palabras_de[codigo]), codigo)
+
+    def agregar(self, codigo: str, denominacion: str) -> None:
+        if codigo in self.__palabras_de:
+            self.quitar(codigo)
+        self.__poner(codigo, denominacion, en_su_sitio=True)
+
+    def __poner(self, codigo: str, denominacion: str, en_su_sitio: bool) -> None:
+        """Añade el codigo a las listas de sus palabras: en su sitio (busqueda binaria) o al final"""
+        palabras = tuple(dict.fromkeys(normalizar(denominacion))) # Sin repetidas, en orden
+        self.__palabras_de[codigo] = palabras
+        for palabra in palabras:
+            codigos = self.__codigos_de.get(palabra)
+            if codigos is None:
+                codigos = self.__codigos_de[palabra] = set()
+                self.__orden_de[palabra] = []
+                if en_su_sitio:
+                    self.__vocabulario.insertar(palabra)
+            codigos.add(codigo)
+            if en_su_sitio:
+                insort(self.__orden_de[palabra], codigo, key=self.__rango)
+            else:
+                self.__orden_de[palabra].append(codigo)
+
+    def quitar(self, codigo: str) -> None:
+        palabras = self.__palabras_de.get(codigo)
+        if palabras is None:
+            return
+        rango = self.__rango(codigo)
+        for palabra in palabras:
+            codigos = self.__codigos_de[palabra]
+            codigos.discard(codigo)
+            if codigos:
+                orden = self.__orden_de[palabra]
+                del orden[bisect_left(orden, rango, key=self.__rango)]
+            else:
+                del self.__codigos_de[palabra]
+                del self.__orden_de[palabra]
+                self.__vocabulario.quitar(palabra)
+        del self.__palabras_de[codigo] # Despues: __rango lo necesita mientras se busca en las listas
+
+    def buscar(self, consulta: str, limite: int = 20) -> List[str]:
+        """Codigos de los mejores `limite` articulos para la consulta"""
+        palabras = normalizar(consulta)
+        if not palabras:
+            return []
+        # Si la consulta acaba en espacio la ultima palabra ya esta completa
+        prefijo = "" if consulta[-1:].isspace() else palabras.pop()
+        completas = set(palabras)
+        if any(p not in self.__codigos_de for p in completas):
+            return []
+        if not prefijo:
+            return list(islice(self.__coincidencias(completas, ""), limite))
+        resultado: List[str] = []
+        if prefijo in self.__codigos_de:
+            # Primero los que tienen el prefijo como palabra completa
+            resultado = list(islice(self.__coincidencias(completas | {prefijo}, ""), limite))
+        if len(resultado) < limite:
+            vistos = set(resultado)
+            nuevos = (c for c in self.__coincidencias(completas, prefijo) if c not in vistos)
+            resultado.extend(islice(nuevos, limite - len(resultado)))
+        return resultado
+
+    def __coincidencias(self, completas: Set[str], prefijo: str) -> Iterator[str]:
+        """Codigos (en orden de __rango) que tienen todas las palabras completas y alguna con el prefijo"""
+        if not completas:
+            yield from self.__por_prefijo(prefijo)
+            return
+        palabras = sorted(completas, key=lambda p: len(self.__codigos_de[p]))
+        if len(palabras) == 1:
+            comunes = None
+            recorrido: Iterable[str] = self.__orden_de[palabras[0]]
+        else:
+            # La interseccion de conjuntos va en C, aunque salgan pocos codigos
+            comunes = self.__codigos_de[palabras[0]].intersection(*(self.__codigos_de[p] for p in palabras[1:]))
+            if len(comunes) <= INTERSECCION_PEQUENA:
+                recorrido, comunes = sorted(comunes, key=self.__rango), None
+            else:
+                recorrido = self.__orden_de[palabras[0]] # Hay muchos: se para pronto
+        for codigo in recorrido:
+            if comunes is not None and codigo not in comunes:
+                continue
+            if not prefijo or any(p.startswith(prefijo) for p in self.__palabras_de[codigo]):
+                yield codigo
+
+    def __por_prefijo(self, prefijo: str) -> Iterator[str]:
+        """Mezcla en orden las listas de las palabras que empiezan por el prefijo, sin repetir codigos"""
+        listas = [self.__orden_de[p] for p in self.__vocabulario.buscar(prefijo, PALABRAS_POR_PREFIJO)]
+        anterior = None
+        for codigo in heapq.merge(*listas, key=self.__rango):
+            if codigo != anterior: # Un mismo codigo sale seguido de varias listas
+                yield codigo
+            anterior = codigo
\ No newline at end of file
@@ -1,17 +1,26 @@
 from abc import ABC, abstractmethod
+from typing import Optional
+from .exportacion import Destino
 
 class Exportable(ABC):
     """
     Interfaz abstracta para clases que pueden ser exportadas
     Define los metodos que las subclases DEBEN implementar
+    El destino puede ser una ruta (se escribe de forma atomica) o cualquier
+    flujo escribible, de texto o binario. Si no se indica, se elige un archivo
     """
     
     @abstractmethod
-    def exportar_json(self) -> None:
-        """Exporta los datos a un archivo JSON"""
+    def exportar_json(self, destino: Optional[Destino] = None) -> Optional[str]:
+        """Exporta los datos en JSON. Devuelve la ruta escrita (None si era un flujo)"""
         pass
 
     @abstractmethod
-    def exportar_csv(self) -> None:
-        """Exporta los datos a un archivo CSV"""
+    def exportar_csv(self, destino: Optional[Destino] = None) -> Optional[str]:
+        """Exporta los datos en CSV. Devuelve la ruta escrita (None si era un flujo)"""
+        pass
+
+    @abstractmethod
+    def exportar_jsonl(self, destino: Optional[Destino] = None) -> Optional[str]:
+        """Exporta los datos en JSON Lines. Devuelve la ruta escrita (None si era un flujo)"""
         pass
\ No newline at end of file
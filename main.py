@@ -1,21 +1,84 @@
-import tkinter as tk
-from vista.vista_tk import VistaPrincipal
-from controlador.controlador import Controlador
-from modelo.modelo_logica import ModeloLogica
+import os
+import sys
 
 if __name__ == "__main__":
     """
     Punto de entrada principal de la aplicacion
     Crea la raiz de tkinter y las tres partes de MVC
+    Si existe la variable de entorno TIENDA_DB los datos se guardan en esa
+    base de datos SQLite y se conservan entre ejecuciones
+    Si existe TIENDA_DIARIO los datos se guardan en un diario con instantaneas
+    dentro de ese directorio
+    Si existe TIENDA_METRICAS se miden el modelo y los manejadores del controlador
+    y las metricas se guardan en ese archivo (.json o texto de Prometheus) cada
+    minuto y al salir. TIENDA_LENTAS_MS anota en el log las operaciones mas lentas
+    Con `python main.py --perfil directorio` (o TIENDA_PERFIL) se perfilan los
+    manejadores (cProfile y tracemalloc) y el informe se escribe en ese directorio
+    al salir y al pulsar Ctrl+F12
+    Con argumentos (por ejemplo `python main.py importar articulos a.csv`) funciona
+    como la linea de comandos de cli.py, sin cargar tkinter
     """
+    argumentos = sys.argv[1:]
+    directorio_perfil = os.environ.get("TIENDA_PERFIL")
+    if argumentos[:1] == ["--perfil"]:
+        if len(argumentos) < 2:
+            sys.exit("uso: python main.py --perfil directorio")
+        directorio_perfil, argumentos = argumentos[1], argumentos[2:]
+    if argumentos:
+        from cli import main as main_cli
+        sys.exit(main_cli(argumentos))
+
+    # La interfaz grafica: se importa aqui para que la linea de comandos no la cargue
+    import tkinter as tk
+    from vista.vista_tk import VistaPrincipal
+    from controlador.controlador import Controlador
+    from modelo.modelo_concurrente import ModeloConcurrente
+    from modelo.almacen_sqlite import AlmacenSQLite
+    from modelo.modelo_diario import ModeloDiario
+    from modelo.metricas import Metricas
     
     # 1 Crear la ventana principal
     root = tk.Tk()
     
     # 2 Crear las instancias de M-V-C
-    modelo = ModeloLogica()
+    ruta_db = os.environ.get("TIENDA_DB")
+    directorio_diario = os.environ.get("TIENDA_DIARIO")
+    almacen = AlmacenSQLite(ruta_db) if ruta_db else None
+    # Los dos son seguros entre hilos: el controlador exporta e importa en segundo plano
+    if directorio_diario:
+        modelo = ModeloDiario(directorio_diario)
+    else:
+        modelo = ModeloConcurrente(almacen=almacen)
     vista = VistaPrincipal(root)
     controlador = Controlador(modelo, vista) # Conecta el modelo y la vista
+    ruta_metricas = os.environ.get("TIENDA_METRICAS")
+    metricas = None
+    if ruta_metricas:
+        lentas_ms = os.environ.get("TIENDA_LENTAS_MS")
+        metricas = Metricas(umbral_lento=float(lentas_ms) / 1000 if lentas_ms else None)
+        metricas.instrumentar(modelo, "modelo")
+        controlador.envolver_manejadores(lambda nombre, manejador: metricas.medir(f"controlador.{nombre}", manejador))
+        # Los manejadores capturan sus errores: se cuentan al mostrarlos
+        controlador.al_error = lambda nombre, error: metricas.registrar_error(f"controlador.{nombre}", error)
+        parar_metricas = metricas.guardar_periodicamente(ruta_metricas)
+    perfilador = None
+    if directorio_perfil:
+        from modelo.perfilado import Perfilador
+        perfilador = Perfilador()
+        controlador.envolver_manejadores(perfilador.envolver)
+        root.bind_all("<Control-F12>", lambda evento: perfilador.volcar(directorio_perfil))
     
     # 3 Iniciar el bucle de la aplicacion
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+
+    controlador.cerrar() # Espera a que termine la tarea en segundo plano que quede
+    if metricas is not None:
+        parar_metricas.set()
+        metricas.guardar(ruta_metricas)
+    if perfilador is not None:
+        print(f"perfil: {perfilador.volcar(directorio_perfil)}", file=sys.stderr)
+
+    if almacen is not None:
+        almacen.cerrar()
+    if isinstance(modelo, ModeloDiario):
+        modelo.cerrar()
\ No newline at end of file
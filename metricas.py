@@ -0,0 +1,217 @@
+import bisect
+import inspect
+import json
+import logging
+import reprlib
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .exportacion import escritura_atomica
+
+# Limites (en segundos) de las cubetas del histograma de duracion
+LIMITES_HISTOGRAMA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TIPO_PROMETHEUS = "text/plain; version=0.0.4"
+
+registro = logging.getLogger("tienda.metricas")
+
+# Argumentos de las operaciones lentas: cortos aunque sean listas de un millon de elementos
+_repr_corto = reprlib.Repr()
+_repr_corto.maxstring = 80
+_repr_corto.maxother = 80
+
+
+class EstadisticaOperacion:
+    """Llamadas, histograma de duracion y errores por clase de una operacion"""
+    __slots__ = ("llamadas", "suma", "maximo", "cubetas", "errores")
+
+    def __init__(self, cubetas: int):
+        self.llamadas = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+        self.cubetas = [0] * (cubetas + 1) # La ultima es +Inf
+        self.errores: Dict[str, int] = {}
+
+    def reiniciar(self) -> None:
+        self.llamadas = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+        self.cubetas = [0] * len(self.cubetas)
+        self.errores = {}
+
+
+class Metricas:
+    """
+    Registro de metricas de operaciones (metodos del modelo, manejadores del controlador...)
+    - numero de llamadas, histograma de duracion y errores por clase de excepcion
+    - las operaciones que tardan mas de `umbral_lento` segundos se anotan en el log
+      'tienda.metricas' con sus argumentos
+    - se exporta en formato de texto de Prometheus o como instantanea JSON
+    Solo se mide lo que se instrumenta: sin instrumentar no hay ningun coste
+    """
+    def __init__(self, umbral_lento: Optional[float] = None, limites: Tuple[float, ...] = LIMITES_HISTOGRAMA):
+        self.umbral_lento = umbral_lento
+        self.__limites = tuple(limites)
+        self.__operaciones: Dict[str, EstadisticaOperacion] = {}
+        self.__cerrojo = threading.Lock() # Se llama desde varios hilos (servidor, tareas)
+
+    def registrar(self, operacion: str, segundos: float, error: Optional[BaseException] = None,
+                  argumentos: Tuple[Any, ...] = (), opciones: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Anota una llamada a la operacion que ha durado `segundos` (y el error, si lo hubo)
+        Los argumentos solo se usan si la operacion es lenta
+        """
+        self.__anotar(self.__estadistica(operacion), operacion, segundos, error, argumentos, opciones)
+
+    def registrar_error(self, operacion: str, error: BaseException) -> None:
+        """
+        Anota un error que la operacion ha capturado ella misma (no cuenta otra llamada:
+        esa ya la anota medir). Lo usan los manejadores del controlador, que muestran sus errores
+        """
+        estadistica = self.__estadistica(operacion)
+        clase = type(error).__name__
+        with self.__cerrojo:
+            estadistica.errores[clase] = estadistica.errores.get(clase, 0) + 1
+
+    def __estadistica(self, operacion: str) -> EstadisticaOperacion:
+        with self.__cerrojo:
+            estadistica = self.__operaciones.get(operacion)
+            if estadistica is None:
+                estadistica = self.__operaciones[operacion] = EstadisticaOperacion(len(self.__limites))
+            return estadistica
+
+    def __anotar(self, estadistica: EstadisticaOperacion, operacion: str, segundos: float,
+                 error: Optional[BaseException], argumentos: Tuple[Any, ...], opciones: Optional[Dict[str, Any]]) -> None:
+        cubeta = bisect.bisect_left(self.__limites, segundos)
+        with self.__cerrojo:
+            estadistica.llamadas += 1
+            estadistica.suma += segundos
+            if segundos > estadistica.maximo:
+                estadistica.maximo = segundos
+            estadistica.cubetas[cubeta] += 1
+            if error is not None:
+                clase = type(error).__name__
+                estadistica.errores[clase] = estadistica.errores.get(clase, 0) + 1
+        if self.umbral_lento is not None and segundos >= self.umbral_lento:
+            texto = [_repr_corto.repr(a) for a in argumentos]
+            texto += [f"{k}={_repr_corto.repr(v)}" for k, v in (opciones or {}).items()]
+            registro.warning("operacion lenta: %s(%s) %.1f ms", operacion, ", ".join(texto), segundos * 1000)
+
+    def medir(self, operacion: str, funcion: Callable) -> Callable:
+        """Envuelve la funcion para que cada llamada se anote como `operacion`"""
+        reloj = time.perf_counter
+        anotar = self.__anotar
+        estadistica = self.__estadistica(operacion) # Se busca una vez, no en cada llamada
+
+        @wraps(funcion)
+        def medida(*args, **kwargs):
+            inicio = reloj()
+            try:
+                resultado = funcion(*args, **kwargs)
+            except BaseException as e:
+                anotar(estadistica, operacion, reloj() - inicio, e, args, kwargs)
+                raise
+            anotar(estadistica, operacion, reloj() - inicio, None, args, kwargs)
+            return resultado
+        return medida
+
+    def instrumentar(self, objeto: Any, prefijo: str, nombres: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Sustituye en el objeto (no en su clase) sus metodos publicos por versiones medidas,
+        con el nombre '<prefijo>.<metodo>'. Devuelve los nombres instrumentados
+        No se miden los generadores ni los context managers (lote, factura_bloqueada...):
+        la llamada solo crea el objeto y el trabajo se hace despues
+        """
+        if nombres is None:
+            nombres = [n for n in dir(type(objeto)) if not n.startswith("_")]
+        instrumentados = []
+        for nombre in nombres:
+            atributo = inspect.getattr_static(objeto, nombre, None)
+            if not inspect.isfunction(atributo) or inspect.isgeneratorfunction(inspect.unwrap(atributo)):
+                continue # Propiedades, atributos, estaticos y generadores
+            setattr(objeto, nombre, self.medir(f"{prefijo}.{nombre}", getattr(objeto, nombre)))
+            instrumentados.append(nombre)
+        return instrumentados
+
+    @staticmethod
+    def desinstrumentar(objeto: Any, nombres: Iterable[str]) -> None:
+        """Vuelve a los metodos originales de la clase"""
+        for nombre in nombres:
+            objeto.__dict__.pop(nombre, None)
+
+    def reiniciar(self) -> None:
+        """Pone a cero las metricas (las operaciones medidas siguen registradas)"""
+        with self.__cerrojo:
+            for estadistica in self.__operaciones.values():
+                estadistica.reiniciar()
+
+    def instantanea(self) -> Dict[str, Any]:
+        """Copia de todas las metricas en un diccionario (se puede pasar a JSON)"""
+        with self.__cerrojo:
+            operaciones = {
+                nombre: {
+                    "llamadas": e.llamadas,
+                    "segundos": e.suma,
+                    "maximo": e.maximo,
+                    "cubetas": dict(zip([*map(str, self.__limites), "+Inf"], e.cubetas)),
+                    "errores": dict(e.errores),
+                }
+                for nombre, e in sorted(self.__operaciones.items())
+            }
+        return {"fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "operaciones": operaciones}
+
+    def prometheus(self) -> str:
+        """Metricas en el formato de texto de Prometheus (histograma con cubetas acumuladas)"""
+        datos = self.instantanea()["operaciones"]
+        lineas = [
+            "# HELP tienda_operaciones_total Llamadas a cada operacion",
+            "# TYPE tienda_operaciones_total counter",
+        ]
+        lineas += [f'tienda_operaciones_total{{operacion="{_etiqueta(n)}"}} {d["llamadas"]}' for n, d in datos.items()]
+        lineas += [
+            "# HELP tienda_errores_total Excepciones de cada operacion por clase",
+            "# TYPE tienda_errores_total counter",
+        ]
+        for nombre, d in datos.items():
+            for clase, cuantos in sorted(d["errores"].items()):
+                lineas.append(f'tienda_errores_total{{operacion="{_etiqueta(nombre)}",error="{_etiqueta(clase)}"}} {cuantos}')
+        lineas += [
+            "# HELP tienda_duracion_segundos Duracion de cada operacion",
+            "# TYPE tienda_duracion_segundos histogram",
+        ]
+        for nombre, d in datos.items():
+            etiqueta = _etiqueta(nombre)
+            acumulado = 0
+            for limite, cuantos in d["cubetas"].items():
+                acumulado += cuantos
+                lineas.append(f'tienda_duracion_segundos_bucket{{operacion="{etiqueta}",le="{limite}"}} {acumulado}')
+            lineas.append(f'tienda_duracion_segundos_sum{{operacion="{etiqueta}"}} {d["segundos"]!r}')
+            lineas.append(f'tienda_duracion_segundos_count{{operacion="{etiqueta}"}} {d["llamadas"]}')
+        return "\n".join(lineas) + "\n"
+
+    def guardar(self, ruta: str) -> None:
+        """Escribe las metricas en `ruta`: JSON si acaba en .json, si no texto de Prometheus"""
+        with escritura_atomica(ruta) as f:
+            if ruta.lower().endswith(".json"):
+                json.dump(self.instantanea(), f, indent=2)
+            else:
+                f.write(self.prometheus())
+
+    def guardar_periodicamente(self, ruta: str, segundos: float = 60.0) -> threading.Event:
+        """
+        Guarda las metricas cada `segundos` en un hilo aparte (para el recolector de
+        archivos de texto de Prometheus). Devuelve el Event que lo detiene
+        """
+        parar = threading.Event()
+
+        def volcar() -> None:
+            while not parar.wait(segundos):
+                self.guardar(ruta)
+
+        threading.Thread(target=volcar, name="tienda-metricas", daemon=True).start()
+        return parar
+
+
+def _etiqueta(valor: str) -> str:
+    """Escapa el valor de una etiqueta de Prometheus"""
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
\ No newline at end of file
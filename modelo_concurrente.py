@@ -0,0 +1,392 @@
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from weakref import WeakValueDictionary
+from .modelo_logica import ModeloLogica
+from .persona import Cliente
+from .articulo import ArticuloBase, ArticuloFisico, ArticuloDigital
+from .factura import Factura, LineaFactura
+from .catalogo_columnar import CatalogoColumnar
+from .exportacion import Destino
+
+if TYPE_CHECKING:
+    from .almacen_sqlite import AlmacenSQLite
+    from .catalogo_mmap import CatalogoMmap
+
+
+class CerrojoLecturaEscritura:
+    """
+    Muchos lectores a la vez o un solo escritor
+    - un escritor esperando frena a los lectores nuevos, asi no espera para siempre
+    - el hilo que escribe puede volver a tomarlo (para leer o escribir) sin bloquearse
+    Un lector no debe volver a pedir lectura: si hay un escritor esperando se bloquearia
+    Uso: `with cerrojo.lectura:` / `with cerrojo.escritura:`
+    """
+    def __init__(self):
+        # El estado se protege con el Lock directamente (mas rapido que entrar en la Condition);
+        # la Condition, sobre el mismo Lock, solo se usa para esperar y despertar
+        self.__cerrojo = threading.Lock()
+        self.__condicion = threading.Condition(self.__cerrojo)
+        self.__en_espera = 0 # Hilos bloqueados en wait()
+        self.__lectores = 0
+        self.__escritor: Optional[int] = None # ident del hilo que escribe
+        self.__profundidad = 0 # Veces que el escritor lo ha tomado
+        self.__escritores_esperando = 0
+        # Objetos 'with' reutilizables: mas baratos que un @contextmanager en cada lectura
+        self.lectura = _Tramo(self.adquirir_lectura, self.soltar_lectura)
+        self.escritura = _Tramo(self.adquirir_escritura, self.soltar_escritura)
+
+    def __esperar(self) -> None:
+        self.__en_espera += 1
+        self.__condicion.wait()
+        self.__en_espera -= 1
+
+    def __despertar(self) -> None:
+        if self.__en_espera:
+            self.__condicion.notify_all()
+
+    def adquirir_lectura(self) -> None:
+        with self.__cerrojo:
+            if self.__escritor is not None and self.__escritor == threading.get_ident():
+                self.__profundidad += 1 # El escritor tambien puede leer
+                return
+            while self.__escritor is not None or self.__escritores_esperando:
+                self.__esperar()
+            self.__lectores += 1
+
+    def soltar_lectura(self) -> None:
+        with self.__cerrojo:
+            if self.__escritor is not None and self.__escritor == threading.get_ident():
+                self.__profundidad -= 1
+                return
+            self.__lectores -= 1
+            if self.__lectores == 0:
+                self.__despertar()
+
+    def adquirir_escritura(self) -> None:
+        yo = threading.get_ident()
+        with self.__cerrojo:
+            if self.__escritor != yo:
+                self.__escritores_esperando += 1
+                while self.__escritor is not None or self.__lectores:
+                    self.__esperar()
+                self.__escritores_esperando -= 1
+                self.__escritor = yo
+            self.__profundidad += 1
+
+    def soltar_escritura(self) -> None:
+        with self.__cerrojo:
+            self.__profundidad -= 1
+            if self.__profundidad == 0:
+                self.__escritor = None
+                self.__despertar()
+
+
+class _Tramo:
+    """Context manager que llama a adquirir al entrar y a soltar al salir"""
+    __slots__ = ("__adquirir", "__soltar")
+
+    def __init__(self, adquirir: Callable[[], None], soltar: Callable[[], None]):
+        self.__adquirir = adquirir
+        self.__soltar = soltar
+
+    def __enter__(self) -> None:
+        self.__adquirir()
+
+    def __exit__(self, *error) -> None:
+        self.__soltar()
+
+
+class ModeloConcurrente(ModeloLogica):
+    """
+    ModeloLogica que se puede usar desde varios hilos a la vez (varias cajas, la vista
+    y el hilo de exportacion...)
+    - clientes y articulos: cerrojo de lectura/escritura; las busquedas, que son lo
+      mas frecuente, no se bloquean entre si
+    - cada factura tiene su cerrojo: dos cajas que cobran a la vez no se esperan
+    - historial y facturas abiertas: un cerrojo corto (ids, altas y cierres)
+    - con almacen: un cerrojo para la conexion SQLite mientras dura un lote o se
+      escriben lineas, para que no se mezclen transacciones
+    Los cerrojos se toman siempre en este orden: factura, almacen, historial, datos
+    """
+    def __init__(self, catalogo: Optional[Union[CatalogoColumnar, "CatalogoMmap"]] = None,
+                 almacen: Optional["AlmacenSQLite"] = None):
+        super().__init__(catalogo, almacen)
+        self.__datos = CerrojoLecturaEscritura()
+        self.__historial = threading.Lock()
+        self.__almacen = threading.RLock() if almacen is not None else None
+        # Solo existen los cerrojos que algun hilo esta usando: el de una factura cerrada (o
+        # de un id que no existe) desaparece al soltarlo y el diccionario no crece sin limite
+        self.__facturas: "WeakValueDictionary[int, threading.Lock]" = WeakValueDictionary()
+        self.__facturas_cerrojo = threading.Lock() # Protege el diccionario __facturas
+        self.__busqueda_preparada = False # Ya existe el indice de denominaciones
+
+    def __cerrojo_factura(self, id_factura: int) -> threading.Lock:
+        """El cerrojo de la factura; quien lo pide debe guardar la referencia mientras lo usa"""
+        with self.__facturas_cerrojo:
+            cerrojo = self.__facturas.get(id_factura)
+            if cerrojo is None:
+                cerrojo = self.__facturas[id_factura] = threading.Lock()
+            return cerrojo
+
+    def __con_almacen(self) -> ContextManager:
+        return self.__almacen if self.__almacen is not None else nullcontext()
+
+    def __id_o_actual(self, id_factura: Optional[int]) -> Optional[int]:
+        """Fija la factura sobre la que se va a trabajar aunque otro hilo cambie la actual"""
+        if id_factura is not None:
+            return id_factura
+        actual = self.factura_actual
+        return actual.id if actual is not None else None
+
+    @contextmanager
+    def __factura(self, id_factura: Optional[int]) -> Iterator[Optional[int]]:
+        """Toma el cerrojo de una factura (por defecto la actual) y da su id"""
+        id_factura = self.__id_o_actual(id_factura)
+        if id_factura is None:
+            yield None
+            return
+        with self.__cerrojo_factura(id_factura):
+            yield id_factura
+
+    # Propiedades
+
+    @property
+    def clientes(self) -> List[Cliente]:
+        with self.__datos.lectura:
+            return super().clientes
+
+    @property
+    def articulos(self) -> List[ArticuloBase]:
+        with self.__datos.lectura:
+            return super().articulos
+
+    @property
+    def numero_clientes(self) -> int:
+        with self.__datos.lectura:
+            return super().numero_clientes
+
+    @property
+    def numero_articulos(self) -> int:
+        with self.__datos.lectura:
+            return super().numero_articulos
+
+    def pagina_clientes(self, inicio: int, cantidad: int) -> List[Cliente]:
+        with self.__datos.lectura:
+            return super().pagina_clientes(inicio, cantidad)
+
+    def pagina_articulos(self, inicio: int, cantidad: int) -> List[ArticuloBase]:
+        with self.__datos.lectura:
+            return super().pagina_articulos(inicio, cantidad)
+
+    @property
+    def facturas_abiertas(self) -> List[Factura]:
+        with self.__historial:
+            return super().facturas_abiertas
+
+    @contextmanager
+    def lote(self) -> Iterator[None]:
+        """Con almacen el lote es una transaccion: nadie mas escribe mientras dura"""
+        if self.__almacen is None:
+            with super().lote():
+                yield
+        else:
+            with self.__almacen, self.__datos.escritura, super().lote():
+                yield
+
+    def resincronizar(self) -> None:
+        # Se llama desde lote(), que ya tiene el almacen y los datos: ningun hilo que tenga el
+        # cerrojo del historial espera por los datos sin haber tomado antes el del almacen
+        with self.__historial:
+            super().resincronizar()
+
+    # Clientes y articulos: lecturas
+
+    def buscar_cliente(self, dni: str) -> Cliente:
+        with self.__datos.lectura:
+            return super().buscar_cliente(dni)
+
+    def sugerir_clientes(self, prefijo: str, limite: int = 20) -> List[str]:
+        with self.__datos.lectura:
+            return super().sugerir_clientes(prefijo, limite)
+
+    def buscar_articulo(self, codigo: str) -> ArticuloBase:
+        with self.__datos.lectura:
+            return super().buscar_articulo(codigo)
+
+    def sugerir_articulos(self, prefijo: str, limite: int = 20) -> List[str]:
+        with self.__datos.lectura:
+            return super().sugerir_articulos(prefijo, limite)
+
+    def buscar_articulos(self, texto: str, limite: int = 20) -> List[ArticuloBase]:
+        if not self.__busqueda_preparada:
+            self.preparar_busqueda()
+        with self.__datos.lectura:
+            return super().buscar_articulos(texto, limite)
+
+    def preparar_busqueda(self) -> None:
+        # El indice se crea con el cerrojo de escritura: una busqueda (con el de lectura) nunca lo cambia
+        with self.__datos.escritura:
+            super().preparar_busqueda()
+            self.__busqueda_preparada = True
+
+    def precios_con_descuento(self) -> Dict[str, float]:
+        with self.__datos.lectura:
+            return super().precios_con_descuento()
+
+    def guardar_catalogo(self, ruta: str) -> int:
+        with self.__datos.lectura:
+            return super().guardar_catalogo(ruta)
+
+    # Clientes y articulos: escrituras
+
+    def registrar_cliente(self, nombre: str, apellidos: str, dni: str) -> Cliente:
+        with self.__datos.escritura:
+            return super().registrar_cliente(nombre, apellidos, dni)
+
+    def eliminar_cliente(self, dni: str) -> None:
+        with self.__datos.escritura:
+            super().eliminar_cliente(dni)
+
+    def registrar_articulo_fisico(self, codigo: str, denominacion: str, precio: float, peso: float) -> ArticuloFisico:
+        with self.__datos.escritura:
+            return super().registrar_articulo_fisico(codigo, denominacion, precio, peso)
+
+    def registrar_articulo_digital(self, codigo: str, denominacion: str, precio: float, licencia: str) -> ArticuloDigital:
+        with self.__datos.escritura:
+            return super().registrar_articulo_digital(codigo, denominacion, precio, licencia)
+
+    def eliminar_articulo(self, codigo: str) -> None:
+        with self.__datos.escritura:
+            super().eliminar_articulo(codigo)
+
+    def ajustar_precios(self, factor: float = 1.0, incremento: float = 0.0, tipo: Optional[str] = None) -> int:
+        with self.__datos.escritura:
+            return super().ajustar_precios(factor, incremento, tipo)
+
+    # Facturas
+
+    def crear_nueva_factura(self, dni_cliente: str, fecha: Optional[datetime] = None) -> Factura:
+        with self.__con_almacen(), self.__historial:
+            return super().crear_nueva_factura(dni_cliente, fecha)
+
+    def agregar_factura_al_historial(self, factura: Factura, abierta: bool = False) -> Factura:
+        with self.__con_almacen(), self.__historial:
+            return super().agregar_factura_al_historial(factura, abierta)
+
+    def reservar_ids_factura(self, cantidad: int) -> List[int]:
+        with self.__historial:
+            return super().reservar_ids_factura(cantidad)
+
+    def seleccionar_factura(self, id_factura: int) -> Factura:
+        with self.__con_almacen(), self.__historial: # Con almacen se guarda cual es la actual
+            return super().seleccionar_factura(id_factura)
+
+    def cerrar_factura(self, id_factura: Optional[int] = None) -> Optional[Factura]:
+        # Con el cerrojo de la factura: no se cierra mientras otro hilo le añade una linea
+        with self.__factura(id_factura) as id_fijado:
+            if id_fijado is None:
+                return None
+            with self.__con_almacen(), self.__historial:
+                return super().cerrar_factura(id_fijado)
+
+    def agregar_linea_factura(self, codigo_articulo: str, cantidad: int, id_factura: Optional[int] = None,
+                              precio_unitario: Optional[float] = None) -> Optional[LineaFactura]:
+        with self.__factura(id_factura) as id_fijado:
+            if id_fijado is None:
+                return None
+            with self.__con_almacen():
+                return super().agregar_linea_factura(codigo_articulo, cantidad, id_fijado, precio_unitario)
+
+    def agregar_lineas_factura(self, lineas: Iterable[Tuple[str, int]],
+                               id_factura: Optional[int] = None) -> List[LineaFactura]:
+        with self.__factura(id_factura) as id_fijado:
+            if id_fijado is None:
+                return []
+            with self.__con_almacen():
+                return super().agregar_lineas_factura(lineas, id_fijado)
+
+    def ajustar_linea_factura(self, codigo_articulo: str, cantidad: int, id_factura: Optional[int] = None,
+                              precio_unitario: Optional[float] = None) -> Optional[LineaFactura]:
+        with self.__factura(id_factura) as id_fijado:
+            if id_fijado is None:
+                return None
+            with self.__con_almacen():
+                return super().ajustar_linea_factura(codigo_articulo, cantidad, id_fijado, precio_unitario)
+
+    def eliminar_linea_factura(self, codigo_articulo: str, id_factura: Optional[int] = None) -> None:
+        with self.__factura(id_factura) as id_fijado:
+            if id_fijado is not None:
+                with self.__con_almacen():
+                    super().eliminar_linea_factura(codigo_articulo, id_fijado)
+
+    @contextmanager
+    def factura_bloqueada(self, id_factura: Optional[int] = None) -> Iterator[Optional[Factura]]:
+        """La factura (por defecto la actual) con su cerrojo tomado mientras se usa"""
+        with self.__factura(id_factura) as id_fijado:
+            yield self.buscar_factura(id_fijado) if id_fijado is not None else None
+
+    # Historial
+
+    def recorrer_facturas(self) -> Iterator[Factura]:
+        """Recorre una copia del historial: otros hilos pueden seguir abriendo facturas"""
+        with self.__historial:
+            return iter(list(super().recorrer_facturas()))
+
+    def buscar_factura(self, id_factura: int) -> Factura:
+        with self.__historial:
+            return super().buscar_factura(id_factura)
+
+    def facturas_de_cliente(self, dni: str) -> List[Factura]:
+        with self.__historial:
+            return super().facturas_de_cliente(dni)
+
+    def facturas_entre(self, desde: datetime, hasta: datetime) -> List[Factura]:
+        with self.__historial:
+            return super().facturas_entre(desde, hasta)
+
+    # Informes de ventas: los agregados cambian al cerrar facturas, bajo el cerrojo del historial
+    # (con almacen, la primera consulta los calcula leyendo la base de datos)
+
+    def ventas_por_dia(self, desde: Optional[date] = None, hasta: Optional[date] = None) -> List[Tuple[date, int, int, float]]:
+        with self.__con_almacen(), self.__historial:
+            return super().ventas_por_dia(desde, hasta)
+
+    def ventas_articulo(self, codigo: str) -> Tuple[int, int, float]:
+        with self.__con_almacen(), self.__historial:
+            return super().ventas_articulo(codigo)
+
+    def ventas_cliente(self, dni: str) -> Tuple[int, int, float]:
+        with self.__con_almacen(), self.__historial:
+            return super().ventas_cliente(dni)
+
+    def articulos_mas_vendidos(self, limite: int = 10) -> List[Tuple[str, int, int, float]]:
+        with self.__con_almacen(), self.__historial:
+            return super().articulos_mas_vendidos(limite)
+
+    def mejores_clientes(self, limite: int = 10) -> List[Tuple[str, int, int, float]]:
+        with self.__con_almacen(), self.__historial:
+            return super().mejores_clientes(limite)
+
+    def reconstruir_ventas(self) -> List[str]:
+        with self.__con_almacen(), self.__historial:
+            return super().reconstruir_ventas()
+
+    def exportar_facturas(self, destino: Destino, formato: str = "jsonl",
+                          facturas: Optional[Iterable[Factura]] = None) -> int:
+        """Cada factura se escribe con su cerrojo tomado, asi ninguna sale a medio cambiar"""
+        if facturas is None:
+            facturas = self.recorrer_facturas()
+        return super().exportar_facturas(destino, formato, self.__bloqueadas(facturas))
+
+    def archivar_facturas(self, ruta: str, facturas: Optional[Iterable[Factura]] = None) -> int:
+        if facturas is None:
+            facturas = self.recorrer_facturas()
+        return super().archivar_facturas(ruta, self.__bloqueadas(facturas))
+
+    def __bloqueadas(self, facturas: Iterable[Factura]) -> Iterator[Factura]:
+        # El cerrojo sigue tomado mientras quien consume el generador escribe la factura
+        for factura in facturas:
+            with self.__cerrojo_factura(factura.id):
+                yield factura
\ No newline at end of file
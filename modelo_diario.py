@@ -0,0 +1,339 @@
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from .modelo_logica import ModeloLogica
+from .modelo_concurrente import ModeloConcurrente
+from .exportacion import escritura_atomica
+from .articulo import ArticuloBase, ArticuloFisico, ArticuloDigital
+from .factura import Factura, LineaFactura
+from .excepciones import ArticuloNoEncontradoError
+from .persona import Cliente
+
+NOMBRE_DIARIO = "diario.log"
+NOMBRE_INSTANTANEA = "instantanea.json"
+
+
+class ModeloDiario(ModeloConcurrente):
+    """
+    ModeloLogica con durabilidad en archivos: cada operacion que cambia datos
+    se añade a un diario (log) y cada cierto numero de operaciones se escribe
+    una instantanea completa y se vacia el diario
+    Se puede usar desde varios hilos (los cerrojos de ModeloConcurrente): ademas, cada
+    operacion que cambia datos se aplica y se registra con el cerrojo del diario tomado,
+    asi el diario las guarda en el mismo orden en que se aplicaron
+    Al arrancar se carga la ultima instantanea y solo se repite la cola del diario,
+    asi el tiempo de arranque no crece con el tiempo que lleve funcionando
+    Cada registro del diario lleva un CRC32: si el ultimo quedo a medias por un
+    corte, se detecta y se recorta en lugar de fallar
+    """
+    def __init__(self, directorio: str, registros_por_sync: int = 100, segundos_por_sync: float = 1.0,
+                 operaciones_por_instantanea: int = 10000):
+        super().__init__()
+        os.makedirs(directorio, exist_ok=True)
+        self.__directorio = directorio
+        self.__ruta_diario = os.path.join(directorio, NOMBRE_DIARIO)
+        self.__ruta_instantanea = os.path.join(directorio, NOMBRE_INSTANTANEA)
+        self.__registros_por_sync = registros_por_sync
+        self.__segundos_por_sync = segundos_por_sync
+        self.__operaciones_por_instantanea = operaciones_por_instantanea
+        self.__secuencia = 0
+        self.__pendientes = 0 # Registros escritos aun sin fsync
+        self.__desde_instantanea = 0
+        self.__ultimo_sync = time.monotonic()
+        self.__profundidad_lote = 0
+        self.__cerrojo = threading.RLock() # Se toma antes que los de ModeloConcurrente
+        self.__recuperar()
+        self.__diario = open(self.__ruta_diario, "ab")
+
+    # Arranque
+
+    def __recuperar(self) -> None:
+        """Carga la instantanea y repite los registros del diario posteriores a ella"""
+        if os.path.exists(self.__ruta_instantanea):
+            with open(self.__ruta_instantanea, "r", encoding="utf-8") as f:
+                self.__cargar_instantanea(json.load(f))
+        if not os.path.exists(self.__ruta_diario):
+            return
+        registros, tamano_valido = self.__leer_diario()
+        if tamano_valido < os.path.getsize(self.__ruta_diario):
+            # Cola corrupta (escritura interrumpida): se descarta
+            with open(self.__ruta_diario, "r+b") as f:
+                f.truncate(tamano_valido)
+        for secuencia, operacion, argumentos in registros:
+            if secuencia > self.__secuencia:
+                self.__aplicar(operacion, argumentos)
+                self.__secuencia = secuencia
+                self.__desde_instantanea += 1
+
+    def __aplicar(self, operacion: str, argumentos: list) -> None:
+        """
+        Repite una operacion del diario con los metodos de ModeloLogica (sin volver a registrarla)
+        Solo se usa al arrancar, antes de que otros hilos vean el modelo
+        """
+        if operacion == "crear_nueva_factura":
+            dni, fecha = argumentos
+            ModeloLogica.crear_nueva_factura(self, dni, datetime.fromisoformat(fecha))
+        elif operacion == "agregar_factura_al_historial":
+            datos, abierta = argumentos
+            ModeloLogica.agregar_factura_al_historial(self, self.__crear_factura(datos), abierta)
+        elif operacion == "eliminar_linea_factura" and isinstance(argumentos[0], int):
+            # Diarios anteriores a agrupar las lineas por articulo: se borraba por posicion
+            indice, id_factura = argumentos
+            factura = self.buscar_factura(id_factura) if id_factura is not None else self.factura_actual
+            lineas = list(factura.lineas) if factura else []
+            if 0 <= indice < len(lineas):
+                ModeloLogica.eliminar_linea_factura(self, lineas[indice].articulo.codigo, id_factura)
+        else:
+            getattr(ModeloLogica, operacion)(self, *argumentos)
+
+    def __leer_diario(self) -> Tuple[List[Tuple[int, str, list]], int]:
+        """Devuelve los registros validos del diario y el tamaño en bytes que ocupan"""
+        registros = []
+        tamano_valido = 0
+        with open(self.__ruta_diario, "rb") as f:
+            for linea in f:
+                try:
+                    crc, datos = linea.rstrip(b"\n").split(b" ", 1)
+                    if not linea.endswith(b"\n") or int(crc, 16) != zlib.crc32(datos):
+                        break
+                    registro = json.loads(datos)
+                except ValueError:
+                    break
+                registros.append((registro["n"], registro["op"], registro["args"]))
+                tamano_valido += len(linea)
+        return registros, tamano_valido
+
+    def __cargar_instantanea(self, datos: dict) -> None:
+        self.__secuencia = datos["secuencia"]
+        for nombre, apellidos, dni in datos["clientes"]:
+            ModeloLogica.registrar_cliente(self, nombre, apellidos, dni)
+        for tipo, codigo, denominacion, precio, extra in datos["articulos"]:
+            if tipo == "fisico":
+                ModeloLogica.registrar_articulo_fisico(self, codigo, denominacion, precio, extra)
+            else:
+                ModeloLogica.registrar_articulo_digital(self, codigo, denominacion, precio, extra)
+        for datos_factura in datos["facturas"]:
+            factura = self.__crear_factura(datos_factura)
+            ModeloLogica.agregar_factura_al_historial(self, factura, datos_factura["abierta"])
+        ModeloLogica.reservar_ids_factura(self, datos.get("ultimo_id", 0) - self.ultimo_id_factura)
+        if datos["actual"] is not None:
+            ModeloLogica.seleccionar_factura(self, datos["actual"])
+
+    def __crear_factura(self, datos: dict) -> Factura:
+        """Reconstruye una factura guardada con __datos_factura"""
+        factura = Factura(Cliente(*datos["cliente"]), datos["id"], datetime.fromisoformat(datos["fecha"]))
+        for codigo, denominacion, cantidad, precio_unitario in datos["lineas"]:
+            try:
+                articulo = self.buscar_articulo(codigo)
+            except ArticuloNoEncontradoError:
+                # El articulo ya no esta en el catalogo: se conserva lo facturado
+                articulo = ArticuloFisico(codigo, denominacion, precio_unitario, 0.0)
+            factura.agregar_linea(articulo, cantidad, precio_unitario)
+        return factura
+
+    @staticmethod
+    def __datos_factura(factura: Factura, abierta: bool) -> dict:
+        cliente = factura.cliente
+        return {
+            "id": factura.id,
+            "fecha": factura.fecha.isoformat(),
+            "cliente": [cliente.nombre, cliente.apellidos, cliente.dni],
+            "lineas": [[l.articulo.codigo, l.articulo.denominacion, l.cantidad, l.precio_unitario] for l in factura.lineas],
+            "abierta": abierta,
+        }
+
+    # Escritura
+
+    def __registrar(self, operacion: str, *argumentos: Any) -> None:
+        """Añade una operacion ya aplicada al diario"""
+        self.__secuencia += 1
+        datos = json.dumps({"n": self.__secuencia, "op": operacion, "args": argumentos}).encode("utf-8")
+        self.__diario.write(b"%08x %s\n" % (zlib.crc32(datos), datos))
+        self.__pendientes += 1
+        self.__desde_instantanea += 1
+        if self.__profundidad_lote == 0:
+            if (self.__pendientes >= self.__registros_por_sync
+                    or time.monotonic() - self.__ultimo_sync >= self.__segundos_por_sync):
+                self.sincronizar()
+            if self.__desde_instantanea >= self.__operaciones_por_instantanea:
+                self.compactar()
+
+    def sincronizar(self) -> None:
+        """Fuerza a disco (fsync) los registros pendientes del diario"""
+        with self.__cerrojo:
+            self.__diario.flush()
+            os.fsync(self.__diario.fileno())
+            self.__pendientes = 0
+            self.__ultimo_sync = time.monotonic()
+
+    def compactar(self) -> None:
+        """Escribe una instantanea completa del estado y vacia el diario"""
+        with self.__cerrojo: # Nadie cambia datos mientras se escribe la instantanea
+            self.sincronizar()
+            abiertas = {f.id for f in self.facturas_abiertas}
+            actual = self.factura_actual
+            datos = {
+                "secuencia": self.__secuencia,
+                "clientes": [[c.nombre, c.apellidos, c.dni] for c in self.clientes],
+                "articulos": [self.__fila_articulo(a) for a in self.articulos],
+                "facturas": [self.__datos_factura(f, f.id in abiertas) for f in self.recorrer_facturas()],
+                "actual": actual.id if actual is not None else None,
+                "ultimo_id": self.ultimo_id_factura, # Puede haber ids reservados sin factura
+            }
+            with escritura_atomica(self.__ruta_instantanea) as f: # Temporal + fsync + rename
+                json.dump(datos, f)
+            self.__sincronizar_directorio()
+            # Si se corta aqui, los registros del diario ya estan en la instantanea y se ignoran
+            self.__diario.truncate(0)
+            os.fsync(self.__diario.fileno())
+            self.__desde_instantanea = 0
+
+    def __sincronizar_directorio(self) -> None:
+        """Hace duradero el rename de la instantanea (no disponible en Windows)"""
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.__directorio, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    @staticmethod
+    def __fila_articulo(articulo: ArticuloBase) -> list:
+        if isinstance(articulo, ArticuloFisico):
+            return ["fisico", articulo.codigo, articulo.denominacion, articulo.precio, articulo.peso]
+        return ["digital", articulo.codigo, articulo.denominacion, articulo.precio, articulo.licencia]
+
+    def cerrar(self) -> None:
+        """Sincroniza y cierra el diario"""
+        with self.__cerrojo:
+            self.sincronizar()
+            self.__diario.close()
+
+    @contextmanager
+    def lote(self) -> Iterator[None]:
+        """
+        Agrupa operaciones: un solo fsync (y como mucho una instantanea) al terminar
+        Las operaciones de otros hilos mientras dura el lote tambien esperan a ese fsync
+        """
+        with self.__cerrojo:
+            self.__profundidad_lote += 1
+        try:
+            with super().lote():
+                yield
+        finally:
+            with self.__cerrojo:
+                self.__profundidad_lote -= 1
+                if self.__profundidad_lote == 0:
+                    self.sincronizar()
+                    if self.__desde_instantanea >= self.__operaciones_por_instantanea:
+                        self.compactar()
+
+    # Operaciones que cambian datos: se aplican y despues se registran,
+    # con el cerrojo del diario tomado
+
+    def registrar_cliente(self, nombre: str, apellidos: str, dni: str) -> Cliente:
+        with self.__cerrojo:
+            cliente = super().registrar_cliente(nombre, apellidos, dni)
+            self.__registrar("registrar_cliente", nombre, apellidos, dni)
+            return cliente
+
+    def eliminar_cliente(self, dni: str) -> None:
+        with self.__cerrojo:
+            super().eliminar_cliente(dni)
+            self.__registrar("eliminar_cliente", dni)
+
+    def registrar_articulo_fisico(self, codigo: str, denominacion: str, precio: float, peso: float) -> ArticuloFisico:
+        with self.__cerrojo:
+            articulo = super().registrar_articulo_fisico(codigo, denominacion, precio, peso)
+            self.__registrar("registrar_articulo_fisico", codigo, denominacion, precio, peso)
+            return articulo
+
+    def registrar_articulo_digital(self, codigo: str, denominacion: str, precio: float, licencia: str) -> ArticuloDigital:
+        with self.__cerrojo:
+            articulo = super().registrar_articulo_digital(codigo, denominacion, precio, licencia)
+            self.__registrar("registrar_articulo_digital", codigo, denominacion, precio, licencia)
+            return articulo
+
+    def eliminar_articulo(self, codigo: str) -> None:
+        with self.__cerrojo:
+            super().eliminar_articulo(codigo)
+            self.__registrar("eliminar_articulo", codigo)
+
+    def ajustar_precios(self, factor: float = 1.0, incremento: float = 0.0, tipo: Optional[str] = None) -> int:
+        with self.__cerrojo:
+            modificados = super().ajustar_precios(factor, incremento, tipo)
+            self.__registrar("ajustar_precios", factor, incremento, tipo)
+            return modificados
+
+    def crear_nueva_factura(self, dni_cliente: str, fecha: Optional[datetime] = None) -> Factura:
+        with self.__cerrojo:
+            factura = super().crear_nueva_factura(dni_cliente, fecha)
+            self.__registrar("crear_nueva_factura", dni_cliente, factura.fecha.isoformat())
+            return factura
+
+    def agregar_factura_al_historial(self, factura: Factura, abierta: bool = False) -> Factura:
+        with self.__cerrojo:
+            super().agregar_factura_al_historial(factura, abierta)
+            self.__registrar("agregar_factura_al_historial", self.__datos_factura(factura, abierta), abierta)
+            return factura
+
+    def reservar_ids_factura(self, cantidad: int) -> List[int]:
+        with self.__cerrojo:
+            ids = super().reservar_ids_factura(cantidad)
+            # Al repetir el diario los ids de crear_nueva_factura tienen que salir iguales
+            self.__registrar("reservar_ids_factura", cantidad)
+            return ids
+
+    def seleccionar_factura(self, id_factura: int) -> Factura:
+        with self.__cerrojo:
+            factura = super().seleccionar_factura(id_factura)
+            self.__registrar("seleccionar_factura", id_factura)
+            return factura
+
+    def cerrar_factura(self, id_factura: Optional[int] = None) -> Optional[Factura]:
+        with self.__cerrojo:
+            factura = super().cerrar_factura(id_factura)
+            if factura is not None:
+                self.__registrar("cerrar_factura", factura.id)
+            return factura
+
+    def agregar_linea_factura(self, codigo_articulo: str, cantidad: int, id_factura: Optional[int] = None,
+                              precio_unitario: Optional[float] = None) -> Optional[LineaFactura]:
+        with self.__cerrojo:
+            linea = super().agregar_linea_factura(codigo_articulo, cantidad, id_factura, precio_unitario)
+            if linea is not None:
+                # Se guarda el precio cobrado: al repetir el diario las reglas de precios pueden ser otras
+                self.__registrar("agregar_linea_factura", codigo_articulo, cantidad, id_factura, linea.precio_unitario)
+            return linea
+
+    def agregar_lineas_factura(self, lineas: Iterable[Tuple[str, int]],
+                               id_factura: Optional[int] = None) -> List[LineaFactura]:
+        with self.__cerrojo:
+            pares = list(lineas)
+            with self.lote(): # Un registro por articulo, con un solo fsync
+                nuevas = super().agregar_lineas_factura(pares, id_factura)
+                sumas: Dict[str, int] = {} # Se registran las unidades añadidas, no las que tiene la linea
+                for codigo, cantidad in pares:
+                    sumas[codigo] = sumas.get(codigo, 0) + cantidad
+                for linea in nuevas:
+                    codigo = linea.articulo.codigo
+                    self.__registrar("agregar_linea_factura", codigo, sumas[codigo], id_factura, linea.precio_unitario)
+            return nuevas
+
+    def ajustar_linea_factura(self, codigo_articulo: str, cantidad: int, id_factura: Optional[int] = None,
+                              precio_unitario: Optional[float] = None) -> Optional[LineaFactura]:
+        with self.__cerrojo:
+            linea = super().ajustar_linea_factura(codigo_articulo, cantidad, id_factura, precio_unitario)
+            if linea is not None:
+                self.__registrar("ajustar_linea_factura", codigo_articulo, cantidad, id_factura, linea.precio_unitario)
+            return linea
+
+    def eliminar_linea_factura(self, codigo_articulo: str, id_factura: Optional[int] = None) -> None:
+        with self.__cerrojo:
+            super().eliminar_linea_factura(codigo_articulo, id_factura)
+            self.__registrar("eliminar_linea_factura", codigo_articulo, id_factura)
\ No newline at end of file
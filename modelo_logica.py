@@ -1,99 +1,577 @@
-from typing import List, Optional
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime
+from itertools import islice
+from threading import Event
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, MutableMapping, Optional, TextIO, Tuple, Union
 from .persona import Cliente
 from .articulo import ArticuloBase, ArticuloFisico, ArticuloDigital
-from .factura import Factura
-from .excepciones import ClienteNoEncontradoError, ArticuloNoEncontradoError
+from .factura import Factura, LineaFactura
+from .historial import HistorialFacturas
+from .indice_prefijos import IndicePrefijos
+from .indice_texto import IndiceTexto
+from .precios import MotorPrecios
+from .catalogo_columnar import TIPOS, CatalogoColumnar, tipo_articulo
+from . import importacion, facturacion_lotes
+from .importacion import InformeImportacion
+from .facturacion_lotes import InformeFacturacion
+from .ventas import AgregadosVentas
+from .exportacion import Destino, exportar_facturas
+from .archivo_binario import escribir_archivo
+from .excepciones import ClienteNoEncontradoError, ArticuloNoEncontradoError, ClienteDuplicadoError, ArticuloDuplicadoError, PrecioInvalidoError, FacturaNoEncontradaError, CantidadInvalidaError
+
+if TYPE_CHECKING:
+    from .almacen_sqlite import AlmacenSQLite # Solo para las anotaciones: sqlite3 se carga si se usa
+    from .catalogo_mmap import CatalogoMmap
 
 class ModeloLogica:
     """
-    Maneja toda la logica de negocio y los datos (listas).
+    Maneja toda la logica de negocio y los datos.
     Es la unica clase con la que hablara el Controlador.
+    Clientes y articulos se guardan en diccionarios indexados por DNI y codigo
+    (conservan el orden de registro), asi buscar y eliminar es O(1)
+    Opcionalmente los articulos pueden vivir en un CatalogoColumnar, que
+    permite cambiar precios y calcular descuentos de todo el catalogo en bloque,
+    o en un CatalogoMmap (archivo proyectado en memoria: abrirlo no lee el catalogo)
+    Con un almacen (por ejemplo AlmacenSQLite) los datos se guardan en disco;
+    la interfaz publica es la misma
+    Todas las facturas quedan en un historial con id y fecha. Puede haber varias
+    abiertas a la vez (una por caja); la factura actual es la que usa la vista
+    DNIs y codigos tienen ademas un indice ordenado para autocompletar por prefijo
+    (con almacen, la busqueda la hace la propia base de datos) y las denominaciones
+    un indice invertido para buscar articulos por nombre (se construye en la primera busqueda)
+    Los precios de las lineas los pone el MotorPrecios (motor_precios) segun sus reglas
+    Al cerrar cada factura se suma a unos AgregadosVentas (por dia, articulo y cliente)
+    para los informes; con almacen se calculan desde el historial la primera vez que se piden
     """
-    def __init__(self):
-        self.__clientes: List[Cliente] = []
-        self.__articulos: List[ArticuloBase] = []
+    def __init__(self, catalogo: Optional[Union[CatalogoColumnar, "CatalogoMmap"]] = None,
+                 almacen: Optional["AlmacenSQLite"] = None):
+        if catalogo is not None and almacen is not None:
+            raise ValueError("no se puede usar un catalogo propio junto con un almacen")
+        self.__almacen = almacen
+        self.__clientes: MutableMapping[str, Cliente] = almacen.clientes if almacen is not None else {}
+        if almacen is not None:
+            self.__articulos: MutableMapping[str, ArticuloBase] = almacen.articulos
+        else:
+            self.__articulos = catalogo if catalogo is not None else {}
+        self.__historial = almacen.historial if almacen is not None else HistorialFacturas()
+        self.__abiertas: Dict[int, Factura] = {}
         self.__factura_actual: Optional[Factura] = None
+        if almacen is not None:
+            self.__cargar_abiertas()
+        self.__indice_clientes = self.__crear_indice(self.__clientes)
+        self.__indice_articulos = self.__crear_indice(self.__articulos)
+        self.__indice_texto: Optional[IndiceTexto] = None # Recorre todo el catalogo: se crea al buscar
+        self.__motor_precios = MotorPrecios()
+        # None: aun no se han calculado (con almacen el historial ya trae facturas cerradas)
+        self.__ventas: Optional[AgregadosVentas] = AgregadosVentas() if almacen is None else None
+
+    def __indice_denominaciones(self) -> IndiceTexto:
+        if self.__indice_texto is None:
+            denominaciones = getattr(self.__articulos, "denominaciones", None)
+            self.__indice_texto = IndiceTexto(
+                denominaciones() if denominaciones is not None
+                else ((codigo, articulo.denominacion) for codigo, articulo in self.__articulos.items()))
+        return self.__indice_texto
+
+    @staticmethod
+    def __crear_indice(datos: MutableMapping) -> Optional[IndicePrefijos]:
+        """Indice de prefijos en memoria, salvo que el almacen sepa buscar por prefijo"""
+        if hasattr(datos, "buscar_prefijo"):
+            return None
+        return IndicePrefijos(datos.keys())
 
     # Propiedades 
     
     @property
     def clientes(self) -> List[Cliente]:
-        return self.__clientes
+        return list(self.__clientes.values())
 
     @property
     def articulos(self) -> List[ArticuloBase]:
-        return self.__articulos
+        return list(self.__articulos.values())
+
+    @property
+    def numero_clientes(self) -> int:
+        return len(self.__clientes)
+
+    @property
+    def numero_articulos(self) -> int:
+        return len(self.__articulos)
+
+    def pagina_clientes(self, inicio: int, cantidad: int) -> List[Cliente]:
+        """Los clientes de `inicio` a `inicio + cantidad` (en el orden de `clientes`), sin cargar los demas"""
+        return self.__pagina(self.__clientes, inicio, cantidad)
+
+    def pagina_articulos(self, inicio: int, cantidad: int) -> List[ArticuloBase]:
+        """Los articulos de `inicio` a `inicio + cantidad` (en el orden de `articulos`), sin cargar los demas"""
+        return self.__pagina(self.__articulos, inicio, cantidad)
+
+    @staticmethod
+    def __pagina(datos: MutableMapping, inicio: int, cantidad: int) -> list:
+        """Una pagina con la consulta del almacen si la tiene (LIMIT/OFFSET); si no, recorriendo los valores"""
+        pagina = getattr(datos, "pagina", None)
+        if pagina is not None:
+            return pagina(inicio, cantidad)
+        return list(islice(datos.values(), inicio, inicio + cantidad))
 
     @property
     def factura_actual(self) -> Optional[Factura]:
         return self.__factura_actual
 
+    @property
+    def facturas_abiertas(self) -> List[Factura]:
+        return list(self.__abiertas.values())
+
+    @property
+    def ultimo_id_factura(self) -> int:
+        return self.__historial.ultimo_id
+
+    @property
+    def motor_precios(self) -> MotorPrecios:
+        """Reglas de precios (se configuran con agregar_regla / fijar_reglas)"""
+        return self.__motor_precios
+
+    @contextmanager
+    def lote(self) -> Iterator[None]:
+        """
+        Agrupa varias operaciones seguidas (por ejemplo una importacion)
+        Con almacen es una sola transaccion; en memoria no hace nada
+        Si la transaccion se deshace, lo que el modelo tiene en memoria se vuelve a
+        leer del almacen (ver resincronizar)
+        """
+        if self.__almacen is None:
+            yield
+            return
+        try:
+            with self.__almacen.lote():
+                yield
+        except BaseException:
+            if not self.__almacen.en_transaccion: # Se ha deshecho el lote mas externo
+                self.resincronizar()
+            raise
+
+    def __cargar_abiertas(self) -> None:
+        """Facturas abiertas y factura actual guardadas en el almacen"""
+        abiertas = {id_factura: self.__historial.obtener(id_factura) for id_factura in self.__almacen.facturas_abiertas()}
+        self.__abiertas = abiertas
+        self.__factura_actual = abiertas.get(self.__almacen.id_factura_actual)
+
+    def resincronizar(self) -> None:
+        """
+        Tras deshacer una transaccion del almacen: las facturas abiertas se vuelven a
+        leer (las creadas en ella desaparecen) y se descartan los indices, precios y
+        agregados calculados con datos que ya no estan
+        """
+        if self.__almacen is None:
+            return
+        self.__cargar_abiertas()
+        if self.__indice_texto is not None:
+            self.__indice_texto = None
+            self.preparar_busqueda()
+        self.__motor_precios.invalidar()
+        self.__ventas = None
+
     #  Metodos Clientes
 
     def registrar_cliente(self, nombre: str, apellidos: str, dni: str) -> Cliente:
-        """Crea y guarda un nuevo cliente"""
+        """Crea y guarda un nuevo cliente. Lanza error si el DNI ya existe"""
+        if dni in self.__clientes:
+            raise ClienteDuplicadoError("ya existe un cliente con ese dni")
         cliente = Cliente(nombre, apellidos, dni)
-        self.__clientes.append(cliente)
+        self.__clientes[dni] = cliente
+        if self.__indice_clientes is not None:
+            self.__indice_clientes.agregar(dni)
         return cliente
 
     def eliminar_cliente(self, dni: str) -> None:
-        """Elimina un cliente de la lista usando su DNI"""
-        cliente = self.buscar_cliente(dni) # Reusa el metodo buscar
-        self.__clientes.remove(cliente)
+        """Elimina un cliente usando su DNI"""
+        try:
+            del self.__clientes[dni]
+        except KeyError:
+            raise ClienteNoEncontradoError("cliente no encontrado") from None
+        if self.__indice_clientes is not None:
+            self.__indice_clientes.quitar(dni)
+
+    def sugerir_clientes(self, prefijo: str, limite: int = 20) -> List[str]:
+        """DNIs que empiezan por el prefijo (como mucho `limite`, en orden)"""
+        if self.__indice_clientes is None:
+            return self.__clientes.buscar_prefijo(prefijo, limite)
+        return self.__indice_clientes.buscar(prefijo, limite)
+
+    def importar_clientes(self, origen: Union[str, TextIO], formato: Optional[str] = None,
+                          tam_lote: int = 1000, cancelar: Optional[Event] = None,
+                          progreso: Optional[Callable[[int], None]] = None) -> InformeImportacion:
+        """
+        Importa clientes de un archivo CSV o JSON Lines leyendolo como flujo
+        Inserta por lotes y devuelve un informe con los errores de cada fila
+        """
+        return importacion.importar_clientes(self, origen, formato, tam_lote, cancelar, progreso)
 
     def buscar_cliente(self, dni: str) -> Cliente:
         """Busca un cliente por DNI Lanza error si no lo encuentra"""
-        for cliente in self.__clientes:
-            if cliente.dni == dni:
-                return cliente
-        raise ClienteNoEncontradoError("cliente no encontrado")
+        try:
+            return self.__clientes[dni]
+        except KeyError:
+            raise ClienteNoEncontradoError("cliente no encontrado") from None
 
     #  Metodos Articuloz
     
     def registrar_articulo_fisico(self, codigo: str, denominacion: str, precio: float, peso: float) -> ArticuloFisico:
         """Crea y guarda un nuevo articulo fisico"""
-        articulo = ArticuloFisico(codigo, denominacion, precio, peso)
-        self.__articulos.append(articulo)
-        return articulo
+        self.__comprobar_codigo_libre(codigo)
+        self.__articulos[codigo] = ArticuloFisico(codigo, denominacion, precio, peso)
+        self.__indexar_articulo(codigo)
+        return self.__articulos[codigo] # Con catalogo columnar devuelve la vista de la fila
     
     def registrar_articulo_digital(self, codigo: str, denominacion: str, precio: float, licencia: str) -> ArticuloDigital:
         """Crea y guarda un nuevo articulo digital"""
-        articulo = ArticuloDigital(codigo, denominacion, precio, licencia)
-        self.__articulos.append(articulo)
-        return articulo
+        self.__comprobar_codigo_libre(codigo)
+        self.__articulos[codigo] = ArticuloDigital(codigo, denominacion, precio, licencia)
+        self.__indexar_articulo(codigo)
+        return self.__articulos[codigo] # Con catalogo columnar devuelve la vista de la fila
+
+    def importar_articulos(self, origen: Union[str, TextIO], formato: Optional[str] = None,
+                           tam_lote: int = 1000, cancelar: Optional[Event] = None,
+                           progreso: Optional[Callable[[int], None]] = None) -> InformeImportacion:
+        """
+        Importa articulos de un archivo CSV o JSON Lines leyendolo como flujo
+        Inserta por lotes y devuelve un informe con los errores de cada fila
+        """
+        return importacion.importar_articulos(self, origen, formato, tam_lote, cancelar, progreso)
 
     def buscar_articulo(self, codigo: str) -> ArticuloBase:
         """Busca un articulo por codigo. Lanza error si no lo encuentra"""
-        for articulo in self.__articulos:
-            if articulo.codigo == codigo:
-                return articulo
-        raise ArticuloNoEncontradoError("articulo no encontrado")
+        try:
+            return self.__articulos[codigo]
+        except KeyError:
+            raise ArticuloNoEncontradoError("articulo no encontrado") from None
+
+    def __comprobar_codigo_libre(self, codigo: str) -> None:
+        """Lanza error si ya hay un articulo registrado con ese codigo"""
+        if codigo in self.__articulos:
+            raise ArticuloDuplicadoError("ya existe un articulo con ese codigo")
+
+    def __indexar_articulo(self, codigo: str) -> None:
+        if self.__indice_articulos is not None:
+            self.__indice_articulos.agregar(codigo)
+        if self.__indice_texto is not None:
+            self.__indice_texto.agregar(codigo, self.__articulos[codigo].denominacion)
+
+    def eliminar_articulo(self, codigo: str) -> None:
+        """Elimina un articulo del catalogo (las facturas ya hechas lo conservan)"""
+        try:
+            del self.__articulos[codigo]
+        except KeyError:
+            raise ArticuloNoEncontradoError("articulo no encontrado") from None
+        if self.__indice_articulos is not None:
+            self.__indice_articulos.quitar(codigo)
+        if self.__indice_texto is not None:
+            self.__indice_texto.quitar(codigo)
+        self.__motor_precios.invalidar(codigo) # El codigo se puede volver a usar con otro tipo
+
+    def buscar_articulos(self, texto: str, limite: int = 20) -> List[ArticuloBase]:
+        """
+        Busca articulos por palabras de su denominacion, sin distinguir mayusculas ni tildes
+        La ultima palabra puede estar a medio escribir. Devuelve los mejores `limite`
+        """
+        return [self.__articulos[codigo] for codigo in self.__indice_denominaciones().buscar(texto, limite)]
+
+    def preparar_busqueda(self) -> None:
+        """Crea el indice de denominaciones si aun no existe (si no, lo crea la primera busqueda)"""
+        self.__indice_denominaciones()
+
+    def sugerir_articulos(self, prefijo: str, limite: int = 20) -> List[str]:
+        """Codigos de articulo que empiezan por el prefijo (como mucho `limite`, en orden)"""
+        if self.__indice_articulos is None:
+            return self.__articulos.buscar_prefijo(prefijo, limite)
+        return self.__indice_articulos.buscar(prefijo, limite)
+
+    def ajustar_precios(self, factor: float = 1.0, incremento: float = 0.0, tipo: Optional[str] = None) -> int:
+        """
+        Cambia en bloque los precios: precio * factor + incremento
+        Se aplica a todo el catalogo o solo a un tipo ('fisico' o 'digital')
+        Si algun precio quedaria negativo lanza PrecioInvalidoError sin cambiar ninguno
+        Un tipo desconocido lanza ValueError (con cualquier catalogo o almacen)
+        """
+        if tipo is not None and tipo not in TIPOS:
+            raise ValueError(f"tipo de articulo desconocido: {tipo!r} (use {' o '.join(map(repr, TIPOS))})")
+        operacion = getattr(self.__articulos, "ajustar_precios", None)
+        if operacion is not None:
+            return operacion(factor, incremento, tipo) # Version vectorizada
+        articulos = [a for a in self.__articulos.values() if tipo is None or tipo_articulo(a) == tipo]
+        nuevos = [a.precio * factor + incremento for a in articulos]
+        if any(p < 0 for p in nuevos):
+            raise PrecioInvalidoError("el precio no puede ser negativo")
+        for articulo, precio in zip(articulos, nuevos):
+            articulo.precio = precio
+        return len(articulos)
+
+    def precios_con_descuento(self) -> Dict[str, float]:
+        """
+        Devuelve el precio de catalogo de todos los articulos (codigo -> precio)
+        con las reglas de tipo y de codigos del motor de precios
+        """
+        operacion = getattr(self.__articulos, "precios_con_descuento", None)
+        if operacion is not None and self.__motor_precios.solo_por_tipo:
+            precios = operacion(self.__motor_precios.factores_por_tipo) # Version vectorizada, alineada con las filas
+            return {c: p for c, p in zip(self.__articulos.codigos, precios) if c is not None}
+        articulos = list(self.__articulos.values())
+        return dict(zip((a.codigo for a in articulos), self.__motor_precios.precios_catalogo(articulos)))
 
     # Metodos Factura 
 
-    def crear_nueva_factura(self, dni_cliente: str) -> Factura:
-        """Inicia una nueva factura para un cliente"""
+    def crear_nueva_factura(self, dni_cliente: str, fecha: Optional[datetime] = None) -> Factura:
+        """Abre una nueva factura para un cliente, la guarda en el historial y la deja como actual"""
         cliente = self.buscar_cliente(dni_cliente)
-        self.__factura_actual = Factura(cliente)
+        factura = Factura(cliente, self.__historial.nuevo_id(), fecha)
+        with self.__almacen.lote() if self.__almacen is not None else nullcontext():
+            self.__historial.agregar(factura, abierta=True)
+            self.__fijar_actual(factura)
+        self.__abiertas[factura.id] = factura
+        return factura
+
+    def __fijar_actual(self, factura: Optional[Factura]) -> None:
+        """Cambia la factura actual (con almacen tambien la guarda)"""
+        if self.__almacen is not None and factura is not self.__factura_actual:
+            self.__almacen.guardar_factura_actual(factura)
+        self.__factura_actual = factura
+
+    def agregar_factura_al_historial(self, factura: Factura, abierta: bool = False) -> Factura:
+        """
+        Guarda en el historial una factura ya construida (por ejemplo, recuperada
+        de un archivo). Si no tiene id se le asigna uno
+        """
+        if factura.id is None:
+            factura.id = self.__historial.nuevo_id()
+        self.__historial.agregar(factura, abierta)
+        if abierta:
+            self.__abiertas[factura.id] = factura
+        elif self.__ventas is not None:
+            self.__ventas.agregar_factura(factura)
+        return factura
+
+    def reservar_ids_factura(self, cantidad: int) -> List[int]:
+        """
+        Reserva `cantidad` ids de factura consecutivos para facturas que se construyen
+        fuera del modelo y luego se guardan con agregar_factura_al_historial
+        """
+        return [self.__historial.nuevo_id() for _ in range(cantidad)]
+
+    def facturar_pedidos(self, origen: Union[str, TextIO], formato: Optional[str] = None,
+                         procesos: Optional[int] = None, destino: Optional[Destino] = None,
+                         formato_exportacion: str = "jsonl",
+                         progreso: Optional[Callable[[int], None]] = None) -> InformeFacturacion:
+        """
+        Factura un archivo de pedidos (dni, codigo, cantidad[, pedido]) en varios procesos
+        y exporta las facturas a `destino` si se indica. Ver facturacion_lotes
+        """
+        return facturacion_lotes.facturar_pedidos(self, origen, formato, procesos, destino,
+                                                  formato_exportacion, progreso=progreso)
+
+    def seleccionar_factura(self, id_factura: int) -> Factura:
+        """Cambia la factura actual por otra de las abiertas"""
+        self.__fijar_actual(self.__factura_abierta(id_factura))
         return self.__factura_actual
 
-    def agregar_linea_factura(self, codigo_articulo: str, cantidad: int) -> None:
-        """Agrega una linea a la factura actual"""
-        if self.__factura_actual:
-            articulo = self.buscar_articulo(codigo_articulo)
-            self.__factura_actual.agregar_linea(articulo, cantidad)
-    
-    def eliminar_linea_factura(self, indice: int) -> None:
-        """Elimina una linea de la factura actual por su indice"""
-        if self.__factura_actual:
-            self.__factura_actual.eliminar_linea(indice)
-
-    def exportar_factura_json(self) -> None:
-        """Exporta la factura actual a JSON"""
-        if self.__factura_actual:
-            self.__factura_actual.exportar_json()
+    def cerrar_factura(self, id_factura: Optional[int] = None) -> Optional[Factura]:
+        """Cierra una factura abierta (por defecto la actual); ya no admite cambios"""
+        factura = self.__factura_abierta(id_factura)
+        if factura:
+            with self.__almacen.lote() if self.__almacen is not None else nullcontext():
+                if self.__almacen is not None:
+                    self.__almacen.cerrar_factura(factura)
+                if factura is self.__factura_actual:
+                    self.__fijar_actual(None)
+            del self.__abiertas[factura.id]
+            if self.__ventas is not None:
+                self.__ventas.agregar_factura(factura)
+        return factura
+
+    def __factura_abierta(self, id_factura: Optional[int]) -> Optional[Factura]:
+        """La factura abierta con ese id, o la actual si no se indica id"""
+        if id_factura is None:
+            return self.__factura_actual
+        try:
+            return self.__abiertas[id_factura]
+        except KeyError:
+            raise FacturaNoEncontradaError("no hay una factura abierta con ese id") from None
+
+    def agregar_linea_factura(self, codigo_articulo: str, cantidad: int, id_factura: Optional[int] = None,
+                              precio_unitario: Optional[float] = None) -> Optional[LineaFactura]:
+        """
+        Agrega unidades de un articulo a la factura actual (o a la factura abierta indicada)
+        Si el articulo ya tiene linea se suman a ella. Sin precio_unitario lo calcula el
+        motor de precios para la cantidad total de la linea, el cliente y la fecha de la factura
+        Devuelve la linea del articulo
+        """
+        factura = self.__factura_abierta(id_factura)
+        if not factura:
+            return None
+        articulo = self.buscar_articulo(codigo_articulo)
+        if precio_unitario is None:
+            total = cantidad + self.__cantidad_en_factura(factura, articulo.codigo)
+            precio_unitario = self.__motor_precios.precio_unitario(articulo, total, factura.cliente.dni, factura.fecha)
+        linea = factura.agregar_linea(articulo, cantidad, precio_unitario)
+        if self.__almacen is not None:
+            self.__almacen.guardar_linea(factura, linea)
+        return linea
+
+    @staticmethod
+    def __cantidad_en_factura(factura: Factura, codigo: str) -> int:
+        linea = factura.linea(codigo)
+        return linea.cantidad if linea is not None else 0
+
+    def agregar_lineas_factura(self, lineas: Iterable[Tuple[str, int]],
+                               id_factura: Optional[int] = None) -> List[LineaFactura]:
+        """
+        Agrega muchas lineas (codigo, cantidad) de una vez: se valida todo antes de
+        añadir nada y los precios se calculan en bloque, uno por articulo para su
+        cantidad total (las unidades de un mismo articulo van a una sola linea)
+        Devuelve las lineas de los articulos añadidos, en el orden en que aparecen
+        """
+        factura = self.__factura_abierta(id_factura)
+        if not factura:
+            return []
+        sumas: Dict[str, int] = {} # codigo -> unidades que se añaden
+        articulos: Dict[str, ArticuloBase] = {}
+        for codigo, cantidad in lineas:
+            if codigo not in articulos:
+                articulos[codigo] = self.buscar_articulo(codigo)
+            if cantidad <= 0:
+                raise CantidadInvalidaError("la cantidad debe ser positiva")
+            sumas[codigo] = sumas.get(codigo, 0) + cantidad
+        totales = [sumas[codigo] + self.__cantidad_en_factura(factura, codigo) for codigo in articulos]
+        precios = self.__motor_precios.precios_unitarios(list(articulos.values()), totales,
+                                                         factura.cliente.dni, factura.fecha)
+        nuevas = [factura.agregar_linea(articulo, sumas[codigo], precio)
+                  for (codigo, articulo), precio in zip(articulos.items(), precios)]
+        if self.__almacen is not None:
+            with self.__almacen.lote(): # Una sola transaccion para todas las lineas
+                for linea in nuevas:
+                    self.__almacen.guardar_linea(factura, linea)
+        return nuevas
+
+    def ajustar_linea_factura(self, codigo_articulo: str, cantidad: int, id_factura: Optional[int] = None,
+                              precio_unitario: Optional[float] = None) -> Optional[LineaFactura]:
+        """
+        Cambia la cantidad de la linea de un articulo en la factura actual (o en la indicada)
+        Sin precio_unitario el motor de precios lo vuelve a calcular para la nueva cantidad
+        """
+        factura = self.__factura_abierta(id_factura)
+        if not factura:
+            return None
+        linea = factura.linea(codigo_articulo)
+        if linea is None:
+            raise ArticuloNoEncontradoError("el articulo no esta en la factura")
+        if cantidad <= 0:
+            raise CantidadInvalidaError("la cantidad debe ser positiva")
+        if precio_unitario is None:
+            precio_unitario = self.__motor_precios.precio_unitario(linea.articulo, cantidad, factura.cliente.dni, factura.fecha)
+        linea = factura.ajustar_linea(codigo_articulo, cantidad, precio_unitario)
+        if self.__almacen is not None:
+            self.__almacen.guardar_linea(factura, linea)
+        return linea
+
+    def eliminar_linea_factura(self, codigo_articulo: str, id_factura: Optional[int] = None) -> None:
+        """Quita la linea de un articulo de la factura actual (o de la indicada)"""
+        factura = self.__factura_abierta(id_factura)
+        if factura and factura.eliminar_linea(codigo_articulo) is not None and self.__almacen is not None:
+            self.__almacen.borrar_linea(factura, codigo_articulo)
+
+    # Historial de facturas
+
+    def recorrer_facturas(self) -> Iterator[Factura]:
+        """Recorre todo el historial de facturas en orden de id"""
+        return iter(self.__historial)
+
+    def buscar_factura(self, id_factura: int) -> Factura:
+        """Busca una factura del historial por su id. Lanza error si no existe"""
+        return self.__historial.obtener(id_factura)
+
+    def facturas_de_cliente(self, dni: str) -> List[Factura]:
+        """Todas las facturas de un cliente, en orden de emision"""
+        return self.__historial.de_cliente(dni)
+
+    def facturas_entre(self, desde: datetime, hasta: datetime) -> List[Factura]:
+        """Facturas emitidas en [desde, hasta), ordenadas por fecha"""
+        return self.__historial.entre(desde, hasta)
+
+    # Informes de ventas (solo facturas cerradas)
+
+    def __agregados_ventas(self) -> AgregadosVentas:
+        if self.__ventas is None:
+            self.__ventas = self.__calcular_ventas()
+        return self.__ventas
+
+    def __calcular_ventas(self) -> AgregadosVentas:
+        return AgregadosVentas.desde_facturas(f for f in self.__historial if f.id not in self.__abiertas)
+
+    def ventas_por_dia(self, desde: Optional[date] = None, hasta: Optional[date] = None) -> List[Tuple[date, int, int, float]]:
+        """(dia, facturas, unidades, importe) de cada dia con ventas en [desde, hasta]"""
+        return self.__agregados_ventas().ventas_por_dia(desde, hasta)
+
+    def ventas_articulo(self, codigo: str) -> Tuple[int, int, float]:
+        """(facturas, unidades, importe) vendidos de un articulo"""
+        return self.__agregados_ventas().ventas_articulo(codigo)
+
+    def ventas_cliente(self, dni: str) -> Tuple[int, int, float]:
+        """(facturas, unidades, importe) comprados por un cliente"""
+        return self.__agregados_ventas().ventas_cliente(dni)
+
+    def articulos_mas_vendidos(self, limite: int = 10) -> List[Tuple[str, int, int, float]]:
+        """(codigo, facturas, unidades, importe) de los articulos con mas unidades vendidas"""
+        return self.__agregados_ventas().articulos_mas_vendidos(limite)
+
+    def mejores_clientes(self, limite: int = 10) -> List[Tuple[str, int, int, float]]:
+        """(dni, facturas, unidades, importe) de los clientes que mas han gastado"""
+        return self.__agregados_ventas().mejores_clientes(limite)
+
+    def reconstruir_ventas(self) -> List[str]:
+        """
+        Vuelve a calcular los agregados de ventas recorriendo todo el historial y
+        los sustituye. Devuelve en que no coincidian con los que habia (vacia si
+        estaban bien); si aun no se habian calculado no hay nada que comparar
+        """
+        nuevos = self.__calcular_ventas()
+        diferencias = self.__ventas.diferencias(nuevos) if self.__ventas is not None else []
+        self.__ventas = nuevos
+        return diferencias
+
+    @contextmanager
+    def factura_bloqueada(self, id_factura: Optional[int] = None) -> Iterator[Optional[Factura]]:
+        """
+        Da una factura del historial (por defecto la actual) para leerla entera sin que
+        cambie a medias. En memoria no bloquea nada; ModeloConcurrente toma su cerrojo
+        """
+        yield self.__factura_actual if id_factura is None else self.__historial.obtener(id_factura)
+
+    # Exportacion
+
+    def exportar_factura_json(self, destino: Optional[Destino] = None, id_factura: Optional[int] = None) -> Optional[str]:
+        """Exporta la factura actual (o la indicada) a JSON. Devuelve la ruta escrita"""
+        with self.factura_bloqueada(id_factura) as factura:
+            return factura.exportar_json(destino) if factura else None
     
-    def exportar_factura_csv(self) -> None:
-        """Exporta la factura actual a CSV"""
-        if self.__factura_actual:
-            self.__factura_actual.exportar_csv()
\ No newline at end of file
+    def exportar_factura_csv(self, destino: Optional[Destino] = None, id_factura: Optional[int] = None) -> Optional[str]:
+        """Exporta la factura actual (o la indicada) a CSV. Devuelve la ruta escrita"""
+        with self.factura_bloqueada(id_factura) as factura:
+            return factura.exportar_csv(destino) if factura else None
+
+    def exportar_factura_jsonl(self, destino: Optional[Destino] = None, id_factura: Optional[int] = None) -> Optional[str]:
+        """Exporta la factura actual (o la indicada) a JSON Lines. Devuelve la ruta escrita"""
+        with self.factura_bloqueada(id_factura) as factura:
+            return factura.exportar_jsonl(destino) if factura else None
+
+    def exportar_facturas(self, destino: Destino, formato: str = "jsonl",
+                          facturas: Optional[Iterable[Factura]] = None) -> int:
+        """Exporta varias facturas (por defecto todo el historial) a un solo destino"""
+        return exportar_facturas(self.__historial if facturas is None else facturas, destino, formato)
+
+    def guardar_catalogo(self, ruta: str) -> int:
+        """Escribe todos los articulos en un archivo de catalogo (se abre con CatalogoMmap)"""
+        from .catalogo_mmap import escribir_catalogo
+        return escribir_catalogo(self.__articulos.values(), ruta)
+
+    def archivar_facturas(self, ruta: str, facturas: Optional[Iterable[Factura]] = None) -> int:
+        """Guarda varias facturas (por defecto todo el historial) en un archivo binario (ver LectorArchivo)"""
+        return escribir_archivo(self.__historial if facturas is None else facturas, ruta)
\ No newline at end of file
@@ -0,0 +1,146 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from functools import wraps
+from typing import Callable, Dict, List, Tuple
+from .exportacion import escritura_atomica
+
+# Funciones de cada manejador que se muestran en el informe de texto (el .prof las tiene todas)
+FUNCIONES_EN_INFORME = 25
+# Lineas que mas memoria reservan que se muestran por manejador
+LINEAS_DE_MEMORIA = 10
+
+registro = logging.getLogger("tienda.perfilado")
+
+
+class PerfilManejador:
+    """Perfil acumulado de un manejador: cProfile, tiempos y memoria reservada por linea"""
+    __slots__ = ("perfil", "llamadas", "segundos", "maximo", "muestras", "pico", "memoria")
+
+    def __init__(self):
+        self.reiniciar()
+
+    def reiniciar(self) -> None:
+        """Vuelve a empezar; el objeto es el mismo (los manejadores envueltos lo tienen)"""
+        self.perfil = cProfile.Profile()
+        self.llamadas = 0
+        self.segundos = 0.0
+        self.maximo = 0.0
+        self.muestras = 0 # Llamadas en las que se ha medido la memoria
+        self.pico = 0 # Maximo de memoria usada durante una llamada (bytes sobre la de antes)
+        self.memoria: Dict[str, List[int]] = {} # "archivo:linea" -> [bytes, bloques] que quedan reservados
+
+
+class Perfilador:
+    """
+    Perfila los manejadores de la interfaz para saber por que uno va lento:
+    - cada manejador tiene su cProfile, activo solo mientras el manejador se ejecuta,
+      asi el grafo de llamadas muestra si el tiempo se va en el modelo, en la factura
+      o en redibujar los Treeview
+    - con tracemalloc, una de cada `memoria_cada` llamadas compara la memoria antes y
+      despues (las lineas que dejan mas reservado) y el pico durante la llamada
+    volcar(directorio) escribe un informe de texto y un .prof por manejador (se abren
+    con pstats, snakeviz...). Solo se perfila el hilo que llama al manejador: las
+    tareas en segundo plano (importar) no aparecen
+    tracemalloc ralentiza todo el programa: es un modo para diagnosticar, no para el dia a dia
+    """
+    def __init__(self, memoria_cada: int = 1, marcos: int = 1):
+        self.__memoria_cada = memoria_cada # 0: sin tracemalloc
+        self.__manejadores: Dict[str, PerfilManejador] = {}
+        self.__activo = False # cProfile no admite dos perfiles activos a la vez
+        self.__cerrojo = threading.Lock() # volcar puede llamarse desde otro hilo
+        self.__filtros = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+        if memoria_cada and not tracemalloc.is_tracing():
+            tracemalloc.start(marcos)
+
+    def envolver(self, nombre: str, funcion: Callable) -> Callable:
+        """Envuelve el manejador para perfilarlo con el nombre `nombre` (para Controlador.envolver_manejadores)"""
+        datos = self.__manejadores.setdefault(nombre, PerfilManejador())
+        reloj = time.perf_counter
+
+        @wraps(funcion)
+        def perfilada(*args, **kwargs):
+            if self.__activo: # Un manejador llamado desde otro: cuenta en el de fuera
+                return funcion(*args, **kwargs)
+            self.__activo = True
+            memoria = self.__memoria_cada and datos.llamadas % self.__memoria_cada == 0
+            if memoria:
+                antes = tracemalloc.take_snapshot().filter_traces(self.__filtros)
+                usada = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            inicio = reloj()
+            perfil = datos.perfil # reiniciar() puede cambiarlo mientras tanto: se para el que se activo
+            perfil.enable()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                perfil.disable()
+                segundos = reloj() - inicio
+                with self.__cerrojo:
+                    datos.llamadas += 1
+                    datos.segundos += segundos
+                    datos.maximo = max(datos.maximo, segundos)
+                    if memoria:
+                        datos.pico = max(datos.pico, tracemalloc.get_traced_memory()[1] - usada)
+                        self.__acumular_memoria(datos, antes)
+                self.__activo = False
+        return perfilada
+
+    def __acumular_memoria(self, datos: PerfilManejador, antes: tracemalloc.Snapshot) -> None:
+        despues = tracemalloc.take_snapshot().filter_traces(self.__filtros)
+        datos.muestras += 1
+        for diferencia in despues.compare_to(antes, "lineno"):
+            if diferencia.size_diff or diferencia.count_diff:
+                marco = diferencia.traceback[0]
+                acumulado = datos.memoria.setdefault(f"{marco.filename}:{marco.lineno}", [0, 0])
+                acumulado[0] += diferencia.size_diff
+                acumulado[1] += diferencia.count_diff
+
+    def reiniciar(self) -> None:
+        """Empieza de cero (los manejadores envueltos se siguen perfilando)"""
+        with self.__cerrojo:
+            for datos in self.__manejadores.values():
+                datos.reiniciar()
+
+    def informe(self) -> str:
+        """Resumen de todos los manejadores y, de cada uno, sus funciones y su memoria"""
+        with self.__cerrojo:
+            perfilados = sorted(((n, d) for n, d in self.__manejadores.items() if d.llamadas),
+                                key=lambda par: par[1].segundos, reverse=True)
+            texto = io.StringIO()
+            texto.write(f"perfil de los manejadores ({time.strftime('%Y-%m-%dT%H:%M:%S')})\n\n")
+            texto.write(f"{'manejador':<24}{'llamadas':>10}{'total s':>12}{'media ms':>12}{'max ms':>12}{'pico KiB':>12}\n")
+            for nombre, d in perfilados:
+                texto.write(f"{nombre:<24}{d.llamadas:>10}{d.segundos:>12.3f}{d.segundos / d.llamadas * 1000:>12.2f}"
+                            f"{d.maximo * 1000:>12.2f}{d.pico / 1024:>12.1f}\n")
+            for nombre, d in perfilados:
+                texto.write(f"\n=== {nombre} ===\n")
+                estadisticas = pstats.Stats(d.perfil, stream=texto)
+                estadisticas.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(FUNCIONES_EN_INFORME)
+                if d.muestras:
+                    texto.write(f"memoria que queda reservada ({d.muestras} llamadas medidas):\n")
+                    for linea, (tamano, bloques) in self.__mas_memoria(d):
+                        texto.write(f"  {tamano / 1024:>10.1f} KiB {bloques:>8} bloques  {linea}\n")
+        return texto.getvalue()
+
+    @staticmethod
+    def __mas_memoria(datos: PerfilManejador) -> List[Tuple[str, List[int]]]:
+        return sorted(datos.memoria.items(), key=lambda par: abs(par[1][0]), reverse=True)[:LINEAS_DE_MEMORIA]
+
+    def volcar(self, directorio: str) -> str:
+        """Escribe informe.txt y <manejador>.prof en el directorio. Devuelve la ruta del informe"""
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, "informe.txt")
+        with escritura_atomica(ruta) as f:
+            f.write(self.informe())
+        with self.__cerrojo:
+            for nombre, datos in self.__manejadores.items():
+                if datos.llamadas:
+                    pstats.Stats(datos.perfil).dump_stats(os.path.join(directorio, f"{nombre}.prof"))
+        registro.info("perfil guardado en %s", ruta)
+        return ruta
\ No newline at end of file
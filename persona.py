@@ -4,7 +4,10 @@ class Persona(ABC):
     """
     Clase base abstracta para representar una persona
     No se pueden crear objetos de esta clase directamente
+    Usa __slots__ para que cada objeto no cargue con un __dict__
     """
+    __slots__ = ("__nombre", "__apellidos")
+
     def __init__(self, nombre: str, apellidos: str):
         self.__nombre = nombre
         self.__apellidos = apellidos
@@ -26,6 +29,8 @@ class Cliente(Persona):
     """
     Clase que representa a un Cliente, hereda de Persona
     """
+    __slots__ = ("__dni",)
+
     def __init__(self, nombre: str, apellidos: str, dni: str):
         # Llamamos al constructor de la clase padre
         super().__init__(nombre, apellidos)
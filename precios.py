@@ -0,0 +1,272 @@
+import threading
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+from .articulo import ArticuloBase, ArticuloFisico, ArticuloDigital
+from .catalogo_columnar import tipo_articulo
+from .excepciones import PrecioInvalidoError
+
+# Descuento de cada tipo mientras no haya una ReglaTipo que lo cambie
+FACTORES_POR_DEFECTO = {"fisico": ArticuloFisico.FACTOR_DESCUENTO, "digital": ArticuloDigital.FACTOR_DESCUENTO}
+
+
+class Regla:
+    """Base de las reglas de precio: un factor que multiplica al precio (0.9 = 10% de descuento)"""
+    __slots__ = ("__factor",)
+
+    def __init__(self, factor: float):
+        if factor < 0:
+            raise PrecioInvalidoError("el factor de una regla no puede ser negativo")
+        self.__factor = factor
+
+    @property
+    def factor(self) -> float:
+        return self.__factor
+
+
+class ReglaTipo(Regla):
+    """Factor de todos los articulos de un tipo; sustituye al descuento por defecto del tipo"""
+    __slots__ = ("__tipo",)
+
+    def __init__(self, tipo: str, factor: float):
+        if tipo not in FACTORES_POR_DEFECTO:
+            raise ValueError(f"tipo de articulo desconocido: {tipo}")
+        super().__init__(factor)
+        self.__tipo = tipo
+
+    @property
+    def tipo(self) -> str:
+        return self.__tipo
+
+
+class ReglaCodigos(Regla):
+    """Factor de los articulos con codigo entre `desde` y `hasta` (ambos incluidos, orden alfabetico)"""
+    __slots__ = ("__desde", "__hasta")
+
+    def __init__(self, desde: str, hasta: str, factor: float):
+        if desde > hasta:
+            raise ValueError("el rango de codigos esta al reves")
+        super().__init__(factor)
+        self.__desde = desde
+        self.__hasta = hasta
+
+    @property
+    def desde(self) -> str:
+        return self.__desde
+
+    @property
+    def hasta(self) -> str:
+        return self.__hasta
+
+    def incluye(self, codigo: str) -> bool:
+        return self.__desde <= codigo <= self.__hasta
+
+
+class ReglaCliente(Regla):
+    """Factor de todo lo que compra un cliente"""
+    __slots__ = ("__dni",)
+
+    def __init__(self, dni: str, factor: float):
+        super().__init__(factor)
+        self.__dni = dni
+
+    @property
+    def dni(self) -> str:
+        return self.__dni
+
+
+class TramoVolumen(Regla):
+    """Factor de las lineas con al menos `cantidad_minima` unidades (solo cuenta el tramo mas alto)"""
+    __slots__ = ("__cantidad_minima",)
+
+    def __init__(self, cantidad_minima: int, factor: float):
+        if cantidad_minima <= 0:
+            raise ValueError("la cantidad minima debe ser positiva")
+        super().__init__(factor)
+        self.__cantidad_minima = cantidad_minima
+
+    @property
+    def cantidad_minima(self) -> int:
+        return self.__cantidad_minima
+
+
+class Promocion(Regla):
+    """
+    Factor entre dos fechas (ambas incluidas) para todo el catalogo, para un tipo
+    o para unos codigos concretos
+    """
+    __slots__ = ("__inicio", "__fin", "__tipo", "__codigos")
+
+    def __init__(self, factor: float, inicio: date, fin: date, tipo: Optional[str] = None,
+                 codigos: Optional[Iterable[str]] = None):
+        if inicio > fin:
+            raise ValueError("la promocion termina antes de empezar")
+        if tipo is not None and tipo not in FACTORES_POR_DEFECTO:
+            raise ValueError(f"tipo de articulo desconocido: {tipo}")
+        super().__init__(factor)
+        self.__inicio = inicio
+        self.__fin = fin
+        self.__tipo = tipo
+        self.__codigos: Optional[FrozenSet[str]] = frozenset(codigos) if codigos is not None else None
+
+    @property
+    def inicio(self) -> date:
+        return self.__inicio
+
+    @property
+    def fin(self) -> date:
+        return self.__fin
+
+    def vigente(self, dia: date) -> bool:
+        return self.__inicio <= dia <= self.__fin
+
+    def afecta(self, codigo: str, tipo: str) -> bool:
+        return (self.__tipo is None or self.__tipo == tipo) and (self.__codigos is None or codigo in self.__codigos)
+
+
+class _TablaPrecios:
+    """
+    Reglas compiladas en tablas de consulta. Es inmutable salvo sus caches: cuando
+    cambian las reglas se crea otra y las caches se descartan con la anterior
+    """
+    __slots__ = ("por_tipo", "rangos", "por_cliente", "umbrales", "factores_volumen",
+                 "promociones", "factores", "promociones_del_dia")
+
+    def __init__(self, reglas: Iterable[Regla]):
+        self.por_tipo = dict(FACTORES_POR_DEFECTO)
+        rangos: List[ReglaCodigos] = []
+        self.por_cliente: Dict[str, float] = {}
+        tramos: Dict[int, float] = {}
+        promociones: List[Promocion] = []
+        for regla in reglas:
+            if isinstance(regla, ReglaTipo):
+                self.por_tipo[regla.tipo] = regla.factor
+            elif isinstance(regla, ReglaCodigos):
+                rangos.append(regla)
+            elif isinstance(regla, ReglaCliente):
+                self.por_cliente[regla.dni] = self.por_cliente.get(regla.dni, 1.0) * regla.factor
+            elif isinstance(regla, TramoVolumen):
+                tramos[regla.cantidad_minima] = regla.factor
+            elif isinstance(regla, Promocion):
+                promociones.append(regla)
+        self.rangos = tuple(rangos)
+        self.umbrales = sorted(tramos)
+        self.factores_volumen = [tramos[u] for u in self.umbrales]
+        self.promociones = tuple(promociones)
+        self.factores: Dict[str, float] = {} # Cache: codigo -> factor por tipo y codigo
+        self.promociones_del_dia: Dict[date, Tuple[Promocion, ...]] = {} # Cache: dia -> promociones vigentes
+
+    def factor_articulo(self, articulo: ArticuloBase) -> float:
+        """Factor que solo depende del articulo (tipo y rangos de codigos); se guarda en la cache"""
+        codigo = articulo.codigo
+        factor = self.por_tipo[tipo_articulo(articulo)]
+        for rango in self.rangos:
+            if rango.incluye(codigo):
+                factor *= rango.factor
+        self.factores[codigo] = factor
+        return factor
+
+    def vigentes(self, dia: date) -> Tuple[Promocion, ...]:
+        promociones = self.promociones_del_dia.get(dia)
+        if promociones is None:
+            promociones = self.promociones_del_dia[dia] = tuple(p for p in self.promociones if p.vigente(dia))
+        return promociones
+
+
+class MotorPrecios:
+    """
+    Calcula el precio unitario de una linea a partir de reglas configurables:
+    por tipo de articulo, por rango de codigos, por cliente, por tramos de cantidad
+    y promociones con fechas. Los factores de todas las reglas que se cumplen se
+    multiplican (de los tramos de volumen solo cuenta el mas alto alcanzado)
+    Las reglas se compilan en tablas y el factor de cada articulo se guarda en una
+    cache: el precio efectivo es precio * factor, asi un cambio de precio se ve al
+    momento y un cambio de reglas (o quitar un articulo) vacia la cache
+    Sin reglas da lo mismo que calcular_precio_descuento()
+    """
+    def __init__(self, reglas: Iterable[Regla] = ()):
+        self.__reglas: List[Regla] = list(reglas)
+        self.__cerrojo = threading.Lock() # Solo para cambiar reglas; los calculos no lo toman
+        self.__tabla = _TablaPrecios(self.__reglas)
+
+    @property
+    def reglas(self) -> List[Regla]:
+        return list(self.__reglas)
+
+    @property
+    def factores_por_tipo(self) -> Dict[str, float]:
+        return dict(self.__tabla.por_tipo)
+
+    @property
+    def solo_por_tipo(self) -> bool:
+        """True si el precio de catalogo solo depende del tipo (se puede calcular por columnas)"""
+        return not self.__tabla.rangos
+
+    def agregar_regla(self, regla: Regla) -> None:
+        with self.__cerrojo:
+            self.__reglas.append(regla)
+            self.__tabla = _TablaPrecios(self.__reglas)
+
+    def quitar_regla(self, regla: Regla) -> None:
+        """Quita una regla añadida antes. Lanza ValueError si no esta"""
+        with self.__cerrojo:
+            self.__reglas.remove(regla)
+            self.__tabla = _TablaPrecios(self.__reglas)
+
+    def fijar_reglas(self, reglas: Iterable[Regla]) -> None:
+        """Sustituye todas las reglas"""
+        with self.__cerrojo:
+            self.__reglas = list(reglas)
+            self.__tabla = _TablaPrecios(self.__reglas)
+
+    def invalidar(self, codigo: Optional[str] = None) -> None:
+        """Olvida el factor guardado de un articulo (o de todos)"""
+        if codigo is None:
+            self.__tabla.factores.clear()
+        else:
+            self.__tabla.factores.pop(codigo, None)
+
+    def precio_catalogo(self, articulo: ArticuloBase) -> float:
+        """Precio con las reglas de tipo y de codigos (sin cliente, cantidad ni promociones)"""
+        tabla = self.__tabla
+        factor = tabla.factores.get(articulo.codigo)
+        if factor is None:
+            factor = tabla.factor_articulo(articulo)
+        return articulo.precio * factor
+
+    def precios_catalogo(self, articulos: Iterable[ArticuloBase]) -> List[float]:
+        return [self.precio_catalogo(articulo) for articulo in articulos]
+
+    def precio_unitario(self, articulo: ArticuloBase, cantidad: int = 1, dni: Optional[str] = None,
+                        fecha: Optional[datetime] = None) -> float:
+        """Precio unitario de una linea de `cantidad` unidades para ese cliente y fecha"""
+        return self.precios_unitarios((articulo,), (cantidad,), dni, fecha)[0]
+
+    def precios_unitarios(self, articulos: Sequence[ArticuloBase], cantidades: Sequence[int],
+                          dni: Optional[str] = None, fecha: Optional[datetime] = None) -> List[float]:
+        """
+        Precios unitarios de muchas lineas de una misma factura de una vez: el cliente
+        y las promociones del dia se resuelven una sola vez para todas
+        """
+        tabla = self.__tabla # Si otro hilo cambia las reglas, esta llamada usa las de antes
+        factores = tabla.factores
+        factor_cliente = tabla.por_cliente.get(dni, 1.0) if dni is not None else 1.0
+        umbrales = tabla.umbrales
+        promociones = tabla.vigentes((fecha or datetime.now()).date()) if tabla.promociones else ()
+        precios = []
+        for articulo, cantidad in zip(articulos, cantidades):
+            factor = factores.get(articulo.codigo)
+            if factor is None:
+                factor = tabla.factor_articulo(articulo)
+            factor *= factor_cliente
+            if umbrales:
+                tramo = bisect_right(umbrales, cantidad)
+                if tramo:
+                    factor *= tabla.factores_volumen[tramo - 1]
+            if promociones:
+                codigo, tipo = articulo.codigo, tipo_articulo(articulo)
+                for promocion in promociones:
+                    if promocion.afecta(codigo, tipo):
+                        factor *= promocion.factor
+            precios.append(articulo.precio * factor)
+        return precios
\ No newline at end of file
@@ -0,0 +1,411 @@
+"""
+Servidor HTTP/JSON sin interfaz grafica: varias cajas (terminales de venta)
+trabajan a la vez contra el mismo ModeloLogica
+
+Uso:
+    python servidor.py [--host 127.0.0.1] [--puerto 8000] [--db ruta.db | --diario directorio | --catalogo ruta.cat]
+                       [--metricas [ruta]] [--lentas-ms 100]
+
+Rutas:
+    GET    /clientes                    lista de clientes
+    POST   /clientes                    {nombre, apellidos, dni}
+    GET    /clientes/<dni>
+    DELETE /clientes/<dni>
+    GET    /articulos[?q=texto][&limite=20]  todos, o busqueda por nombre
+    POST   /articulos                   {tipo, codigo, denominacion, precio, peso | licencia}
+    GET    /articulos/<codigo>
+    DELETE /articulos/<codigo>
+    GET    /facturas?dni=<dni>          facturas de un cliente
+    POST   /facturas                    {dni} abre una factura nueva
+    GET    /facturas/<id>
+    POST   /facturas/<id>/lineas        {codigo, cantidad} (se suman a la linea del articulo si ya esta)
+    PUT    /facturas/<id>/lineas/<codigo>  {cantidad} cambia la cantidad de la linea
+    DELETE /facturas/<id>/lineas/<codigo>
+    POST   /facturas/<id>/cerrar
+    GET    /facturas/<id>/exportar?formato=json|csv|jsonl
+    GET    /metricas[?formato=json]     metricas del modelo (con --metricas), texto de Prometheus
+
+Las conexiones son HTTP/1.1 persistentes (keep-alive). Los errores del modelo
+se devuelven como {"error": mensaje} con el codigo HTTP que corresponde
+"""
+import argparse
+import io
+import json
+import math
+import re
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+from contextlib import nullcontext
+from modelo.modelo_logica import ModeloLogica
+from modelo.modelo_concurrente import ModeloConcurrente
+from modelo.modelo_diario import ModeloDiario
+from modelo.almacen_sqlite import AlmacenSQLite
+from modelo.catalogo_mmap import CatalogoMmap
+from modelo.articulo import ArticuloBase, ArticuloFisico
+from modelo.factura import Factura
+from modelo.persona import Cliente
+from modelo.metricas import Metricas, TIPO_PROMETHEUS
+from modelo.excepciones import (CantidadInvalidaError, ArticuloNoEncontradoError, ClienteNoEncontradoError,
+                                PrecioInvalidoError, ClienteDuplicadoError, ArticuloDuplicadoError,
+                                FacturaNoEncontradaError)
+
+# Codigo HTTP de cada error del modelo (el primero que encaje, en orden)
+ERRORES_HTTP: List[Tuple[type, HTTPStatus]] = [
+    (ClienteNoEncontradoError, HTTPStatus.NOT_FOUND),
+    (ArticuloNoEncontradoError, HTTPStatus.NOT_FOUND),
+    (FacturaNoEncontradaError, HTTPStatus.NOT_FOUND),
+    (ClienteDuplicadoError, HTTPStatus.CONFLICT),
+    (ArticuloDuplicadoError, HTTPStatus.CONFLICT),
+    (CantidadInvalidaError, HTTPStatus.UNPROCESSABLE_ENTITY),
+    (PrecioInvalidoError, HTTPStatus.UNPROCESSABLE_ENTITY),
+    (ValueError, HTTPStatus.BAD_REQUEST), # Incluye JSON mal formado
+    (KeyError, HTTPStatus.BAD_REQUEST), # Falta un campo
+    (TypeError, HTTPStatus.BAD_REQUEST),
+]
+
+TIPOS_EXPORTACION = {
+    "json": "application/json",
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+class ErrorHTTP(Exception):
+    """Error que se devuelve tal cual al cliente (ruta inexistente, metodo no permitido...)"""
+    def __init__(self, estado: HTTPStatus, mensaje: str):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+# Conversion a JSON
+
+def cliente_json(cliente: Cliente) -> Dict[str, Any]:
+    return {"nombre": cliente.nombre, "apellidos": cliente.apellidos, "dni": cliente.dni}
+
+
+def articulo_json(articulo: ArticuloBase, precio_descuento: float) -> Dict[str, Any]:
+    """precio_descuento: precio de catalogo segun el motor de precios del modelo"""
+    datos = {"codigo": articulo.codigo, "denominacion": articulo.denominacion, "precio": articulo.precio,
+             "precio_descuento": precio_descuento}
+    if isinstance(articulo, ArticuloFisico):
+        datos.update(tipo="fisico", peso=articulo.peso)
+    else:
+        datos.update(tipo="digital", licencia=articulo.licencia)
+    return datos
+
+
+def factura_json(factura: Factura) -> Dict[str, Any]:
+    return {
+        "id": factura.id,
+        "fecha": factura.fecha.isoformat(),
+        "cliente": cliente_json(factura.cliente),
+        "total": factura.total,
+        "lineas": [{"codigo": l.articulo.codigo, "articulo": l.articulo.denominacion, "cantidad": l.cantidad,
+                    "precio_unitario": l.precio_unitario, "subtotal": l.subtotal} for l in factura.lineas],
+    }
+
+
+class ServidorTienda(ThreadingHTTPServer):
+    """
+    Servidor con un hilo por conexion que comparte un ModeloLogica
+    Con ModeloConcurrente las cajas trabajan a la vez; cualquier otro modelo no es
+    seguro entre hilos y cada operacion se hace con un cerrojo global tomado
+    """
+    daemon_threads = True
+
+    def __init__(self, direccion: Tuple[str, int], modelo: ModeloLogica, metricas: Optional[Metricas] = None):
+        super().__init__(direccion, ManejadorTienda)
+        self.modelo = modelo
+        self.metricas = metricas
+        self.cerrojo = nullcontext() if isinstance(modelo, ModeloConcurrente) else threading.Lock()
+
+
+class ManejadorTienda(BaseHTTPRequestHandler):
+    """Atiende las peticiones de una conexion (puede haber muchas seguidas: keep-alive)"""
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo salen en un solo envio (se vacia al final de cada peticion) y sin
+    # Nagle: si no, con keep-alive cada respuesta espera ~40 ms al ACK retardado del cliente
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    server: ServidorTienda
+
+    # Tabla de rutas: (metodo, patron, nombre del metodo que la atiende)
+    RUTAS: List[Tuple[str, "re.Pattern[str]", str]] = [
+        ("GET", re.compile(r"/clientes"), "listar_clientes"),
+        ("POST", re.compile(r"/clientes"), "registrar_cliente"),
+        ("GET", re.compile(r"/clientes/(?P<dni>[^/]+)"), "obtener_cliente"),
+        ("DELETE", re.compile(r"/clientes/(?P<dni>[^/]+)"), "eliminar_cliente"),
+        ("GET", re.compile(r"/articulos"), "listar_articulos"),
+        ("POST", re.compile(r"/articulos"), "registrar_articulo"),
+        ("GET", re.compile(r"/articulos/(?P<codigo>[^/]+)"), "obtener_articulo"),
+        ("DELETE", re.compile(r"/articulos/(?P<codigo>[^/]+)"), "eliminar_articulo"),
+        ("GET", re.compile(r"/facturas"), "listar_facturas"),
+        ("POST", re.compile(r"/facturas"), "crear_factura"),
+        ("GET", re.compile(r"/facturas/(?P<id_factura>\d+)"), "obtener_factura"),
+        ("POST", re.compile(r"/facturas/(?P<id_factura>\d+)/lineas"), "agregar_linea"),
+        ("PUT", re.compile(r"/facturas/(?P<id_factura>\d+)/lineas/(?P<codigo>[^/]+)"), "ajustar_linea"),
+        ("DELETE", re.compile(r"/facturas/(?P<id_factura>\d+)/lineas/(?P<codigo>[^/]+)"), "eliminar_linea"),
+        ("POST", re.compile(r"/facturas/(?P<id_factura>\d+)/cerrar"), "cerrar_factura"),
+        ("GET", re.compile(r"/facturas/(?P<id_factura>\d+)/exportar"), "exportar_factura"),
+        ("GET", re.compile(r"/metricas"), "obtener_metricas"),
+    ]
+
+    def do_GET(self) -> None:
+        self.atender("GET")
+
+    def do_POST(self) -> None:
+        self.atender("POST")
+
+    def do_PUT(self) -> None:
+        self.atender("PUT")
+
+    def do_DELETE(self) -> None:
+        self.atender("DELETE")
+
+    def log_message(self, formato: str, *args: Any) -> None:
+        pass # Sin una linea por peticion en stderr: con muchas cajas ralentiza el servidor
+
+    # Despacho
+
+    def atender(self, metodo: str) -> None:
+        partes = urlsplit(self.path)
+        self.consulta = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+        # El cuerpo se lee siempre, aunque la ruta no exista, para no desincronizar la conexion
+        crudo = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            manejador, parametros = self.__buscar_ruta(metodo, partes.path.rstrip("/") or "/")
+            cuerpo = self.__decodificar_cuerpo(crudo)
+            with self.server.cerrojo:
+                estado, respuesta = manejador(cuerpo, **parametros)
+        except ErrorHTTP as e:
+            estado, respuesta = e.estado, {"error": str(e)}
+        except Exception as e:
+            estado = self.__estado_de_error(e)
+            respuesta = {"error": str(e) if not isinstance(e, KeyError) else f"falta el campo {e}"}
+        if isinstance(respuesta, tuple):
+            tipo, texto = respuesta # Exportacion: el cuerpo ya viene escrito
+            self.__responder(estado, texto.encode("utf-8"), tipo)
+        elif respuesta is None:
+            self.__responder(estado, b"", None)
+        else:
+            try:
+                texto = json.dumps(respuesta, allow_nan=False) # NaN o Infinity no son JSON
+            except ValueError:
+                estado, texto = HTTPStatus.INTERNAL_SERVER_ERROR, json.dumps({"error": "numero no valido en la respuesta"})
+            self.__responder(estado, texto.encode("utf-8"), "application/json")
+
+    def __buscar_ruta(self, metodo: str, ruta: str) -> Tuple[Callable, Dict[str, str]]:
+        existe = False
+        for metodo_ruta, patron, nombre in self.RUTAS:
+            encaje = patron.fullmatch(ruta)
+            if encaje:
+                existe = True
+                if metodo_ruta == metodo:
+                    return getattr(self, nombre), {k: unquote(v) for k, v in encaje.groupdict().items()}
+        if existe:
+            raise ErrorHTTP(HTTPStatus.METHOD_NOT_ALLOWED, "metodo no permitido")
+        raise ErrorHTTP(HTTPStatus.NOT_FOUND, "ruta no encontrada")
+
+    @staticmethod
+    def __decodificar_cuerpo(crudo: bytes) -> Optional[Dict[str, Any]]:
+        if not crudo:
+            return None
+        datos = json.loads(crudo) # ValueError -> 400
+        if not isinstance(datos, dict):
+            raise ValueError("el cuerpo debe ser un objeto JSON")
+        return datos
+
+    @staticmethod
+    def __estado_de_error(error: Exception) -> HTTPStatus:
+        for tipo, estado in ERRORES_HTTP:
+            if isinstance(error, tipo):
+                return estado
+        return HTTPStatus.INTERNAL_SERVER_ERROR
+
+    def __responder(self, estado: HTTPStatus, cuerpo: bytes, tipo: Optional[str]) -> None:
+        self.send_response(estado)
+        if tipo is not None:
+            self.send_header("Content-Type", f"{tipo}; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo))) # Necesario para mantener la conexion
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    @staticmethod
+    def __campos(cuerpo: Optional[Dict[str, Any]], *nombres: str) -> List[Any]:
+        if cuerpo is None:
+            raise ValueError("falta el cuerpo JSON")
+        return [cuerpo[nombre] for nombre in nombres] # KeyError -> 400
+
+    @staticmethod
+    def __numero(valor: Any, nombre: str) -> float:
+        """float(valor), salvo NaN o infinito (json.loads admite NaN e Infinity, float() 'nan')"""
+        numero = float(valor)
+        if not math.isfinite(numero):
+            raise ValueError(f"{nombre} debe ser un numero finito")
+        return numero
+
+    @staticmethod
+    def __entero(valor: Any, nombre: str) -> int:
+        # bool es subclase de int: true no es una cantidad
+        if not isinstance(valor, int) or isinstance(valor, bool):
+            raise ValueError(f"{nombre} debe ser un numero entero")
+        return valor
+
+    # Clientes
+
+    def listar_clientes(self, cuerpo):
+        return HTTPStatus.OK, [cliente_json(c) for c in self.server.modelo.clientes]
+
+    def registrar_cliente(self, cuerpo):
+        nombre, apellidos, dni = self.__campos(cuerpo, "nombre", "apellidos", "dni")
+        if not nombre or not apellidos or not dni:
+            raise ValueError("todos los campos son obligatorios")
+        cliente = self.server.modelo.registrar_cliente(str(nombre), str(apellidos), str(dni))
+        return HTTPStatus.CREATED, cliente_json(cliente)
+
+    def obtener_cliente(self, cuerpo, dni):
+        return HTTPStatus.OK, cliente_json(self.server.modelo.buscar_cliente(dni))
+
+    def eliminar_cliente(self, cuerpo, dni):
+        self.server.modelo.eliminar_cliente(dni)
+        return HTTPStatus.NO_CONTENT, None
+
+    # Articulos
+
+    def listar_articulos(self, cuerpo):
+        modelo = self.server.modelo
+        if "q" in self.consulta:
+            articulos = modelo.buscar_articulos(self.consulta["q"], int(self.consulta.get("limite", 20)))
+        else:
+            articulos = modelo.articulos
+        precios = modelo.motor_precios.precios_catalogo(articulos)
+        return HTTPStatus.OK, [articulo_json(a, p) for a, p in zip(articulos, precios)]
+
+    def registrar_articulo(self, cuerpo):
+        tipo, codigo, denominacion, precio = self.__campos(cuerpo, "tipo", "codigo", "denominacion", "precio")
+        if not codigo or not denominacion:
+            raise ValueError("todos los campos son obligatorios")
+        if tipo == "fisico":
+            peso, = self.__campos(cuerpo, "peso")
+            articulo = self.server.modelo.registrar_articulo_fisico(str(codigo), str(denominacion),
+                                                                    self.__numero(precio, "el precio"),
+                                                                    self.__numero(peso, "el peso"))
+        elif tipo == "digital":
+            licencia, = self.__campos(cuerpo, "licencia")
+            articulo = self.server.modelo.registrar_articulo_digital(str(codigo), str(denominacion),
+                                                                     self.__numero(precio, "el precio"), str(licencia))
+        else:
+            raise ValueError(f"tipo de articulo desconocido: {tipo}")
+        return HTTPStatus.CREATED, articulo_json(articulo, self.server.modelo.motor_precios.precio_catalogo(articulo))
+
+    def obtener_articulo(self, cuerpo, codigo):
+        modelo = self.server.modelo
+        articulo = modelo.buscar_articulo(codigo)
+        return HTTPStatus.OK, articulo_json(articulo, modelo.motor_precios.precio_catalogo(articulo))
+
+    def eliminar_articulo(self, cuerpo, codigo):
+        self.server.modelo.eliminar_articulo(codigo)
+        return HTTPStatus.NO_CONTENT, None
+
+    # Facturas
+
+    def listar_facturas(self, cuerpo):
+        if "dni" not in self.consulta:
+            raise ValueError("indique el dni del cliente (?dni=...)")
+        return HTTPStatus.OK, [factura_json(f) for f in self.server.modelo.facturas_de_cliente(self.consulta["dni"])]
+
+    def crear_factura(self, cuerpo):
+        dni, = self.__campos(cuerpo, "dni")
+        factura = self.server.modelo.crear_nueva_factura(str(dni))
+        return HTTPStatus.CREATED, factura_json(factura)
+
+    def obtener_factura(self, cuerpo, id_factura):
+        with self.server.modelo.factura_bloqueada(int(id_factura)) as factura: # Sin lineas a medio añadir
+            return HTTPStatus.OK, factura_json(factura)
+
+    def agregar_linea(self, cuerpo, id_factura):
+        codigo, cantidad = self.__campos(cuerpo, "codigo", "cantidad")
+        cantidad = self.__entero(cantidad, "la cantidad")
+        self.server.modelo.agregar_linea_factura(str(codigo), cantidad, int(id_factura))
+        return self.obtener_factura(cuerpo, id_factura)
+
+    def ajustar_linea(self, cuerpo, id_factura, codigo):
+        cantidad = self.__entero(*self.__campos(cuerpo, "cantidad"), "la cantidad")
+        self.server.modelo.ajustar_linea_factura(codigo, cantidad, int(id_factura))
+        return self.obtener_factura(cuerpo, id_factura)
+
+    def eliminar_linea(self, cuerpo, id_factura, codigo):
+        modelo = self.server.modelo
+        with modelo.factura_bloqueada(int(id_factura)) as factura:
+            if factura.linea(codigo) is None:
+                raise ErrorHTTP(HTTPStatus.NOT_FOUND, "linea no encontrada")
+        modelo.eliminar_linea_factura(codigo, int(id_factura))
+        return self.obtener_factura(cuerpo, id_factura)
+
+    def cerrar_factura(self, cuerpo, id_factura):
+        self.server.modelo.cerrar_factura(int(id_factura))
+        return self.obtener_factura(cuerpo, id_factura)
+
+    def exportar_factura(self, cuerpo, id_factura):
+        formato = self.consulta.get("formato", "json")
+        if formato not in TIPOS_EXPORTACION:
+            raise ValueError(f"formato no soportado: {formato}")
+        flujo = io.StringIO()
+        with self.server.modelo.factura_bloqueada(int(id_factura)) as factura:
+            getattr(factura, f"escribir_{formato}")(flujo)
+        return HTTPStatus.OK, (TIPOS_EXPORTACION[formato], flujo.getvalue())
+
+    def obtener_metricas(self, cuerpo):
+        metricas = self.server.metricas
+        if metricas is None:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "metricas desactivadas (arranque con --metricas)")
+        if self.consulta.get("formato") == "json":
+            return HTTPStatus.OK, metricas.instantanea()
+        return HTTPStatus.OK, (TIPO_PROMETHEUS, metricas.prometheus())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="servidor HTTP/JSON de la tienda")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8000)
+    parser.add_argument("--db", help="guardar los datos en esta base de datos SQLite")
+    parser.add_argument("--diario", help="guardar los datos en un diario dentro de este directorio")
+    parser.add_argument("--catalogo", help="leer los articulos de un archivo de catalogo (cli.py catalogo)")
+    parser.add_argument("--metricas", nargs="?", const="", metavar="RUTA",
+                        help="medir el modelo (GET /metricas); con RUTA ademas se guardan cada minuto")
+    parser.add_argument("--lentas-ms", type=float, help="anotar en el log las operaciones que tarden mas")
+    args = parser.parse_args()
+    if sum(map(bool, (args.db, args.diario, args.catalogo))) > 1:
+        parser.error("use solo una de --db, --diario y --catalogo")
+
+    # Modelo en memoria, en SQLite o con diario (igual que main.py), o con un catalogo en archivo
+    almacen = AlmacenSQLite(args.db) if args.db else None
+    catalogo = CatalogoMmap(args.catalogo) if args.catalogo else None
+    modelo = ModeloDiario(args.diario) if args.diario else ModeloConcurrente(catalogo, almacen)
+    metricas = None
+    if args.metricas is not None:
+        metricas = Metricas(umbral_lento=args.lentas_ms / 1000 if args.lentas_ms is not None else None)
+        metricas.instrumentar(modelo, "modelo")
+        if args.metricas:
+            metricas.guardar_periodicamente(args.metricas)
+    servidor = ServidorTienda((args.host, args.puerto), modelo, metricas)
+    print(f"escuchando en http://{args.host}:{servidor.server_address[1]}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        if metricas is not None and args.metricas:
+            metricas.guardar(args.metricas)
+        if almacen is not None:
+            almacen.cerrar()
+        if isinstance(modelo, ModeloDiario):
+            modelo.cerrar()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
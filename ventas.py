@@ -0,0 +1,158 @@
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from .factura import Factura
+
+# Diferencia de importe que se considera igual al comparar (las sumas en otro orden redondean distinto)
+TOLERANCIA_IMPORTE = 1e-6
+# Claves que guarda cada ranking: pedir mas recorre todos los totales
+TAMANO_RANKING = 100
+
+
+class Acumulado:
+    """Facturas, unidades e importe vendidos de un dia, un articulo o un cliente"""
+    __slots__ = ("facturas", "unidades", "importe")
+
+    def __init__(self):
+        self.facturas = 0
+        self.unidades = 0
+        self.importe = 0.0
+
+    def como_tupla(self) -> Tuple[int, int, float]:
+        return (self.facturas, self.unidades, self.importe)
+
+
+class _Ranking:
+    """
+    Las `tamano` claves con mayor valor, para valores que solo crecen (las ventas
+    no se restan): una clave que no esta entre las mejores solo entra si supera a
+    la peor de ellas. Actualizar es O(1) (O(tamano) si cambia la peor) y sacar las
+    mejores no depende de cuantas claves haya
+    """
+    def __init__(self, acumulados: Dict[str, Acumulado], campo: str, tamano: int = TAMANO_RANKING):
+        self.__acumulados = acumulados # Los del agregado, no una copia
+        self.__campo = campo # "unidades" o "importe"
+        self.__tamano = tamano
+        self.__mejores: Dict[str, float] = {}
+        self.__peor: Optional[str] = None # Clave de menor valor entre las mejores (si estan todas)
+
+    def actualizar(self, clave: str) -> None:
+        """Avisa de que el acumulado de la clave ha subido"""
+        valor = getattr(self.__acumulados[clave], self.__campo)
+        mejores = self.__mejores
+        if clave in mejores:
+            mejores[clave] = valor
+            if clave == self.__peor:
+                self.__peor = min(mejores, key=mejores.__getitem__)
+        elif len(mejores) < self.__tamano:
+            mejores[clave] = valor
+            if len(mejores) == self.__tamano:
+                self.__peor = min(mejores, key=mejores.__getitem__)
+        elif valor > mejores[self.__peor]:
+            del mejores[self.__peor]
+            mejores[clave] = valor
+            self.__peor = min(mejores, key=mejores.__getitem__)
+
+    def mejores(self, limite: int) -> List[str]:
+        if limite > self.__tamano:
+            acumulados, campo = self.__acumulados, self.__campo
+            return heapq.nlargest(limite, acumulados, key=lambda clave: getattr(acumulados[clave], campo))
+        return heapq.nlargest(limite, self.__mejores, key=self.__mejores.__getitem__)
+
+
+class AgregadosVentas:
+    """
+    Totales de ventas que se actualizan al cerrar cada factura, para los informes:
+    - por dia: diccionario y lista ordenada de dias (los rangos se buscan con bisect)
+    - por codigo de articulo y por DNI de cliente: diccionarios, con un ranking de
+      articulos por unidades y de clientes por importe
+    Las consultas cuestan lo que ocupa su resultado, no lo que ocupa el historial
+    (salvo los rankings de mas de TAMANO_RANKING, que recorren los totales)
+    Solo cuentan las facturas cerradas: las abiertas aun pueden cambiar
+    """
+    def __init__(self):
+        self.__por_dia: Dict[date, Acumulado] = {}
+        self.__dias: List[date] = []
+        self.__por_articulo: Dict[str, Acumulado] = {}
+        self.__por_cliente: Dict[str, Acumulado] = {}
+        self.__ranking_articulos = _Ranking(self.__por_articulo, "unidades")
+        self.__ranking_clientes = _Ranking(self.__por_cliente, "importe")
+
+    @classmethod
+    def desde_facturas(cls, facturas: Iterable[Factura]) -> "AgregadosVentas":
+        """Calcula los totales desde cero recorriendo las facturas (cerradas)"""
+        agregados = cls()
+        for factura in facturas:
+            agregados.agregar_factura(factura)
+        return agregados
+
+    def __acumulado_dia(self, dia: date) -> Acumulado:
+        acumulado = self.__por_dia.get(dia)
+        if acumulado is None:
+            acumulado = self.__por_dia[dia] = Acumulado()
+            if not self.__dias or self.__dias[-1] < dia:
+                self.__dias.append(dia) # Caso normal: las facturas se cierran en orden de fecha
+            else:
+                insort(self.__dias, dia)
+        return acumulado
+
+    def agregar_factura(self, factura: Factura) -> None:
+        """Suma una factura cerrada a todos los totales"""
+        importe = factura.total
+        unidades = 0
+        for linea in factura.lineas:
+            codigo = linea.articulo.codigo
+            acumulado = self.__por_articulo.get(codigo)
+            if acumulado is None:
+                acumulado = self.__por_articulo[codigo] = Acumulado()
+            acumulado.facturas += 1
+            acumulado.unidades += linea.cantidad
+            acumulado.importe += linea.subtotal
+            unidades += linea.cantidad
+            self.__ranking_articulos.actualizar(codigo)
+        dni = factura.cliente.dni
+        for acumulado in (self.__acumulado_dia(factura.fecha.date()), self.__por_cliente.setdefault(dni, Acumulado())):
+            acumulado.facturas += 1
+            acumulado.unidades += unidades
+            acumulado.importe += importe
+        self.__ranking_clientes.actualizar(dni)
+
+    # Consultas
+
+    def ventas_por_dia(self, desde: Optional[date] = None, hasta: Optional[date] = None) -> List[Tuple[date, int, int, float]]:
+        """(dia, facturas, unidades, importe) de cada dia con ventas entre `desde` y `hasta` (incluidos)"""
+        inicio = bisect_left(self.__dias, desde) if desde is not None else 0
+        fin = bisect_right(self.__dias, hasta) if hasta is not None else len(self.__dias)
+        return [(dia, *self.__por_dia[dia].como_tupla()) for dia in self.__dias[inicio:fin]]
+
+    def ventas_articulo(self, codigo: str) -> Tuple[int, int, float]:
+        """(facturas, unidades, importe) de un articulo; ceros si no se ha vendido"""
+        acumulado = self.__por_articulo.get(codigo)
+        return acumulado.como_tupla() if acumulado is not None else (0, 0, 0.0)
+
+    def ventas_cliente(self, dni: str) -> Tuple[int, int, float]:
+        """(facturas, unidades, importe) de un cliente; ceros si no ha comprado"""
+        acumulado = self.__por_cliente.get(dni)
+        return acumulado.como_tupla() if acumulado is not None else (0, 0, 0.0)
+
+    def articulos_mas_vendidos(self, limite: int = 10) -> List[Tuple[str, int, int, float]]:
+        """(codigo, facturas, unidades, importe) de los articulos con mas unidades vendidas"""
+        return [(c, *self.__por_articulo[c].como_tupla()) for c in self.__ranking_articulos.mejores(limite)]
+
+    def mejores_clientes(self, limite: int = 10) -> List[Tuple[str, int, int, float]]:
+        """(dni, facturas, unidades, importe) de los clientes que mas han gastado"""
+        return [(d, *self.__por_cliente[d].como_tupla()) for d in self.__ranking_clientes.mejores(limite)]
+
+    def diferencias(self, otro: "AgregadosVentas") -> List[str]:
+        """Describe en que no coinciden dos agregados (vacia si son iguales)"""
+        mensajes = []
+        for nombre, propios, ajenos in (("dia", self.__por_dia, otro.__por_dia),
+                                        ("articulo", self.__por_articulo, otro.__por_articulo),
+                                        ("cliente", self.__por_cliente, otro.__por_cliente)):
+            for clave in sorted(propios.keys() | ajenos.keys(), key=str):
+                a = propios[clave].como_tupla() if clave in propios else (0, 0, 0.0)
+                b = ajenos[clave].como_tupla() if clave in ajenos else (0, 0, 0.0)
+                if a[:2] != b[:2] or abs(a[2] - b[2]) > TOLERANCIA_IMPORTE:
+                    mensajes.append(f"{nombre} {clave}: {a} != {b}")
+        return mensajes
\ No newline at end of file
@@ -1,10 +1,140 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-from typing import List, Optional
+from tkinter import ttk, messagebox, filedialog
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from modelo.persona import Cliente
 from modelo.articulo import ArticuloBase
 from modelo.factura import Factura
 
+# Filas que se dibujan a la vez en las tablas de clientes y articulos
+FILAS_POR_PAGINA = 500
+# Autocompletado de los desplegables de facturacion
+SUGERENCIAS_MAXIMAS = 20
+RETARDO_BUSQUEDA_MS = 200
+
+
+class Autocompletado:
+    """
+    Busqueda mientras se escribe en un Combobox
+    - espera a que se deje de teclear (retardo_ms) antes de buscar
+    - muestra solo las primeras `limite` coincidencias
+    - si el texto alarga el anterior y la lista no estaba recortada, filtra
+      esa lista en lugar de volver a buscar
+    `buscar(prefijo, limite)` lo asigna el controlador (por ejemplo ModeloLogica.sugerir_clientes)
+    """
+    def __init__(self, combo: ttk.Combobox, limite: int = SUGERENCIAS_MAXIMAS, retardo_ms: int = RETARDO_BUSQUEDA_MS):
+        self.buscar: Callable[[str, int], List[str]] = lambda prefijo, limite: []
+        self.__combo = combo
+        self.__limite = limite
+        self.__retardo_ms = retardo_ms
+        self.__pendiente: Optional[str] = None # id del after() programado
+        self.__texto: Optional[str] = None # Texto de la ultima busqueda
+        self.__resultados: List[str] = []
+        combo.bind("<KeyRelease>", self.__al_escribir, add="+")
+        combo.config(postcommand=self.actualizar) # Al abrir el desplegable, sin esperar
+
+    def __al_escribir(self, evento: tk.Event) -> None:
+        if evento.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        if self.__pendiente is not None:
+            self.__combo.after_cancel(self.__pendiente)
+        self.__pendiente = self.__combo.after(self.__retardo_ms, self.actualizar)
+
+    def actualizar(self) -> None:
+        """Pone en el desplegable las coincidencias del texto escrito"""
+        if self.__pendiente is not None:
+            self.__combo.after_cancel(self.__pendiente)
+            self.__pendiente = None
+        texto = self.__combo.get()
+        if self.__texto is not None and texto.startswith(self.__texto) and len(self.__resultados) < self.__limite:
+            resultados = [valor for valor in self.__resultados if valor.startswith(texto)]
+        else:
+            resultados = self.buscar(texto, self.__limite)
+        self.__texto, self.__resultados = texto, resultados
+        self.__combo['values'] = resultados
+
+    def invalidar(self) -> None:
+        """Los datos han cambiado: la proxima vez se vuelve a buscar"""
+        self.__texto = None
+
+
+class TablaPaginada:
+    """
+    Treeview con filas identificadas por una clave (DNI, codigo) que:
+    - aplica solo los cambios: inserta, borra o actualiza las filas afectadas
+    - muestra una pagina cada vez: con 100k elementos solo existen en Tk las filas visibles
+    La tabla no guarda los elementos: al dibujar pide al origen cuantos hay y solo los
+    de la pagina visible. `contar()` y `pagina(inicio, cantidad)` los asigna el
+    controlador (por ejemplo ModeloLogica.numero_clientes y pagina_clientes)
+    """
+    def __init__(self, padre: ttk.Frame, columnas: Tuple[str, ...], clave: Callable[[Any], str],
+                 fila: Callable[[Any], tuple], filas_por_pagina: int = FILAS_POR_PAGINA):
+        self.contar: Callable[[], int] = lambda: 0
+        self.pagina: Callable[[int, int], List[Any]] = lambda inicio, cantidad: []
+        self.__clave = clave
+        self.__fila = fila
+        self.__filas_por_pagina = filas_por_pagina
+        self.__total = 0 # Elementos que habia en el origen al dibujar
+        self.__visibles: Dict[str, tuple] = {} # Filas que hay ahora en el Treeview
+        self.__pagina = 0
+
+        self.tree = ttk.Treeview(padre, columns=columnas, show="headings")
+        for columna in columnas:
+            self.tree.heading(columna, text=columna)
+        self.tree.pack(fill="both", expand=True)
+
+        frame_paginas = ttk.Frame(padre)
+        frame_paginas.pack(fill="x")
+        self.btn_anterior = ttk.Button(frame_paginas, text="<", width=3, command=lambda: self.ir_a_pagina(self.__pagina - 1))
+        self.btn_anterior.pack(side=tk.LEFT, padx=5)
+        self.label_pagina = ttk.Label(frame_paginas, text="")
+        self.label_pagina.pack(side=tk.LEFT, padx=5)
+        self.btn_siguiente = ttk.Button(frame_paginas, text=">", width=3, command=lambda: self.ir_a_pagina(self.__pagina + 1))
+        self.btn_siguiente.pack(side=tk.LEFT, padx=5)
+
+    @property
+    def paginas(self) -> int:
+        return max(1, -(-self.__total // self.__filas_por_pagina))
+
+    def refrescar(self) -> None:
+        """Vuelve a pedir la pagina actual al origen (las filas que no cambian no se tocan)"""
+        self.__dibujar_pagina()
+
+    def ir_a_pagina(self, pagina: int) -> None:
+        self.__pagina = pagina
+        self.__dibujar_pagina()
+
+    def __dibujar_pagina(self) -> None:
+        """Deja en el Treeview exactamente las filas de la pagina actual, con el minimo de operaciones"""
+        self.__total = self.contar()
+        self.__pagina = min(max(self.__pagina, 0), self.paginas - 1)
+        elementos = {self.__clave(e): e for e in self.pagina(self.__pagina * self.__filas_por_pagina,
+                                                             self.__filas_por_pagina)}
+        en_pagina = elementos.keys()
+        sobran = [clave for clave in self.__visibles if clave not in en_pagina]
+        if sobran:
+            self.tree.delete(*sobran)
+            for clave in sobran:
+                del self.__visibles[clave]
+        # Normalmente las filas que quedan conservan su orden relativo; si no (un elemento
+        # sustituido pasa al final del origen) se recolocan antes de insertar las nuevas
+        quedan = [clave for clave in elementos if clave in self.__visibles]
+        if quedan != list(self.__visibles):
+            for posicion, clave in enumerate(quedan):
+                self.tree.move(clave, "", posicion)
+        visibles: Dict[str, tuple] = {}
+        for posicion, (clave, elemento) in enumerate(elementos.items()):
+            valores = self.__fila(elemento)
+            anteriores = self.__visibles.get(clave)
+            if anteriores is None:
+                self.tree.insert("", posicion, iid=clave, values=valores)
+            elif anteriores != valores:
+                self.tree.item(clave, values=valores)
+            visibles[clave] = valores
+        self.__visibles = visibles
+        self.label_pagina.config(text=f"pagina {self.__pagina + 1}/{self.paginas} ({self.__total})")
+        self.btn_anterior.config(state="normal" if self.__pagina > 0 else "disabled")
+        self.btn_siguiente.config(state="normal" if self.__pagina < self.paginas - 1 else "disabled")
+
 class VistaPrincipal:
     """
     Contiene todos los widgets de Tkinter (ttk)
@@ -33,6 +163,9 @@ class VistaPrincipal:
         self.notebook.add(self.tab_facturacion, text='facturacion')
         self.crear_tab_facturacion()
 
+        # Barra de estado para tareas en segundo plano (exportar, importar)
+        self.crear_barra_progreso()
+
         self.notebook.pack(expand=1, fill='both')
     
     #  Metodos publicos (para el Controlador) 
@@ -45,6 +178,38 @@ class VistaPrincipal:
         """Muestra una ventana emergente de informacion."""
         messagebox.showinfo(titulo, mensaje)
 
+    def pedir_archivo_importacion(self, titulo: str) -> str:
+        """Pide un archivo CSV o JSON Lines. Devuelve '' si se cancela"""
+        return filedialog.askopenfilename(title=titulo, filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl *.json"), ("todos", "*")])
+
+    def crear_barra_progreso(self) -> None:
+        """Dibuja la barra de estado inferior: texto, barra de progreso y boton de cancelar"""
+        frame_progreso = ttk.Frame(self.root)
+        frame_progreso.pack(side=tk.BOTTOM, fill="x", padx=10, pady=5)
+
+        self.label_progreso = ttk.Label(frame_progreso, text="")
+        self.label_progreso.pack(side=tk.LEFT, padx=5)
+        self.btn_cancelar_tarea = ttk.Button(frame_progreso, text="cancelar", state="disabled")
+        self.btn_cancelar_tarea.pack(side=tk.RIGHT, padx=5)
+        self.barra_progreso = ttk.Progressbar(frame_progreso, mode="indeterminate", length=200)
+        self.barra_progreso.pack(side=tk.RIGHT, padx=5)
+
+    def mostrar_progreso(self, texto: str) -> None:
+        """Indica que hay una tarea en curso"""
+        self.label_progreso.config(text=texto)
+        self.barra_progreso.start(10)
+        self.btn_cancelar_tarea.config(state="normal")
+
+    def actualizar_progreso(self, texto: str) -> None:
+        """Cambia el texto de la tarea en curso"""
+        self.label_progreso.config(text=texto)
+
+    def ocultar_progreso(self) -> None:
+        """Deja la barra de estado en reposo"""
+        self.barra_progreso.stop()
+        self.label_progreso.config(text="")
+        self.btn_cancelar_tarea.config(state="disabled")
+
     def crear_tab_clientes(self) -> None:
         """Dibuja todos los widgets de la pestaña Clientes."""
         
@@ -71,22 +236,20 @@ class VistaPrincipal:
         frame_lista = ttk.LabelFrame(self.tab_clientes, text="lista de clientes")
         frame_lista.pack(fill="both", expand=True, padx=10, pady=10)
 
-        self.tree_clientes = ttk.Treeview(frame_lista, columns=("nombre", "apellidos", "dni"), show="headings")
-        self.tree_clientes.heading("nombre", text="nombre")
-        self.tree_clientes.heading("apellidos", text="apellidos")
-        self.tree_clientes.heading("dni", text="dni")
-        self.tree_clientes.pack(fill="both", expand=True)
+        # Cada fila tiene como iid el DNI del cliente
+        self.tabla_clientes = TablaPaginada(frame_lista, ("nombre", "apellidos", "dni"), lambda c: c.dni,
+                                            lambda c: (c.nombre, c.apellidos, c.dni))
+        self.tree_clientes = self.tabla_clientes.tree
 
         self.btn_eliminar_cliente = ttk.Button(frame_lista, text="eliminar seleccionado")
         self.btn_eliminar_cliente.pack(pady=5)
+        self.btn_importar_clientes = ttk.Button(frame_lista, text="importar clientes...")
+        self.btn_importar_clientes.pack(pady=5)
 
-    def actualizar_lista_clientes(self, clientes: List[Cliente]) -> None:
-        """Limpia y rellena la tabla de clientes con datos nuevos"""
-        # Limpiar tabla
-        self.tree_clientes.delete(*self.tree_clientes.get_children())
-        # Rellenar
-        for cliente in clientes:
-            self.tree_clientes.insert("", "end", values=(cliente.nombre, cliente.apellidos, cliente.dni))
+    def actualizar_lista_clientes(self) -> None:
+        """Vuelve a pedir la pagina visible de clientes (solo cambian las filas distintas)"""
+        self.tabla_clientes.refrescar()
+        self.autocompletado_clientes.invalidar()
 
     def crear_tab_articulos(self) -> None:
         """Dibuja todos los widgets de la pestaña Articulos"""
@@ -125,12 +288,13 @@ class VistaPrincipal:
         frame_lista = ttk.LabelFrame(self.tab_articulos, text="lista de articulos")
         frame_lista.pack(fill="both", expand=True, padx=10, pady=10)
 
-        self.tree_articulos = ttk.Treeview(frame_lista, columns=("codigo", "denominacion", "precio", "tipo"), show="headings")
-        self.tree_articulos.heading("codigo", text="codigo")
-        self.tree_articulos.heading("denominacion", text="denominacion")
-        self.tree_articulos.heading("precio", text="precio")
-        self.tree_articulos.heading("tipo", text="tipo")
-        self.tree_articulos.pack(fill="both", expand=True)
+        # Cada fila tiene como iid el codigo del articulo
+        self.tabla_articulos = TablaPaginada(frame_lista, ("codigo", "denominacion", "precio", "tipo"), lambda a: a.codigo,
+                                             self.fila_articulo)
+        self.tree_articulos = self.tabla_articulos.tree
+
+        self.btn_importar_articulos = ttk.Button(frame_lista, text="importar articulos...")
+        self.btn_importar_articulos.pack(pady=5)
 
     def actualizar_form_articulo(self) -> None:
         """Cambia la etiqueta del campo 'extra' (peso/licencia)."""
@@ -140,13 +304,17 @@ class VistaPrincipal:
         else:
             self.label_articulo_extra.config(text="licencia:")
 
-    def actualizar_lista_articulos(self, articulos: List[ArticuloBase]) -> None:
-        """Limpia y rellena la tabla de articulos"""
-        self.tree_articulos.delete(*self.tree_articulos.get_children())
-        for articulo in articulos:
-            # Determinamos el tipo para mostrar en la tabla
-            tipo = "fisico" if hasattr(articulo, "peso") else "digital"
-            self.tree_articulos.insert("", "end", values=(articulo.codigo, articulo.denominacion, articulo.precio, tipo))
+    @staticmethod
+    def fila_articulo(articulo: ArticuloBase) -> tuple:
+        """Valores de la fila de un articulo en la tabla"""
+        # Determinamos el tipo para mostrar en la tabla
+        tipo = "fisico" if hasattr(articulo, "peso") else "digital"
+        return (articulo.codigo, articulo.denominacion, articulo.precio, tipo)
+
+    def actualizar_lista_articulos(self) -> None:
+        """Vuelve a pedir la pagina visible de articulos (solo cambian las filas distintas)"""
+        self.tabla_articulos.refrescar()
+        self.autocompletado_articulos.invalidar()
 
     def crear_tab_facturacion(self) -> None:
         """Dibuja todos los widgets de la pestaña Facturacion"""
@@ -156,7 +324,9 @@ class VistaPrincipal:
         frame_seleccion.pack(fill="x", padx=10, pady=10)
 
         ttk.Label(frame_seleccion, text="seleccionar cliente (dni):").pack(side=tk.LEFT, padx=5)
+        # Los desplegables solo muestran las coincidencias de lo que se va escribiendo
         self.combo_factura_cliente = ttk.Combobox(frame_seleccion)
+        self.autocompletado_clientes = Autocompletado(self.combo_factura_cliente)
         self.combo_factura_cliente.pack(side=tk.LEFT, padx=5)
         self.btn_nueva_factura = ttk.Button(frame_seleccion, text="nueva factura")
         self.btn_nueva_factura.pack(side=tk.LEFT, padx=5)
@@ -174,6 +344,7 @@ class VistaPrincipal:
         
         ttk.Label(frame_agregar_linea, text="articulo (codigo):").pack(side=tk.LEFT, padx=5)
         self.combo_factura_articulo = ttk.Combobox(frame_agregar_linea)
+        self.autocompletado_articulos = Autocompletado(self.combo_factura_articulo)
         self.combo_factura_articulo.pack(side=tk.LEFT, padx=5)
         
         ttk.Label(frame_agregar_linea, text="cantidad:").pack(side=tk.LEFT, padx=5)
@@ -189,6 +360,8 @@ class VistaPrincipal:
         self.tree_factura_lineas.heading("cantidad", text="cantidad")
         self.tree_factura_lineas.heading("subtotal", text="subtotal")
         self.tree_factura_lineas.pack(fill="both", expand=True, pady=5)
+        self.__lineas_visibles: Dict[str, tuple] = {} # codigo -> valores de las filas de tree_factura_lineas
+        self.__factura_visible: Optional[int] = None # id de la factura de esas filas
         
         self.btn_eliminar_linea = ttk.Button(frame_factura, text="eliminar linea seleccionada")
         self.btn_eliminar_linea.pack(pady=5)
@@ -204,23 +377,51 @@ class VistaPrincipal:
         self.btn_exportar_csv = ttk.Button(frame_exportar, text="exportar a csv")
         self.btn_exportar_csv.pack(side=tk.RIGHT, padx=5)
 
-    def actualizar_combos(self, clientes: List[Cliente], articulos: List[ArticuloBase]) -> None:
-        """Actualiza los desplegables (Combobox) con clientes y articulos"""
-        self.combo_factura_cliente['values'] = [c.dni for c in clientes]
-        self.combo_factura_articulo['values'] = [a.codigo for a in articulos]
+    def configurar_autocompletado(self, buscar_clientes: Callable[[str, int], List[str]],
+                                  buscar_articulos: Callable[[str, int], List[str]]) -> None:
+        """Indica como buscar por prefijo los DNIs y codigos de los desplegables"""
+        self.autocompletado_clientes.buscar = buscar_clientes
+        self.autocompletado_articulos.buscar = buscar_articulos
+
+    def configurar_tablas(self, contar_clientes: Callable[[], int], pagina_clientes: Callable[[int, int], List[Cliente]],
+                          contar_articulos: Callable[[], int],
+                          pagina_articulos: Callable[[int, int], List[ArticuloBase]]) -> None:
+        """Indica de donde sacan las tablas cuantos elementos hay y los de cada pagina"""
+        self.tabla_clientes.contar, self.tabla_clientes.pagina = contar_clientes, pagina_clientes
+        self.tabla_articulos.contar, self.tabla_articulos.pagina = contar_articulos, pagina_articulos
     
     def actualizar_vista_factura(self, factura: Optional[Factura]) -> None:
-        """Actualiza toda la pestaña de factura con los datos de la factura activa"""
-        # Limpiar tabla
-        self.tree_factura_lineas.delete(*self.tree_factura_lineas.get_children())
-        
+        """
+        Actualiza la pestaña de factura con los datos de la factura activa
+        Cada fila tiene como iid el codigo del articulo de su linea: solo se tocan
+        las filas que cambian
+        """
+        filas: Dict[str, tuple] = {}
         if factura:
             # Si hay factura, rellenamos todo
             self.label_cliente_factura.config(text=f"cliente: {factura.cliente.obtener_datos()}")
-            for linea in factura.lineas:
-                self.tree_factura_lineas.insert("", "end", values=(linea.articulo.denominacion, linea.cantidad, f"{linea.subtotal:.2f}"))
+            filas = {linea.articulo.codigo: (linea.articulo.denominacion, linea.cantidad, f"{linea.subtotal:.2f}")
+                     for linea in factura.lineas}
             self.label_factura_total.config(text=f"total: ${factura.total:.2f}")
         else:
             # Si no hay factura, reseteamos las etiquetas
             self.label_cliente_factura.config(text="cliente: (ninguno)")
-            self.label_factura_total.config(text="total: $0.00")
\ No newline at end of file
+            self.label_factura_total.config(text="total: $0.00")
+
+        id_factura = factura.id if factura else None
+        if id_factura != self.__factura_visible: # Otra factura: sus lineas pueden ir en otro orden
+            sobran = list(self.__lineas_visibles)
+            self.__lineas_visibles = {}
+            self.__factura_visible = id_factura
+        else:
+            sobran = [codigo for codigo in self.__lineas_visibles if codigo not in filas]
+        if sobran:
+            self.tree_factura_lineas.delete(*sobran)
+        # Las lineas nuevas van al final y las que siguen no cambian de sitio (como en la factura)
+        for codigo, valores in filas.items():
+            anteriores = self.__lineas_visibles.get(codigo)
+            if anteriores is None:
+                self.tree_factura_lineas.insert("", "end", iid=codigo, values=valores)
+            elif anteriores != valores:
+                self.tree_factura_lineas.item(codigo, values=valores)
+        self.__lineas_visibles = filas
\ No newline at end of file